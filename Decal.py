@@ -1,24 +1,104 @@
 import subprocess
+import importlib.util
+import concurrent.futures
+import hashlib
 import json
 import pandas as pd
 import os
+import psutil
 import torch
+from dicee.executer import Execute
 
 gpu_available = torch.cuda.is_available()
 
 device_type = 'gpu' if gpu_available else 'cpu'
 
+# Decal_exp of a worker process, reused across the configurations assigned to the worker.
+_worker_experiment = None
+
+
+def _initialize_worker(num_threads:int, experiment_kwargs:dict):
+    '''Bound the number of threads of torch in a worker and create its in-process Decal_exp.'''
+    global _worker_experiment
+    torch.set_num_threads(num_threads)
+    _worker_experiment = Decal_exp(**experiment_kwargs, in_process=True)
+
+
+def _run_configuration(p:int, q:int, r:int):
+    return (p,q,r), _worker_experiment.run_main(p,q,r)
+
+
+def estimate_memory(p:int, q:int, r:int, emb_dim:int, num_entities:int, num_relations:int, batch_size:int, scoring_technique:str) -> int:
+    '''Estimate the peak memory in bytes required to train Decal with p,q,r.'''
+    bytes_per_float = 4
+    # (1) Parameters, their gradients and two moments of Adam.
+    memory = 4 * bytes_per_float * ((num_entities + num_relations) * emb_dim + p + q + r)
+    # (2) Head and relation embeddings, blades and query vectors of a mini-batch and their gradients.
+    memory += 2 * bytes_per_float * batch_size * (4 * emb_dim + 2 * (p + q + r + 1))
+    # (3) Scores, labels and their gradients over all entities.
+    if scoring_technique in ["KvsAll", "1vsAll", "AllvsAll"]:
+        memory += 3 * bytes_per_float * batch_size * num_entities
+    # (4) Interpreter, torch and the preprocessed knowledge graph.
+    return memory + 512 * 1024 ** 2
+
+
+def fingerprint_dataset(path_dataset:str) -> str:
+    '''Hash of the content of train.txt, valid.txt and test.txt in path_dataset.'''
+    fingerprint = hashlib.sha256()
+    for split in ["train.txt", "valid.txt", "test.txt"]:
+        path = os.path.join(path_dataset, split)
+        if os.path.isfile(path):
+            fingerprint.update(split.encode())
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    fingerprint.update(chunk)
+    return fingerprint.hexdigest()
+
+
+class ResultCache:
+    '''Evaluation reports of trained configurations stored in a json file.
+       A report is keyed by the dataset fingerprint, the signature (p,q,r) and the training hyperparameters,
+       so that configurations trained by any search strategy or earlier run are never trained again.'''
+
+    def __init__(self, path:str, dataset_fingerprint:str, hyperparameters:dict):
+        self.path = path
+        self.dataset_fingerprint = dataset_fingerprint
+        self.hyperparameters = hyperparameters
+        self.reports = dict()
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as file:
+                self.reports = json.load(file)
+
+    def key(self, p:int, q:int, r:int) -> str:
+        return json.dumps({"dataset": self.dataset_fingerprint, "signature": [p, q, r], **self.hyperparameters},
+                          sort_keys=True)
+
+    def get(self, p:int, q:int, r:int):
+        return self.reports.get(self.key(p, q, r))
+
+    def put(self, p:int, q:int, r:int, report:dict):
+        self.reports[self.key(p, q, r)] = {k: report[k] for k in ["Train", "Val", "Test"] if k in report}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Write and rename so that an interrupted search never leaves a partially written cache.
+        with open(self.path + f'.{os.getpid()}', 'w') as file:
+            json.dump(self.reports, file, indent=4)
+        os.replace(self.path + f'.{os.getpid()}', self.path)
+
 
 
 class Decal_exp:
 
-    def __init__(self, emb_dim:int , path_main:str, folder_name:str, Experiments_path:str, num_epochs:int, batch_size:int, scoring_technique:str,path_dataset:str):
+    def __init__(self, emb_dim:int , path_main:str, folder_name:str, Experiments_path:str, num_epochs:int, batch_size:int, scoring_technique:str,path_dataset:str, in_process:bool = False, lr:float = 0.1, random_seed:int = 0, use_cache:bool = True):
 
         '''Inputs: 
            em_dim: embedding dimension
            path_main: path to the main.py file
            folder_name: name of the folder that will contain the experimentions
-           Experiments_path: path where the experiments will be saved.'''
+           Experiments_path: path where the experiments will be saved.
+           in_process: if True, configurations are trained in this process and the preprocessed knowledge graph
+           and the filter indexes of the evaluator are reused across configurations.
+           use_cache: if True, reports of trained configurations are stored in folder_name/result_cache.json and
+           reused by all search strategies.'''
 
         self.path_main = path_main
         self.Experiments_path = Experiments_path
@@ -29,68 +109,249 @@ class Decal_exp:
         self.emb_dim = emb_dim
         self.results = dict()
         self.scoring_technique = scoring_technique
+        self.in_process = in_process
+        self.lr = lr
+        self.random_seed = random_seed
+        self.use_cache = use_cache
+        self.cache = None
+        # Required to create the same experiment in worker processes
+        self.experiment_kwargs = dict(emb_dim=emb_dim, path_main=path_main, folder_name=folder_name,
+                                      Experiments_path=Experiments_path, num_epochs=num_epochs, batch_size=batch_size,
+                                      scoring_technique=scoring_technique, path_dataset=path_dataset,
+                                      lr=lr, random_seed=random_seed, use_cache=False)
+        self.num_entities = None
+        self.num_relations = None
+        # Reused across configurations if in_process
+        self.main = None
+        self.kg = None
+        self.evaluator = None
         
                     
-    def run_main(self,p,q,r):
+    def run_main(self,p,q,r, num_epochs:int = None, eval_model:str = None, checkpoint:str = None):
+        '''Train and evaluate Decal for p,q,r. If in_process, the report is returned.
+           num_epochs and eval_model override the ones of the experiment and
+           checkpoint is an experiment folder whose model is trained further.'''
 
         folder_name = f"{p}_{q}_{r}"
         folder_path = os.path.join(self.folder_name, folder_name)
 
-        subprocess.run(["python", self.path_main,"--p",str(p) ,"--q",str(q), "--r", str(r),"--storage_path",folder_path,\
-                                    "--scoring_technique", self.scoring_technique, "--num_epochs", str(self.num_epochs), "--batch_size", str(self.batch_size),\
+        arguments = ["--p",str(p) ,"--q",str(q), "--r", str(r),"--storage_path",folder_path,\
+                                    "--scoring_technique", self.scoring_technique, "--num_epochs", str(self.num_epochs if num_epochs is None else num_epochs), "--batch_size", str(self.batch_size),\
                                     "--embedding_dim", str(self.emb_dim),"--path_dataset_folder", self.path_folder_dataset, "--accelerator", device_type,\
-                                   "--device","1"]) 
+                                   "--device","1", "--lr", str(self.lr), "--random_seed", str(self.random_seed)]
+        if eval_model is not None:
+            arguments += ["--eval_model", eval_model]
+        if checkpoint is not None:
+            arguments += ["--continue_from_experiment", checkpoint]
+        if not self.in_process:
+            subprocess.run(["python", self.path_main] + arguments)
+            return None
+
+        return self.run_in_process(arguments)
+
+
+    def run_in_process(self, arguments:list) -> dict:
+        '''Parse arguments with main.py and run Execute in this process.
+           The knowledge graph is read and indexed only once and the evaluator keeps its filter indexes.'''
+
+        if self.main is None:
+            spec = importlib.util.spec_from_file_location("decal_main", self.path_main)
+            self.main = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self.main)
+        executor = Execute(self.main.get_default_arguments(arguments), dataset=self.kg, evaluator=self.evaluator,
+                           share_dataset=True)
+        report = executor.start()
+        self.kg, self.evaluator = executor.dataset, executor.evaluator
+        return report
         
 
-    def GSDC(self, parameter_values:list) -> pd.DataFrame : #GSDC seach
+    def get_cache(self):
+        '''Result cache of this experiment, or None if use_cache is False.'''
+
+        if self.use_cache and self.cache is None:
+            self.cache = ResultCache(os.path.join(self.folder_name, "result_cache.json"),
+                                     fingerprint_dataset(self.path_folder_dataset),
+                                     dict(model="DeCaL", num_epochs=self.num_epochs, batch_size=self.batch_size, lr=self.lr,
+                                          embedding_dim=self.emb_dim, random_seed=self.random_seed,
+                                          scoring_technique=self.scoring_technique))
+        return self.cache
+
+
+    def latest_run_folder(self, p:int, q:int, r:int) -> str:
+        '''Path of the latest run of p,q,r containing an eval_report.json in folder_name/p_q_r.'''
+
+        experiments_path = os.path.join(self.folder_name, f"{p}_{q}_{r}")
+        for folder in sorted(os.listdir(experiments_path), reverse=True):
+            if os.path.exists(os.path.join(experiments_path, folder, 'eval_report.json')):
+                return os.path.join(experiments_path, folder)
+        raise FileNotFoundError(f"No eval_report.json in {experiments_path}")
+
+
+    def read_latest_report(self, p:int, q:int, r:int) -> dict:
+        '''Read the eval_report.json of the latest run of p,q,r stored into folder_name/p_q_r.'''
+
+        with open(os.path.join(self.latest_run_folder(p,q,r), 'eval_report.json'), 'r') as file:
+            return json.load(file)
+
+
+    def evaluate(self, p:int, q:int, r:int) -> dict:
+        '''Return the evaluation report of p,q,r from the result cache, or train and evaluate Decal for p,q,r.'''
+
+        cache = self.get_cache()
+        report = cache.get(p,q,r) if cache is not None else None
+        if report is None:
+            report = self.run_main(p,q,r)
+            if report is None:
+                report = self.read_latest_report(p,q,r)
+            if cache is not None:
+                cache.put(p,q,r, report)
+        self.results[(p,q,r)] = report
+        return report
+
+
+    def count_entities_relations(self):
+        '''Number of entities and relations in the dataset. Relations are doubled due to reciprocal triples.'''
+
+        if self.num_entities is None:
+            entities, relations = set(), set()
+            for split in ["train.txt", "valid.txt", "test.txt"]:
+                path = os.path.join(self.path_folder_dataset, split)
+                if os.path.isfile(path):
+                    df = pd.read_csv(path, sep="\s+", header=None, usecols=[0, 1, 2], dtype=str)
+                    entities.update(df[0].unique()), entities.update(df[2].unique()), relations.update(df[1].unique())
+            self.num_entities, self.num_relations = len(entities), 2 * len(relations)
+        return self.num_entities, self.num_relations
+
+
+    def run_parallel(self, signatures:list, num_workers:int = None, num_threads_per_worker:int = None, memory_budget:int = None):
+        '''Train and evaluate signatures concurrently in a process pool and yield ((p,q,r), report) as they finish.
+
+           Each worker uses num_threads_per_worker threads (default: cpu_count // num_workers) and reuses its
+           preprocessed knowledge graph across configurations. A configuration is started only if the sum of the
+           estimated memory of all running configurations stays below memory_budget in bytes
+           (default: 80% of the available memory).'''
+
+        if num_workers is None:
+            num_workers = os.cpu_count()
+        if num_threads_per_worker is None:
+            num_threads_per_worker = max(1, os.cpu_count() // num_workers)
+        if memory_budget is None:
+            memory_budget = int(0.8 * psutil.virtual_memory().available)
+        # (0) Configurations in the result cache are not trained again.
+        cache = self.get_cache()
+        pending = []
+        for p, q, r in signatures:
+            report = cache.get(p,q,r) if cache is not None else None
+            if report is None:
+                pending.append((p,q,r))
+            else:
+                self.results[(p,q,r)] = report
+                yield (p,q,r), report
+        if len(pending) == 0:
+            return
+        num_entities, num_relations = self.count_entities_relations()
+
+        running = dict()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=_initialize_worker,
+                                                    initargs=(num_threads_per_worker, self.experiment_kwargs)) as executor:
+            while pending or running:
+                # (1) Start configurations while workers are free and the memory budget allows.
+                memory_in_use = sum(running.values())
+                while pending and len(running) < num_workers:
+                    p, q, r = pending[0]
+                    memory = estimate_memory(p, q, r, self.emb_dim, num_entities, num_relations, self.batch_size, self.scoring_technique)
+                    # A configuration exceeding the budget alone is run on its own.
+                    if running and memory_in_use + memory > memory_budget:
+                        break
+                    pending.pop(0)
+                    running[executor.submit(_run_configuration, p, q, r)] = memory
+                    memory_in_use += memory
+                # (2) Stream finished configurations.
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    signature, report = future.result()
+                    self.results[signature] = report
+                    if cache is not None:
+                        cache.put(*signature, report)
+                    yield signature, report
+
+
+    def run_main_multi_signature(self, signatures:list):
+        '''Train all (p,q,r) in signatures in a single main.py run on the same mini-batches.
+           Each model is stored into folder_name/p_q_r as in run_main.'''
+
+        subprocess.run(["python", self.path_main,"--signatures", json.dumps([list(s) for s in signatures]),"--storage_path",self.folder_name,\
+                                    "--scoring_technique", self.scoring_technique, "--num_epochs", str(self.num_epochs), "--batch_size", str(self.batch_size),\
+                                    "--embedding_dim", str(self.emb_dim),"--path_dataset_folder", self.path_folder_dataset, "--accelerator", device_type,\
+                                   "--device","1", "--lr", str(self.lr), "--random_seed", str(self.random_seed)])
+
+
+    def GSDC(self, parameter_values:list, num_signatures_per_run:int = 1, num_workers:int = 1) -> pd.DataFrame : #GSDC seach
         '''This function stores the performance of Decal into a dataframe for all possible values of p,q,r in parameter_values.
-           If not specified, parameter_values =[0,1,...,emb_dim] '''
+           If not specified, parameter_values =[0,1,...,emb_dim]
+           If num_signatures_per_run > 1, that many signatures are trained together in a single run (see run_main_multi_signature).
+           If num_workers > 1, signatures are trained concurrently (see run_parallel).'''
 
         if parameter_values == None:
             parameter_values  = range(self.emb_dim+1)        
 
+        signatures = []
         for p in parameter_values:
             for q in parameter_values:
                 for r in parameter_values:
                 
                     if self.emb_dim%(p+q+r+1) == 0:  #divisibility criterion (1 + p + q + r should divide d)
                         
-                        self.run_main(p,q,r)
+                        signatures.append((p,q,r))
+
+        reports = dict()
+        if num_workers > 1:
+            for (p,q,r), report in self.run_parallel(signatures, num_workers=num_workers):
+                print(f'{p}_{q}_{r} finished with Val MRR:', report['Val']['MRR'])
+                reports[(p,q,r)] = report
+        elif num_signatures_per_run > 1:
+            # Only configurations missing in the result cache are trained.
+            cache = self.get_cache()
+            to_train = [s for s in signatures if cache is None or cache.get(*s) is None]
+            for i in range(0, len(to_train), num_signatures_per_run):
+                self.run_main_multi_signature(to_train[i:i + num_signatures_per_run])
+                # Reports of the multi-signature run, configurations are not trained again by evaluate.
+                for p,q,r in to_train[i:i + num_signatures_per_run]:
+                    reports[(p,q,r)] = self.read_latest_report(p,q,r)
+                    self.results[(p,q,r)] = reports[(p,q,r)]
+                    if cache is not None:
+                        cache.put(p,q,r, reports[(p,q,r)])
+            # Cache hits
+            for p,q,r in signatures:
+                if (p,q,r) not in reports:
+                    reports[(p,q,r)] = self.evaluate(p,q,r)
+        else:
+            for p,q,r in signatures:
+                reports[(p,q,r)] = self.evaluate(p,q,r)
                          
                             
 
-        experiments_path = self.Experiments_path
-        
         data = []
 
-        for root, dirs, files in os.walk(experiments_path):
-            dirs.sort()
-            for folder in dirs:
-                folder_path = os.path.join(root, folder)
-                report_path = os.path.join(folder_path, 'eval_report.json')
-
-                
-                if os.path.exists(report_path):
-                    with open(report_path, 'r') as file:
-                        report_data = json.load(file)
-
-                        parent_folder = os.path.basename(root)
-
-                        data.append({
-                            'Experiment': parent_folder,
-                            'Train_H@1': report_data['Train']['H@1'],
-                            'Train_H@3': report_data['Train']['H@3'],
-                            'Train_H@10': report_data['Train']['H@10'],
-                            'Train_MRR': report_data['Train']['MRR'],
-                            'Val_H@1': report_data['Val']['H@1'],
-                            'Val_H@3': report_data['Val']['H@3'],
-                            'Val_H@10': report_data['Val']['H@10'],
-                            'Val_MRR': report_data['Val']['MRR'],
-                            'Test_H@1': report_data['Test']['H@1'],
-                            'Test_H@3': report_data['Test']['H@3'],
-                            'Test_H@10': report_data['Test']['H@10'],
-                            'Test_MRR': report_data['Test']['MRR']
-                        })
+        for (p,q,r) in sorted(reports):
+            report_data = reports[(p,q,r)]
+
+            data.append({
+                'Experiment': f"{p}_{q}_{r}",
+                'Train_H@1': report_data['Train']['H@1'],
+                'Train_H@3': report_data['Train']['H@3'],
+                'Train_H@10': report_data['Train']['H@10'],
+                'Train_MRR': report_data['Train']['MRR'],
+                'Val_H@1': report_data['Val']['H@1'],
+                'Val_H@3': report_data['Val']['H@3'],
+                'Val_H@10': report_data['Val']['H@10'],
+                'Val_MRR': report_data['Val']['MRR'],
+                'Test_H@1': report_data['Test']['H@1'],
+                'Test_H@3': report_data['Test']['H@3'],
+                'Test_H@10': report_data['Test']['H@10'],
+                'Test_MRR': report_data['Test']['MRR']
+            })
 
         df = pd.DataFrame(data)
         
@@ -101,6 +362,78 @@ class Decal_exp:
     
     
     
+    def supernet(self, parameter_values:list = None) -> pd.DataFrame : # One-shot search
+        '''Train a single DeCaLSupernet sharing embeddings across all signatures (p,q,r) in parameter_values
+           satisfying the divisibility criterion and return the signatures ranked by validation MRR.
+           If not specified, parameter_values =[0,1,...,emb_dim-1] '''
+
+        if parameter_values == None:
+            parameter_values = range(self.emb_dim)
+        signatures = [[p,q,r] for p in parameter_values for q in parameter_values for r in parameter_values
+                      if self.emb_dim%(p+q+r+1) == 0]
+        folder_path = os.path.join(self.folder_name, "supernet")
+
+        subprocess.run(["python", self.path_main,"--model","DeCaLSupernet","--signatures", json.dumps(signatures),"--storage_path",folder_path,\
+                                    "--scoring_technique", self.scoring_technique, "--num_epochs", str(self.num_epochs), "--batch_size", str(self.batch_size),\
+                                    "--embedding_dim", str(self.emb_dim),"--path_dataset_folder", self.path_folder_dataset, "--accelerator", device_type,\
+                                   "--device","1", "--lr", str(self.lr), "--random_seed", str(self.random_seed)])
+
+        # The latest run
+        run_folder = sorted(os.listdir(folder_path))[-1]
+        return pd.read_csv(os.path.join(folder_path, run_folder, 'signature_ranking.csv'))
+
+
+    def successive_halving(self, parameter_values:list = None, min_epochs:int = 1, eta:int = 3) -> pd.DataFrame : # Successive halving search
+        '''Successive halving over all (p,q,r) in parameter_values satisfying the divisibility criterion.
+           (1) All signatures are trained for min_epochs and evaluated on the validation set.
+           (2) Only the best 1/eta of the signatures are kept and their models are trained further from their
+           checkpoints until eta times larger budget is reached.
+           (3) (2) is repeated until a single signature remains or num_epochs is reached. Survivors are trained
+           until num_epochs and evaluated on all splits.
+           The validation MRR of each signature at each rung is returned, best signatures first.
+           If not specified, parameter_values =[0,1,...,emb_dim-1]
+           eta >= 2 and min_epochs >= 1 are required so that each rung trains more epochs on fewer signatures.
+           Only model.pt is resumed between rungs (see --continue_from_experiment), hence each rung starts with a
+           freshly initialized optimizer.'''
+
+        assert eta >= 2 and min_epochs >= 1, f'eta ({eta}) must be at least 2 and min_epochs ({min_epochs}) at least 1'
+
+        if parameter_values == None:
+            parameter_values = range(self.emb_dim)
+        candidates = [(p,q,r) for p in parameter_values for q in parameter_values for r in parameter_values
+                      if self.emb_dim%(p+q+r+1) == 0]
+
+        data = []
+        checkpoints = dict()
+        trained_epochs = 0
+        budget = min(min_epochs, self.num_epochs)
+        rung = 0
+        while True:
+            final = budget == self.num_epochs
+            # (1) Continue training the candidates until budget. Intermediate rungs are evaluated only on val.
+            mrrs = dict()
+            for p,q,r in candidates:
+                report = self.run_main(p,q,r, num_epochs=budget - trained_epochs, eval_model=None if final else 'val',
+                                       checkpoint=checkpoints.get((p,q,r)))
+                if report is None:
+                    report = self.read_latest_report(p,q,r)
+                checkpoints[(p,q,r)] = report.get('path_experiment_folder', None) or self.latest_run_folder(p,q,r)
+                mrrs[(p,q,r)] = report['Val']['MRR']
+                data.append({'rung': rung, 'num_epochs': budget, 'Experiment': f"{p}_{q}_{r}", 'Val_MRR': report['Val']['MRR']})
+                if final:
+                    self.results[(p,q,r)] = report
+            if final:
+                break
+            # (2) Keep the best 1/eta of the candidates.
+            candidates = sorted(candidates, key=lambda s: mrrs[s], reverse=True)[:max(1, len(candidates) // eta)]
+            trained_epochs = budget
+            budget = self.num_epochs if len(candidates) == 1 else min(budget * eta, self.num_epochs)
+            rung += 1
+
+        df = pd.DataFrame(data)
+        return df.sort_values(['rung', 'Val_MRR'], ascending=False).reset_index(drop=True)
+
+
     def generate_configs(self,queue, p, q, r): # generate unseen configs
         result = []
         for p_i in [-1, 0, 1]:
@@ -111,29 +444,62 @@ class Decal_exp:
                         result.append((p+p_i, q+q_i, r+r_i))
         return result
 
-    def score(self, queue, priority_queue):
+    def score(self, queue, priority_queue, checkpoint:str = None, num_epochs:int = None, budget:int = None):
+        '''Append (p,q,r,budget,MRR) of configs to priority_queue, where budget is the total number of epochs
+           the model of p,q,r is trained for (default: num_epochs).'''
+        budget = self.num_epochs if budget is None else budget
         for (p,q,r) in queue:
             if ((p >=0) & (q >=0) & (r>=0)):
-                priority_queue.append((p, q, r, self.MRR(p,q,r))) # score unseen configs
+                priority_queue.append((p, q, r, budget, self.MRR(p,q,r, checkpoint=checkpoint, num_epochs=num_epochs))) # score unseen configs
         return  priority_queue
 
 
-    def GS(self, max_iterations): # Greedy seach implementation
+    def trained_checkpoint(self, p:int, q:int, r:int):
+        '''Latest trained model of p,q,r in folder_name/p_q_r or None, e.g. if its report is taken from the cache.'''
+
+        try:
+            return self.latest_run_folder(p,q,r)
+        except FileNotFoundError:
+            return None
+
+
+    def GS(self, max_iterations, warm_start:bool = False, warm_start_epochs:int = None): # Greedy seach implementation
+        '''If warm_start, neighbours of the current best configuration are initialized from its trained model
+           (see DeCaL.warm_start) and fine-tuned for warm_start_epochs (default: num_epochs).
+           The current best configuration is trained for warm_start_epochs as well, and configurations are only
+           compared with the ones trained for the same total number of epochs.
+           Only models trained during this search are used for warm starts, e.g. the first iteration is always cold.'''
         p, q, r = 1, 1, 1 #init
         known_configs = []
         priority_query = []
+        budgets = dict() # total number of epochs of the latest model of each config
+        checkpoints = dict() # latest model of each config trained during this search
         data = []
         for i in range(0, max_iterations):
           #print(i)
 
             to_score = self.generate_configs(known_configs, p, q, r) # compute unseen configs
 
-            priority_query = self.score(to_score, priority_query)	# add to priority queue, which sorts by score in descending order 
-            priority_queue = sorted(priority_query,key=lambda x: x[-1], reverse=True)
-
-            p_new,q_new,r_new,max_MRR =  priority_queue[0]  # take best config as next candidate
+            checkpoint = checkpoints.get((p,q,r)) if warm_start else None
+            if checkpoint is not None:
+                # Continue training the current best config so that it competes with its neighbours at the same budget.
+                budget = budgets.get((p,q,r), self.num_epochs) + (warm_start_epochs or self.num_epochs)
+                to_score = to_score + [(p,q,r)] if (p,q,r) not in to_score else to_score
+            else:
+                budget = self.num_epochs
+            previous_checkpoints = {config: self.trained_checkpoint(*config) for config in to_score} if warm_start else dict()
+            priority_query = self.score(to_score, priority_query, checkpoint=checkpoint, num_epochs=warm_start_epochs if checkpoint else None, budget=budget)	# add to priority queue, which sorts by score in descending order 
+            for config, previous_checkpoint in previous_checkpoints.items():
+                # A new run folder exists if config is trained now and not taken from the result cache.
+                latest_checkpoint = self.trained_checkpoint(*config)
+                if latest_checkpoint is not None and latest_checkpoint != previous_checkpoint:
+                    checkpoints[config] = latest_checkpoint
+            budgets.update({config: budget for config in to_score})
+            priority_queue = sorted([x for x in priority_query if x[3] == budget],key=lambda x: x[-1], reverse=True)
+
+            p_new,q_new,r_new,_,max_MRR =  priority_queue[0]  # take best config as next candidate
             
-            data.append({'nber_iterations':i+1,'best_parameters': (p_new,q_new,r_new),'max_MRR':max_MRR})
+            data.append({'nber_iterations':i+1,'best_parameters': (p_new,q_new,r_new),'num_epochs':budget,'max_MRR':max_MRR})
 
             if((p == p_new) & (q == q_new) & (r == r_new)): # if best config has not changed, found local maximum, terminate
                 print('yes, local maximum found')
@@ -145,11 +511,22 @@ class Decal_exp:
         return df
     
     
-    def LES(self,params_range): #Local exhaustive search (LES)
+    def LES(self,params_range, num_workers:int = 1): #Local exhaustive search (LES)
         l = []
         max_MRR = 0
         opt_p, opt_q, opt_r= 0,0,0
         
+        if num_workers > 1:
+            signatures = [(p,q,r) for p in params_range for q in params_range for r in params_range]
+            for (p,q,r), report in self.run_parallel(signatures, num_workers=num_workers):
+                Mrr = report['Val']['MRR']
+                l.append((p,q,r,Mrr))
+                if Mrr > max_MRR:
+                    max_MRR = Mrr
+                    (opt_p, opt_q, opt_r) = (p,q,r)
+            print('the best parameters with exaustive is',(opt_p, opt_q, opt_r))
+            print('the all list is',l)
+            return (opt_p, opt_q, opt_r), l
         
         for p in params_range:
             for q in params_range:
@@ -169,28 +546,17 @@ class Decal_exp:
         return (opt_p, opt_q, opt_r), l
 
 
-    def MRR(self, p,q,r):
-        '''Return the achieved MRR of Keci_r for a fixed p,q, and r on the train data set'''
-
-        
-        folder_name = f"{p}_{q}_{r}"
-        folder_path = os.path.join(self.folder_name, folder_name)
-        
-        self.run_main(p,q,r) 
-            
-        experiments_path = folder_path
-
-        for folder in os.listdir(experiments_path):
-
-            if os.path.isdir(os.path.join(experiments_path, folder)):
-                folder_path = os.path.join(experiments_path, folder)
-                report_path = os.path.join(folder_path, 'eval_report.json')
-
+    def MRR(self, p,q,r, checkpoint:str = None, num_epochs:int = None):
+        '''Return the achieved MRR of Keci_r for a fixed p,q, and r on the train data set.
+           If checkpoint is given, the model is initialized from it and the result is not cached.'''
 
-                if os.path.exists(report_path):
-                    with open(report_path, 'r') as file:
-                        report_data = json.load(file)
+        if checkpoint is None:
+            return self.evaluate(p,q,r)['Val']['MRR']
 
-        return report_data['Val']['MRR']
+        report = self.run_main(p,q,r, num_epochs=num_epochs, checkpoint=checkpoint)
+        if report is None:
+            report = self.read_latest_report(p,q,r)
+        self.results[(p,q,r)] = report
+        return report['Val']['MRR']
 
 
@@ -1,6 +1,6 @@
 import os
 import datetime
-from .static_funcs import load_model_ensemble, load_model, save_checkpoint_model
+from .static_funcs import load_model_ensemble, load_model, save_checkpoint_model, StringIndex
 import torch
 from typing import List, Tuple
 import random
@@ -157,13 +157,15 @@ class BaseInteractiveKGE:
                 self.model, self.entity_to_idx, self.relation_to_idx = load_model(self.path)
         self.num_entities = len(self.entity_to_idx)
         self.num_relations = len(self.relation_to_idx)
-        self.entity_to_idx: dict
-        self.relation_to_idx: dict
-        assert list(self.entity_to_idx.values()) == list(range(0, len(self.entity_to_idx)))
-        assert list(self.relation_to_idx.values()) == list(range(0, len(self.relation_to_idx)))
-
-        self.idx_to_entity = {v: k for k, v in self.entity_to_idx.items()}
-        self.idx_to_relations = {v: k for k, v in self.relation_to_idx.items()}
+        if isinstance(self.entity_to_idx, StringIndex) and isinstance(self.relation_to_idx, StringIndex):
+            # Indexes are 0, 1, ..., n-1 by construction and their strings are read from memory-mapped tables.
+            self.idx_to_entity = self.entity_to_idx.strings
+            self.idx_to_relations = self.relation_to_idx.strings
+        else:
+            assert list(self.entity_to_idx.values()) == list(range(0, len(self.entity_to_idx)))
+            assert list(self.relation_to_idx.values()) == list(range(0, len(self.relation_to_idx)))
+            self.idx_to_entity = {v: k for k, v in self.entity_to_idx.items()}
+            self.idx_to_relations = {v: k for k, v in self.relation_to_idx.items()}
 
     def get_domain_of_relation(self, rel: str) -> List[str]:
         x = [self.idx_to_entity[i] for i in self.domain_per_rel[self.relation_to_idx[rel]]]
@@ -272,6 +274,10 @@ class BaseInteractiveKGE:
         if entity_name in self.entity_to_idx:
             print(f'Entity ({entity_name}) exists..')
         else:
+            if isinstance(self.entity_to_idx, StringIndex):
+                # StringIndex is read-only.
+                self.entity_to_idx = dict(self.entity_to_idx.items())
+                self.idx_to_entity = dict(enumerate(self.idx_to_entity))
             self.entity_to_idx[entity_name] = len(self.entity_to_idx)
             self.idx_to_entity[self.entity_to_idx[entity_name]] = entity_name
             self.num_entities += 1
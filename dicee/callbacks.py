@@ -1,11 +1,13 @@
 import datetime
 import time
+import copy
 import numpy as np
 import torch
 
 import dicee.models.base_model
 from .static_funcs import save_checkpoint_model, exponential_function, save_pickle
 from .abstracts import AbstractCallback, AbstractPPECallback
+from .evaluator import Evaluator
 import pandas as pd
 
 
@@ -232,6 +234,51 @@ class Eval(AbstractCallback):
         return
 
 
+class SignatureRanking(AbstractCallback):
+    """
+    Rank all signatures of a trained DeCaLSupernet by their validation MRR
+
+    (1) Evaluate every signature on the validation set with the shared embeddings.
+    (2) Store the ranking into path/signature_ranking.csv .
+    (3) Set the best signature as the active signature of the model.
+
+    args are given explicitly since pl.Trainer does not carry them.
+    """
+
+    def __init__(self, path, args):
+        super().__init__()
+        self.path = path
+        self.args = args
+        self.ranking = None
+
+    def on_fit_start(self, trainer, model):
+        pass
+
+    def on_fit_end(self, trainer, model):
+        args = copy.copy(self.args)
+        args.eval_model = 'val'
+        evaluator = Evaluator(args=args)
+        model.eval()
+        results = []
+        for signature in model.signatures:
+            model.set_signature(signature)
+            report = evaluator.eval(dataset=trainer.dataset, trained_model=model,
+                                    form_of_labelling=trainer.form_of_labelling, during_training=True)
+            results.append({'p': signature[0], 'q': signature[1], 'r': signature[2], **report['Val']})
+        self.ranking = pd.DataFrame(results).sort_values(by='MRR', ascending=False)
+        self.ranking.to_csv(self.path + '/signature_ranking.csv', index=False)
+        print(self.ranking.head())
+        best = self.ranking.iloc[0]
+        model.set_signature((int(best['p']), int(best['q']), int(best['r'])))
+        model.train()
+
+    def on_train_epoch_end(self, *args, **kwargs):
+        return
+
+    def on_train_batch_end(self, *args, **kwargs):
+        return
+
+
 class KronE(AbstractCallback):
     def __init__(self):
         super().__init__()
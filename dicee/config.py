@@ -59,6 +59,9 @@ class Namespace(argparse.Namespace):
         self.backend: str = "pandas"
         """Backend to read, process, and index input knowledge graph. pandas, polars and rdflib available"""
 
+        self.streaming_chunk_size: int = None
+        """If given, input knowledge graph is read, indexed and written into disk in chunks of this many triples"""
+
         self.trainer: str = 'torchCPUTrainer'
         """Trainer for knowledge graph embedding model"""
 
@@ -68,6 +71,12 @@ class Namespace(argparse.Namespace):
         self.neg_ratio: int = 0
         """Negative ratio for a true triple in NegSample training_technique"""
 
+        self.filtered_negatives: bool = False
+        """NegSample: Resample negative triples that are training triples"""
+
+        self.shared_candidates: bool = False
+        """KvsSample: Share sampled candidate entities across a mini-batch to score them via a single GEMM"""
+
         self.weight_decay: float = 0.0
         """Weight decay for all trainable params"""
 
@@ -100,6 +109,12 @@ class Namespace(argparse.Namespace):
 
         self.label_smoothing_rate: float = 0.0
 
+        self.sparse_targets: bool = False
+        """KvsAll and AllvsAll: Use only positive labels instead of dense multi-label vectors in training"""
+
+        self.entity_chunk_size: int = None
+        """KvsAll: Compute logits and loss over blocks of entities to bound the memory of activations"""
+
         self.kernel_size: int = 3
         """Size of a square kernel in a convolution operation"""
 
@@ -121,6 +136,15 @@ class Namespace(argparse.Namespace):
         self.pykeen_model_kwargs = dict()
         """Additional keyword arguments for pykeen models"""
 
+        self.compile_scorer: bool = False
+        """Use a TorchScript scoring function specialized to (p,q,r) of DeCaL, cached under storage_path"""
+
+        self.continue_from_experiment: str = None
+        """An experiment folder whose model.pt initializes the model"""
+
+        self.preprocessed_kg_cache: str = "Experiments/preprocessed_kgs"
+        """A folder in which preprocessed knowledge graphs are cached and reused across runs. If None, no cache."""
+
     def __iter__(self):
         # Iterate
         for k, v in self.__dict__.items():
@@ -1,13 +1,15 @@
 from torch.utils.data import DataLoader
 import numpy as np
+import warnings
 import torch
 import pytorch_lightning as pl
-from typing import Dict, List
-from .static_preprocess_funcs import mapping_from_first_two_cols_to_third
-from .static_funcs import timeit, load_pickle
+from typing import List, Mapping, Tuple, Union
+from .static_preprocess_funcs import group_third_by_first_two_cols
+from .static_funcs import timeit, StringIndex
 
 
-def input_data_type_checking(train_set_idx, valid_set_idx, test_set_idx, entity_to_idx: Dict, relation_to_idx: Dict):
+def input_data_type_checking(train_set_idx, valid_set_idx, test_set_idx, entity_to_idx: Mapping,
+                             relation_to_idx: Mapping):
     """ Type checking for efficient memory usage"""
     assert isinstance(train_set_idx, np.ndarray)
     assert str(np.dtype(train_set_idx.dtype)) in ['int8', 'int16', 'int32']
@@ -19,8 +21,8 @@ def input_data_type_checking(train_set_idx, valid_set_idx, test_set_idx, entity_
         if len(test_set_idx) > 0:
             assert isinstance(test_set_idx, np.ndarray)
             assert str(np.dtype(test_set_idx.dtype)) in ['int8', 'int16', 'int32']
-    assert isinstance(entity_to_idx, dict)
-    assert isinstance(relation_to_idx, dict)
+    assert isinstance(entity_to_idx, Mapping)
+    assert isinstance(relation_to_idx, Mapping)
 
 
 def create_tensor(x: np.ndarray):
@@ -35,17 +37,154 @@ def create_tensor(x: np.ndarray):
         raise TypeError(f'x has a type of {str_type}.')
 
 
+def zero_copy_tensor(x: np.ndarray) -> torch.Tensor:
+    """ torch.from_numpy without warning on read-only, e.g. memory-mapped, arrays. Such tensors are never written. """
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+        return torch.from_numpy(x)
+
+
+def collate_constructed_batch(batch):
+    """ A mini-batch constructed by the __getitems__ of a dataset is used as it is """
+    return batch
+
+
+def positive_labels(offsets: torch.LongTensor, targets: torch.LongTensor,
+                    indices: torch.LongTensor) -> Tuple[torch.LongTensor, torch.LongTensor]:
+    """
+    Gather labels of data points stored in compressed sparse row format
+
+    Parameter
+    ---------
+    offsets: torch.LongTensor with (n+1,) shape
+    targets: torch.LongTensor, where targets[offsets[i]:offsets[i+1]] are the labels of the i.th data point
+    indices: torch.LongTensor with (b,) shape
+
+    Returns
+    -------
+    rows: torch.LongTensor, positions of data points in indices
+    labels: torch.LongTensor, labels of data points
+    """
+    starts = offsets[indices]
+    lengths = offsets[indices + 1] - starts
+    rows = torch.repeat_interleave(torch.arange(len(indices)), lengths)
+    # Position of each label: the start of its data point plus its rank within the data point.
+    positions = torch.arange(int(lengths.sum())) + torch.repeat_interleave(starts - (torch.cumsum(lengths, 0) - lengths),
+                                                                           lengths)
+    return rows, targets[positions].long()
+
+
+def multi_hot_targets(offsets: torch.LongTensor, targets: torch.LongTensor, indices: torch.LongTensor,
+                      target_dim: int) -> torch.FloatTensor:
+    """
+    Construct multi-label vectors of data points stored in compressed sparse row format via a single scatter
+
+    Parameter
+    ---------
+    offsets: torch.LongTensor with (n+1,) shape
+    targets: torch.LongTensor, where targets[offsets[i]:offsets[i+1]] are the labels of the i.th data point
+    indices: torch.LongTensor with (b,) shape
+    target_dim: int
+
+    Returns
+    -------
+    torch.FloatTensor with (b, target_dim) shape
+    """
+    rows, labels = positive_labels(offsets, targets, indices)
+    y = torch.zeros(len(indices), target_dim)
+    y[rows, labels] = 1.0
+    return y
+
+
+def sparse_multi_hot_targets(offsets: torch.LongTensor, targets: torch.LongTensor, indices: torch.LongTensor,
+                             target_dim: int) -> torch.LongTensor:
+    """
+    Construct multi-label vectors of data points stored in compressed sparse row format in coordinate format,
+    i.e., unique (row, label) pairs of positive labels, see BaseKGE.loss_function.
+    Sparse tensors are not used as they cannot be shared across dataloader workers.
+
+    Parameter
+    ---------
+    offsets: torch.LongTensor with (n+1,) shape
+    targets: torch.LongTensor, where targets[offsets[i]:offsets[i+1]] are the labels of the i.th data point
+    indices: torch.LongTensor with (b,) shape
+    target_dim: int
+
+    Returns
+    -------
+    torch.LongTensor with (2, nnz) shape
+    """
+    rows, labels = positive_labels(offsets, targets, indices)
+    # Duplicated triples lead to duplicated labels.
+    codes = torch.unique(rows * target_dim + labels)
+    return torch.stack((torch.div(codes, target_dim, rounding_mode='floor'), codes % target_dim))
+
+
+def encode_triples(triples: torch.LongTensor, num_entities: int, num_relations: int) -> torch.LongTensor:
+    """ Encode (n,3) triples into (n,) unique int64 codes """
+    # Codes are unique only if they do not overflow int64.
+    assert num_entities ** 2 * num_relations < 2 ** 63, \
+        f'{num_entities} entities and {num_relations} relations are too many for --filtered_negatives'
+    triples = triples.long()
+    return (triples[:, 0] * num_relations + triples[:, 1]) * num_entities + triples[:, 2]
+
+
+def is_known_triple(codes: torch.LongTensor, known_codes: torch.LongTensor) -> torch.BoolTensor:
+    """ Vectorized membership test of codes in the sorted known_codes """
+    idx = torch.searchsorted(known_codes, codes).clamp_(max=len(known_codes) - 1)
+    return known_codes[idx] == codes
+
+
+def reject_known_triples(negatives: torch.LongTensor, corrupted_columns: torch.LongTensor,
+                         known_codes: torch.LongTensor, num_entities: int, num_relations: int,
+                         max_rounds: int = 10) -> torch.LongTensor:
+    """
+    Resample corrupted entities of negative triples that are known positives
+
+    (1) Find negative triples being known positives via their int64 codes.
+    (2) Resample their corrupted entities at once. Repeat at most max_rounds times.
+
+    Parameter
+    ---------
+    negatives: torch.LongTensor with (n,3) shape, modified in-place
+    corrupted_columns: torch.LongTensor with (n,) shape, 0 (head) or 2 (tail) for each negative triple
+    known_codes: sorted torch.LongTensor of encoded known triples, see encode_triples
+    num_entities: int
+    num_relations: int
+    max_rounds: int
+
+    Returns
+    -------
+    negatives
+    """
+    rows = torch.arange(len(negatives))
+    for _ in range(max_rounds):
+        # (1) Negative triples being known positives
+        known = is_known_triple(encode_triples(negatives, num_entities, num_relations), known_codes)
+        if not known.any():
+            break
+        # (2) Resample their entities
+        negatives[rows[known], corrupted_columns[known]] = torch.randint(0, high=num_entities,
+                                                                         size=(int(known.sum()),))
+    return negatives
+
+
 @timeit
-def reload_dataset(path: str, form_of_labelling, scoring_technique, neg_ratio, label_smoothing_rate):
+def reload_dataset(path: str, form_of_labelling, scoring_technique, neg_ratio, label_smoothing_rate,
+                   sparse_targets: bool = False, filtered_negatives: bool = False,
+                   shared_candidates: bool = False):
     """ Reload the files from disk to construct the Pytorch dataset """
-    return construct_dataset(train_set=np.load(path + '/train_set.npy'),
+    return construct_dataset(train_set=np.load(path + '/train_set.npy', mmap_mode='r'),
                              valid_set=None,
                              test_set=None,
-                             entity_to_idx=load_pickle(file_path=path + '/entity_to_idx.p'),
-                             relation_to_idx=load_pickle(file_path=path + '/relation_to_idx.p'),
+                             entity_to_idx=StringIndex.load(path + '/entity_to_idx'),
+                             relation_to_idx=StringIndex.load(path + '/relation_to_idx'),
                              form_of_labelling=form_of_labelling,
                              scoring_technique=scoring_technique, neg_ratio=neg_ratio,
-                             label_smoothing_rate=label_smoothing_rate)
+                             label_smoothing_rate=label_smoothing_rate,
+                             sparse_targets=sparse_targets,
+                             filtered_negatives=filtered_negatives,
+                             shared_candidates=shared_candidates)
 
 
 @timeit
@@ -57,14 +196,18 @@ def construct_dataset(*, train_set: np.ndarray,
                       form_of_labelling: str,
                       scoring_technique: str,
                       neg_ratio: int,
-                      label_smoothing_rate: float) -> torch.utils.data.Dataset:
+                      label_smoothing_rate: float,
+                      sparse_targets: bool = False,
+                      filtered_negatives: bool = False,
+                      shared_candidates: bool = False) -> torch.utils.data.Dataset:
     if scoring_technique == 'NegSample':
         # Binary-class.
         train_set = TriplePredictionDataset(train_set=train_set,
                                             num_entities=len(entity_to_idx),
                                             num_relations=len(relation_to_idx),
                                             neg_sample_ratio=neg_ratio,
-                                            label_smoothing_rate=label_smoothing_rate)
+                                            label_smoothing_rate=label_smoothing_rate,
+                                            filtered_negatives=filtered_negatives)
     elif form_of_labelling == 'EntityPrediction':
         if scoring_technique == '1vsAll':
             # Multi-class.
@@ -75,25 +218,29 @@ def construct_dataset(*, train_set: np.ndarray,
                                          num_entities=len(entity_to_idx),
                                          num_relations=len(relation_to_idx),
                                          neg_sample_ratio=neg_ratio,
-                                         label_smoothing_rate=label_smoothing_rate)
+                                         label_smoothing_rate=label_smoothing_rate,
+                                         shared_candidates=shared_candidates)
         elif scoring_technique == 'KvsAll':
             # Multi-label.
             train_set = KvsAll(train_set,
                                entity_idxs=entity_to_idx,
                                relation_idxs=relation_to_idx, form=form_of_labelling,
-                               label_smoothing_rate=label_smoothing_rate)
+                               label_smoothing_rate=label_smoothing_rate,
+                               sparse_targets=sparse_targets)
         elif scoring_technique == 'AllvsAll':
             # Multi-label imbalanced.
             train_set = AllvsAll(train_set,
                                  entity_idxs=entity_to_idx,
                                  relation_idxs=relation_to_idx,
-                                 label_smoothing_rate=label_smoothing_rate)
+                                 label_smoothing_rate=label_smoothing_rate,
+                                 sparse_targets=sparse_targets)
         else:
             raise ValueError(f'Invalid scoring technique : {scoring_technique}')
     elif form_of_labelling == 'RelationPrediction':
         # Multi-label.
         train_set = KvsAll(train_set, entity_idxs=entity_to_idx, relation_idxs=relation_to_idx,
-                           form=form_of_labelling, label_smoothing_rate=label_smoothing_rate)
+                           form=form_of_labelling, label_smoothing_rate=label_smoothing_rate,
+                           sparse_targets=sparse_targets)
     else:
         raise KeyError('Illegal input.')
     return train_set
@@ -127,17 +274,26 @@ class OnevsAllDataset(torch.utils.data.Dataset):
         super().__init__()
         assert isinstance(train_set_idx, np.ndarray)
         assert len(train_set_idx) > 0
-        self.train_data = torch.LongTensor(train_set_idx)
+        # Triples are stored in their (narrow) integer type and widened to int64 per mini-batch.
+        self.train_data = zero_copy_tensor(train_set_idx)
         self.target_dim = len(entity_idxs)
-        self.collate_fn = None
+        self.collate_fn = collate_constructed_batch
 
     def __len__(self):
         return len(self.train_data)
 
     def __getitem__(self, idx):
+        triple = self.train_data[idx].long()
         y_vec = torch.zeros(self.target_dim)
-        y_vec[self.train_data[idx, 2]] = 1
-        return self.train_data[idx, :2], y_vec
+        y_vec[triple[2]] = 1
+        return triple[:2], y_vec
+
+    def __getitems__(self, indices: List[int]) -> Tuple[torch.LongTensor, torch.FloatTensor]:
+        """ Construct a mini-batch at once instead of stacking len(indices) label vectors """
+        triples = self.train_data[torch.as_tensor(indices)].long()
+        y = torch.zeros(len(triples), self.target_dim)
+        y[torch.arange(len(triples)), triples[:, 2]] = 1
+        return triples[:, :2], y
 
 
 class KvsAll(torch.utils.data.Dataset):
@@ -160,6 +316,9 @@ class KvsAll(torch.utils.data.Dataset):
     relation_idxs : dictonary
         string representation of a relation to its integer id
 
+    sparse_targets : bool
+        If True, mini-batches contain (row, label) pairs of positive labels instead of multi-label vectors
+
     Returns
     -------
     self : torch.utils.data.Dataset
@@ -178,60 +337,64 @@ class KvsAll(torch.utils.data.Dataset):
     """
 
     def __init__(self, train_set_idx: np.ndarray, entity_idxs, relation_idxs, form, store=None,
-                 label_smoothing_rate: float = 0.0):
+                 label_smoothing_rate: float = 0.0, sparse_targets: bool = False):
         super().__init__()
         assert len(train_set_idx) > 0
         assert isinstance(train_set_idx, np.ndarray)
         self.train_data = None
         self.train_target = None
+        self.train_target_offsets = None
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
-        self.collate_fn = None
+        self.sparse_targets = sparse_targets
+        self.collate_fn = collate_constructed_batch
 
-        # (1) Create a dictionary of training data pints
+        # (1) Group training data points in compressed sparse row format
         # Either from tuple of entities or tuple of an entity and a relation
         if store is None:
-            store = dict()
             if form == 'RelationPrediction':
                 self.target_dim = len(relation_idxs)
-                for s_idx, p_idx, o_idx in train_set_idx:
-                    store.setdefault((s_idx, o_idx), list()).append(p_idx)
+                pairs, offsets, targets = group_third_by_first_two_cols(train_set_idx, cols=(0, 2, 1))
             elif form == 'EntityPrediction':
                 self.target_dim = len(entity_idxs)
-                store = mapping_from_first_two_cols_to_third(train_set_idx)
+                pairs, offsets, targets = group_third_by_first_two_cols(train_set_idx)
             else:
                 raise NotImplementedError
         else:
             raise ValueError()
-        assert len(store) > 0
-        # Keys in store correspond to integer representation (index) of subject and predicate
-        # Values correspond to a list of integer representations of entities.
-        self.train_data = torch.LongTensor(list(store.keys()))
-
-        if sum([len(i) for i in store.values()]) == len(store):
-            # if each s,p pair contains at most 1 entity
-            self.train_target = np.array(list(store.values()))
-            try:
-                assert isinstance(self.train_target[0], np.ndarray)
-            except IndexError or AssertionError:
-                print(self.train_target)
-                exit(1)
-        else:
-            self.train_target = list(store.values())
-            assert isinstance(self.train_target[0], list)
-        del store
+        assert len(pairs) > 0
+        # Pairs correspond to integer representation (index) of subject and predicate
+        # Targets of the i.th pair are train_target[train_target_offsets[i]:train_target_offsets[i+1]].
+        # Flat tensors are not refcounted per data point and hence shared across dataloader workers.
+        # Pairs and targets keep the integer type of train_set_idx and are widened to int64 per mini-batch.
+        self.train_data = torch.from_numpy(pairs)
+        self.train_target_offsets = torch.from_numpy(offsets)
+        self.train_target = torch.from_numpy(targets)
 
     def __len__(self):
-        assert len(self.train_data) == len(self.train_target)
+        assert len(self.train_data) == len(self.train_target_offsets) - 1
         return len(self.train_data)
 
     def __getitem__(self, idx):
         # 1. Initialize a vector of output.
         y_vec = torch.zeros(self.target_dim)
-        y_vec[self.train_target[idx]] = 1.0
+        y_vec[self.train_target[self.train_target_offsets[idx]:self.train_target_offsets[idx + 1]].long()] = 1.0
 
         if self.label_smoothing_rate:
             y_vec = y_vec * (1 - self.label_smoothing_rate) + (1 / y_vec.size(0))
-        return self.train_data[idx], y_vec
+        return self.train_data[idx].long(), y_vec
+
+    def __getitems__(self, indices: List[int]) -> Tuple[torch.LongTensor, torch.Tensor]:
+        """ Construct a mini-batch at once: multi-label vectors via a single scatter, followed by label smoothing.
+        With sparse_targets, only (row, label) pairs of positive labels are returned and
+        label smoothing is applied in the loss."""
+        indices = torch.as_tensor(indices)
+        x = self.train_data[indices].long()
+        if self.sparse_targets:
+            return x, sparse_multi_hot_targets(self.train_target_offsets, self.train_target, indices, self.target_dim)
+        y = multi_hot_targets(self.train_target_offsets, self.train_target, indices, self.target_dim)
+        if self.label_smoothing_rate:
+            y = y * (1 - self.label_smoothing_rate) + (1 / self.target_dim)
+        return x, y
 
 
 class AllvsAll(torch.utils.data.Dataset):
@@ -255,6 +418,9 @@ class AllvsAll(torch.utils.data.Dataset):
     relation_idxs : dictonary
         string representation of a relation to its integer id
 
+    sparse_targets : bool
+        If True, mini-batches contain (row, label) pairs of positive labels instead of multi-label vectors
+
     Returns
     -------
     self : torch.utils.data.Dataset
@@ -273,50 +439,63 @@ class AllvsAll(torch.utils.data.Dataset):
     """
 
     def __init__(self, train_set_idx: np.ndarray, entity_idxs, relation_idxs,
-                 label_smoothing_rate=0.0):
+                 label_smoothing_rate=0.0, sparse_targets: bool = False):
         super().__init__()
         assert len(train_set_idx) > 0
         assert isinstance(train_set_idx, np.ndarray)
         self.train_data = None
         self.train_target = None
+        self.train_target_offsets = None
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
-        self.collate_fn = None
-        # (1) Create a dictionary of training data pints
+        self.sparse_targets = sparse_targets
+        self.collate_fn = collate_constructed_batch
+        # (1) Group training data points in compressed sparse row format
         # Either from tuple of entities or tuple of an entity and a relation
         self.target_dim = len(entity_idxs)
         # (h,r) => [t]
-        store = mapping_from_first_two_cols_to_third(train_set_idx)
-        print("Number of unique pairs:", len(store))
-        for i in range(len(entity_idxs)):
-            for j in range(len(relation_idxs)):
-                if store.get((i, j), None) is None:
-                    store[(i, j)] = list()
-        print("Number of unique augmented pairs:", len(store))
-        assert len(store) > 0
-        self.train_data = torch.LongTensor(list(store.keys()))
-
-        if sum([len(i) for i in store.values()]) == len(store):
-            self.train_target = np.array(list(store.values()))
-            assert isinstance(self.train_target[0], np.ndarray)
-        else:
-            self.train_target = list(store.values())
-            assert isinstance(self.train_target[0], list)
-        del store
+        pairs, offsets, targets = group_third_by_first_two_cols(train_set_idx)
+        print("Number of unique pairs:", len(pairs))
+        # (2) Append all (h,r) pairs not occurring in the training data with no targets.
+        all_pairs = np.stack(np.meshgrid(np.arange(len(entity_idxs)), np.arange(len(relation_idxs)),
+                                         indexing='ij'), axis=-1).reshape(-1, 2)
+        missing = ~np.isin(all_pairs[:, 0].astype(np.int64) * len(relation_idxs) + all_pairs[:, 1],
+                           pairs[:, 0].astype(np.int64) * len(relation_idxs) + pairs[:, 1])
+        pairs = np.concatenate((pairs, all_pairs[missing].astype(pairs.dtype)))
+        offsets = np.concatenate((offsets, np.full(missing.sum(), offsets[-1], dtype=np.int64)))
+        print("Number of unique augmented pairs:", len(pairs))
+        assert len(pairs) > 0
+        # Pairs and targets keep the integer type of train_set_idx and are widened to int64 per mini-batch.
+        self.train_data = torch.from_numpy(pairs)
+        self.train_target_offsets = torch.from_numpy(offsets)
+        self.train_target = torch.from_numpy(targets)
 
     def __len__(self):
-        assert len(self.train_data) == len(self.train_target)
+        assert len(self.train_data) == len(self.train_target_offsets) - 1
         return len(self.train_data)
 
     def __getitem__(self, idx):
         # 1. Initialize a vector of output.
         y_vec = torch.zeros(self.target_dim)
-        existing_indices = self.train_target[idx]
+        existing_indices = self.train_target[self.train_target_offsets[idx]:self.train_target_offsets[idx + 1]].long()
         if len(existing_indices) > 0:
-            y_vec[self.train_target[idx]] = 1.0
+            y_vec[existing_indices] = 1.0
 
         if self.label_smoothing_rate:
             y_vec = y_vec * (1 - self.label_smoothing_rate) + (1 / y_vec.size(0))
-        return self.train_data[idx], y_vec
+        return self.train_data[idx].long(), y_vec
+
+    def __getitems__(self, indices: List[int]) -> Tuple[torch.LongTensor, torch.Tensor]:
+        """ Construct a mini-batch at once: multi-label vectors via a single scatter, followed by label smoothing.
+        With sparse_targets, only (row, label) pairs of positive labels are returned and
+        label smoothing is applied in the loss."""
+        indices = torch.as_tensor(indices)
+        x = self.train_data[indices].long()
+        if self.sparse_targets:
+            return x, sparse_multi_hot_targets(self.train_target_offsets, self.train_target, indices, self.target_dim)
+        y = multi_hot_targets(self.train_target_offsets, self.train_target, indices, self.target_dim)
+        if self.label_smoothing_rate:
+            y = y * (1 - self.label_smoothing_rate) + (1 / self.target_dim)
+        return x, y
 
 
 class KvsSampleDataset(torch.utils.data.Dataset):
@@ -343,13 +522,16 @@ class KvsSampleDataset(torch.utils.data.Dataset):
             ?
        label_smoothing_rate
            ?
+       shared_candidates
+           If True, a mini-batch shares a single set of candidate entities, i.e., the union of the positives of
+           the mini-batch and neg_sample_ratio many sampled entities.
        Returns
        -------
        torch.utils.data.Dataset
        """
 
     def __init__(self, train_set: np.ndarray, num_entities, num_relations, neg_sample_ratio: int = None,
-                 label_smoothing_rate: float = 0.0):
+                 label_smoothing_rate: float = 0.0, shared_candidates: bool = False):
         super().__init__()
         assert isinstance(train_set, np.ndarray)
         assert isinstance(neg_sample_ratio, int)
@@ -358,37 +540,31 @@ class KvsSampleDataset(torch.utils.data.Dataset):
         self.num_relations = num_relations
         self.neg_sample_ratio = neg_sample_ratio
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
-        self.collate_fn = None
+        self.shared_candidates = shared_candidates
+        self.collate_fn = collate_constructed_batch if shared_candidates else None
 
         if self.neg_sample_ratio == 0:
             print(f'neg_sample_ratio is {neg_sample_ratio}. It will be set to 10.')
             self.neg_sample_ratio = 10
 
         print('Constructing training data...')
-        store = mapping_from_first_two_cols_to_third(train_set)
-        self.train_data = torch.IntTensor(list(store.keys()))
+        pairs, offsets, targets = group_third_by_first_two_cols(train_set)
+        self.train_data = torch.IntTensor(pairs.astype(np.int32))
         # https://pytorch.org/docs/stable/data.html#multi-process-data-loading
         # TLDL; replace Python objects with non-refcounted representations such as Pandas, Numpy or PyArrow objects
-        # Unsure whether a list of numpy arrays are non-refcounted
-        self.train_target = list([np.array(i) for i in store.values()])
-        del store
-        # @TODO: Investigate reference counts of using list of numpy arrays.
-        # import sys
-        # import gc
-        # print(sys.getrefcount(self.train_target))
-        # print(sys.getrefcount(self.train_target[0]))
-        # print(gc.get_referrers(self.train_target))
-        # print(gc.get_referrers(self.train_target[0]))
+        # Tail entities of the i.th pair are train_target[train_target_offsets[i]:train_target_offsets[i+1]].
+        self.train_target_offsets = offsets
+        self.train_target = targets
 
     def __len__(self):
-        assert len(self.train_data) == len(self.train_target)
+        assert len(self.train_data) == len(self.train_target_offsets) - 1
         return len(self.train_data)
 
     def __getitem__(self, idx):
         # (1) Get i.th unique (head,relation) pair.
         x = self.train_data[idx]
         # (2) Get tail entities given (1).
-        positives_idx = self.train_target[idx]
+        positives_idx = self.train_target[self.train_target_offsets[idx]:self.train_target_offsets[idx + 1]]
         num_positives = len(positives_idx)
         # (3) Do we need to subsample (2) to create training data points of same size.
         if num_positives < self.neg_sample_ratio:
@@ -411,18 +587,53 @@ class KvsSampleDataset(torch.utils.data.Dataset):
         y_vec = torch.cat((torch.ones(len(positives_idx)), torch.zeros(len(negative_idx))), 0)
         return x, y_idx, y_vec
 
+    def __getitems__(self, indices: List[int]):
+        """
+        Construct a mini-batch. With shared_candidates,
+
+        (1) Get tail entities of unique (head,relation) pairs.
+        (2) Union (1) with sampled entities to obtain candidates shared across the mini-batch.
+        (3) Create binary labels of (2) for each pair.
+
+        Returns
+        -------
+        x: torch.IntTensor with (b, 2) shape
+        y_idx: torch.LongTensor with (k,) shape
+        y: torch.FloatTensor with (b, k) shape
+        """
+        if not self.shared_candidates:
+            return [self[idx] for idx in indices]
+        indices = torch.as_tensor(indices)
+        # (1) Get tail entities given pairs.
+        rows, positives_idx = positive_labels(torch.from_numpy(self.train_target_offsets),
+                                              torch.from_numpy(self.train_target), indices)
+        positives_idx = positives_idx.long()
+        # (2) Sorted unique candidates.
+        y_idx = torch.unique(torch.cat((positives_idx, torch.randint(low=0, high=self.num_entities,
+                                                                      size=(self.neg_sample_ratio,))), 0))
+        # (3) Create binary labels.
+        y = torch.zeros(len(indices), len(y_idx))
+        y[rows, torch.searchsorted(y_idx, positives_idx)] = 1.0
+        return self.train_data[indices], y_idx, y
+
 
 class NegSampleDataset(torch.utils.data.Dataset):
-    def __init__(self, train_set: np.ndarray, num_entities: int, num_relations: int, neg_sample_ratio: int = 1):
+    def __init__(self, train_set: np.ndarray, num_entities: int, num_relations: int, neg_sample_ratio: int = 1,
+                 filtered_negatives: bool = False):
         assert isinstance(train_set, np.ndarray)
         # https://pytorch.org/docs/stable/data.html#multi-process-data-loading
         # TLDL; replace Python objects with non-refcounted representations such as Pandas, Numpy or PyArrow objects
         self.neg_sample_ratio = torch.tensor(
             neg_sample_ratio)
-        self.train_set = torch.from_numpy(train_set).unsqueeze(1)
+        self.train_set = zero_copy_tensor(train_set).unsqueeze(1)
         self.length = len(self.train_set)
         self.num_entities = torch.tensor(num_entities)
         self.num_relations = torch.tensor(num_relations)
+        # Sorted int64 codes of training triples to reject known positives as negatives.
+        self.known_triple_codes = None
+        if filtered_negatives:
+            self.known_triple_codes = torch.unique(encode_triples(self.train_set[:, 0], num_entities, num_relations))
+        self.collate_fn = collate_constructed_batch
 
     def __len__(self):
         return self.length
@@ -445,6 +656,25 @@ class NegSampleDataset(torch.utils.data.Dataset):
         y = torch.tensor([1.0, 0.0])
         return x, y
 
+    def __getitems__(self, indices: List[int]) -> Tuple[torch.LongTensor, torch.FloatTensor]:
+        """ Construct a mini-batch at once: a coin is flipped per triple to corrupt either its head or its tail """
+        # (1) Get triples.
+        triples = self.train_set[torch.as_tensor(indices), 0].long()
+        # (2) Flip coins: 2 (tail) or 0 (head).
+        corrupted_columns = (torch.rand(len(triples)) >= 0.5).long() * 2
+        # (3) Corrupt (1) via sampled entities.
+        negatives = triples.clone()
+        negatives[torch.arange(len(triples)), corrupted_columns] = torch.randint(0, high=self.num_entities,
+                                                                                 size=(len(triples),))
+        if self.known_triple_codes is not None:
+            reject_known_triples(negatives, corrupted_columns, self.known_triple_codes,
+                                 self.num_entities, self.num_relations)
+        # (4) Concat positive and negative triples.
+        x = torch.stack((triples, negatives), dim=1)
+        # (5) Concat labels of (4).
+        y = torch.tensor([1.0, 0.0]).repeat(len(triples), 1)
+        return x, y
+
 
 class TriplePredictionDataset(torch.utils.data.Dataset):
     """
@@ -471,8 +701,10 @@ class TriplePredictionDataset(torch.utils.data.Dataset):
             ?
        label_smoothing_rate
 
+       filtered_negatives
+           If True, negative triples being known training triples are resampled.
 
-       collate_fn: batch:List[torch.IntTensor]
+       collate_fn: batch:List[torch.IntTensor] or torch.LongTensor
        Returns
        -------
        torch.utils.data.Dataset
@@ -480,18 +712,23 @@ class TriplePredictionDataset(torch.utils.data.Dataset):
 
     @timeit
     def __init__(self, train_set: np.ndarray, num_entities: int, num_relations: int, neg_sample_ratio: int = 1,
-                 label_smoothing_rate: float = 0.0):
+                 label_smoothing_rate: float = 0.0, filtered_negatives: bool = False):
         assert isinstance(train_set, np.ndarray)
         # https://pytorch.org/docs/stable/data.html#multi-process-data-loading
         # TLDL; replace Python objects with non-refcounted representations such as Pandas, Numpy or PyArrow objects
         self.label_smoothing_rate = torch.tensor(label_smoothing_rate)
         self.neg_sample_ratio = torch.tensor(
             neg_sample_ratio)  # 0 Implies that we do not add negative samples. This is needed during testing and validation
-        self.train_set = torch.from_numpy(train_set)
-        assert num_entities >= max(self.train_set[:, 0]) and num_entities >= max(self.train_set[:, 2])
+        # Triples keep their integer type and are widened to int64 per mini-batch.
+        self.train_set = zero_copy_tensor(train_set)
+        assert num_entities >= self.train_set[:, 0].max() and num_entities >= self.train_set[:, 2].max()
         self.length = len(self.train_set)
         self.num_entities = torch.tensor(num_entities)
         self.num_relations = torch.tensor(num_relations)
+        # Sorted int64 codes of training triples to reject known positives as negatives.
+        self.known_triple_codes = None
+        if filtered_negatives:
+            self.known_triple_codes = torch.unique(encode_triples(self.train_set, num_entities, num_relations))
 
     def __len__(self):
         return self.length
@@ -499,35 +736,26 @@ class TriplePredictionDataset(torch.utils.data.Dataset):
     def __getitem__(self, idx):
         return self.train_set[idx]
 
-    def collate_fn(self, batch: List[torch.Tensor]):
-        batch = torch.stack(batch, dim=0)
-        h, r, t = batch[:, 0], batch[:, 1], batch[:, 2]
+    def __getitems__(self, indices: List[int]) -> torch.LongTensor:
+        return self.train_set[torch.as_tensor(indices)]
+
+    def collate_fn(self, batch: Union[List[torch.Tensor], torch.LongTensor]):
+        if isinstance(batch, list):
+            batch = torch.stack(batch, dim=0)
         size_of_batch, _ = batch.shape
         assert size_of_batch > 0
         label = torch.ones((size_of_batch,)) - self.label_smoothing_rate
         corr_entities = torch.randint(0, high=self.num_entities, size=(size_of_batch * self.neg_sample_ratio,))
-        if torch.rand(1) >= 0.5:
-            # corrupt head
-            r_head_corr = r.repeat(self.neg_sample_ratio, )
-            t_head_corr = t.repeat(self.neg_sample_ratio, )
-            label_head_corr = torch.zeros(len(t_head_corr)) + self.label_smoothing_rate
-
-            h = torch.cat((h, corr_entities), 0)
-            r = torch.cat((r, r_head_corr), 0)
-            t = torch.cat((t, t_head_corr), 0)
-            x = torch.stack((h, r, t), dim=1)
-            label = torch.cat((label, label_head_corr), 0)
-        else:
-            # corrupt tail
-            h_tail_corr = h.repeat(self.neg_sample_ratio, )
-            r_tail_corr = r.repeat(self.neg_sample_ratio, )
-            label_tail_corr = torch.zeros(len(r_tail_corr)) + self.label_smoothing_rate
-
-            h = torch.cat((h, h_tail_corr), 0)
-            r = torch.cat((r, r_tail_corr), 0)
-            t = torch.cat((t, corr_entities), 0)
-            x = torch.stack((h, r, t), dim=1)
-            label = torch.cat((label, label_tail_corr), 0)
+        # (1) Corrupt either heads or tails of all triples at once.
+        negatives = batch.long().repeat(self.neg_sample_ratio, 1)
+        corrupted_column = 0 if torch.rand(1) >= 0.5 else 2
+        negatives[:, corrupted_column] = corr_entities
+        # (2) Resample negatives being known positives.
+        if self.known_triple_codes is not None:
+            reject_known_triples(negatives, torch.full((len(negatives),), corrupted_column),
+                                 self.known_triple_codes, self.num_entities, self.num_relations)
+        x = torch.cat((batch, negatives), 0)
+        label = torch.cat((label, torch.zeros(len(negatives)) + self.label_smoothing_rate), 0)
 
         """        
         # corrupt head, tail or rel ?!
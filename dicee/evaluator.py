@@ -1,8 +1,10 @@
 import torch
 import numpy as np
 import json
-from .static_funcs import pickle
+import os
+from concurrent.futures import Future
 from .static_funcs_training import evaluate_lp
+from .read_preprocess_save_load_kg.util import FilterIndex
 
 
 class Evaluator:
@@ -25,6 +27,8 @@ class Evaluator:
         self.args = args
         self.report = dict()
         self.during_training = False
+        # The dataset from which the filter indexes are prepared.
+        self.vocab_source = None
 
     def vocab_preparation(self, dataset) -> None:
         """
@@ -38,20 +42,23 @@ class Evaluator:
         None
         """
         # print("** VOCAB Prep **")
-        if isinstance(dataset.er_vocab, dict):
-            self.er_vocab = dataset.er_vocab
-        else:
+        if self.vocab_source is dataset:
+            # Filter indexes have already been prepared, e.g. the evaluator is reused over many runs.
+            return
+        if isinstance(dataset.er_vocab, Future):
             self.er_vocab = dataset.er_vocab.result()
-
-        if isinstance(dataset.re_vocab, dict):
-            self.re_vocab = dataset.re_vocab
         else:
+            self.er_vocab = dataset.er_vocab
+
+        if isinstance(dataset.re_vocab, Future):
             self.re_vocab = dataset.re_vocab.result()
+        else:
+            self.re_vocab = dataset.re_vocab
 
-        if isinstance(dataset.ee_vocab, dict):
+        if isinstance(dataset.ee_vocab, Future):
             self.ee_vocab = dataset.ee_vocab.result()
         else:
-            self.ee_vocab = dataset.ee_vocab.result()
+            self.ee_vocab = dataset.ee_vocab
 
         if isinstance(dataset.constraints, tuple):
             self.domain_constraints_per_rel, self.range_constraints_per_rel = dataset.constraints
@@ -64,9 +71,12 @@ class Evaluator:
         self.num_entities = dataset.num_entities
         self.num_relations = dataset.num_relations
 
-        pickle.dump(self.er_vocab, open(self.args.full_storage_path + "/er_vocab.p", "wb"))
-        pickle.dump(self.re_vocab, open(self.args.full_storage_path + "/re_vocab.p", "wb"))
-        pickle.dump(self.ee_vocab, open(self.args.full_storage_path + "/ee_vocab.p", "wb"))
+        self.vocab_source = dataset
+        # Store filter indexes unless they have already been serialized, e.g. by LoadSaveToDisk.
+        for name in ['er_vocab', 're_vocab', 'ee_vocab']:
+            path = os.path.join(self.args.full_storage_path, name)
+            if isinstance(getattr(self, name), FilterIndex) and not os.path.isfile(path + '_keys.npy'):
+                getattr(self, name).save(path)
 
     # @timeit
     def eval(self, dataset, trained_model, form_of_labelling, during_training=False) -> None:
@@ -102,21 +112,21 @@ class Evaluator:
     def dummy_eval(self, trained_model, form_of_labelling):
 
         if self.is_continual_training:
-            self.er_vocab = pickle.load(open(self.args.full_storage_path + "/er_vocab.p", "rb"))
-            self.re_vocab = pickle.load(open(self.args.full_storage_path + "/re_vocab.p", "rb"))
-            self.ee_vocab = pickle.load(open(self.args.full_storage_path + "/ee_vocab.p", "rb"))
+            self.er_vocab = FilterIndex.load(self.args.full_storage_path + "/er_vocab")
+            self.re_vocab = FilterIndex.load(self.args.full_storage_path + "/re_vocab")
+            self.ee_vocab = FilterIndex.load(self.args.full_storage_path + "/ee_vocab")
 
         if 'train' in self.args.eval_model:
-            train_set = np.load(self.args.full_storage_path + "/train_set.npy")
+            train_set = np.load(self.args.full_storage_path + "/train_set.npy", mmap_mode='r')
         else:
             train_set = None
         if 'val' in self.args.eval_model:
-            valid_set = np.load(self.args.full_storage_path + "/valid_set.npy")
+            valid_set = np.load(self.args.full_storage_path + "/valid_set.npy", mmap_mode='r')
         else:
             valid_set = None
 
         if 'test' in self.args.eval_model:
-            test_set = np.load(self.args.full_storage_path + "/test_set.npy")
+            test_set = np.load(self.args.full_storage_path + "/test_set.npy", mmap_mode='r')
         else:
             test_set = None
 
@@ -199,11 +209,11 @@ class Evaluator:
                 # Generate predictions
                 predictions = model.forward_k_vs_all(x=e1_idx_e2_idx)
                 # Filter entities except the target entity
-                for j in range(data_batch.shape[0]):
-                    filt = self.ee_vocab[(data_batch[j][0], data_batch[j][2])]
-                    target_value = predictions[j, r_idx[j]].item()
-                    predictions[j, filt] = -np.Inf
-                    predictions[j, r_idx[j]] = target_value
+                batch_range = torch.arange(data_batch.shape[0])
+                target_values = predictions[batch_range, r_idx].clone()
+                rows, filt = self.ee_vocab.lookup(data_batch[:, 0], data_batch[:, 2])
+                predictions[torch.from_numpy(rows), torch.from_numpy(filt)] = -np.Inf
+                predictions[batch_range, r_idx] = target_values
                 # Sort predictions.
                 sort_values, sort_idxs = torch.sort(predictions, dim=1, descending=True)
                 # This can be also done in parallel
@@ -225,20 +235,20 @@ class Evaluator:
                 with torch.no_grad():
                     predictions = model(e1_idx_r_idx)
                 # (4) Filter entities except the target entity
-                for j in range(data_batch.shape[0]):
-                    # (4.1) Get the ids of the head entity, the relation and the target tail entity in the j.th triple.
-                    id_e, id_r, id_e_target = data_batch[j]
-                    # (4.2) Get all ids of all entities occurring with the head entity and relation extracted in 4.1.
-                    filt = self.er_vocab[(id_e, id_r)]
-                    # (4.3) Store the assigned score of the target tail entity extracted in 4.1.
-                    target_value = predictions[j, id_e_target].item()
-                    # (4.4.1) Filter all assigned scores for entities.
-                    predictions[j, filt] = -np.Inf
-                    # (4.4.2) Filter entities based on the range of a relation as well.
-                    if 'constraint' in self.args.eval_model:
+                batch_range = torch.arange(data_batch.shape[0])
+                e2_idx = e2_idx.long()
+                # (4.1) Store the assigned scores of the target tail entities.
+                target_values = predictions[batch_range, e2_idx].clone()
+                # (4.2) Get all ids of all entities occurring with the head entities and relations of the batch.
+                rows, filt = self.er_vocab.lookup(data_batch[:, 0], data_batch[:, 1])
+                # (4.3) Filter all assigned scores for entities.
+                predictions[torch.from_numpy(rows), torch.from_numpy(filt)] = -np.Inf
+                # (4.4) Filter entities based on the range of a relation as well.
+                if 'constraint' in self.args.eval_model:
+                    for j in range(data_batch.shape[0]):
                         predictions[j, self.range_constraints_per_rel[data_batch[j, 1]]] = -np.Inf
-                    # (4.5) Insert 4.3. after filtering.
-                    predictions[j, id_e_target] = target_value
+                # (4.5) Insert 4.1. after filtering.
+                predictions[batch_range, e2_idx] = target_values
                 # (5) Sort predictions.
                 sort_values, sort_idxs = torch.sort(predictions, dim=1, descending=True)
                 # (6) Compute the filtered ranks.
@@ -3,19 +3,23 @@ import logging
 import time
 import warnings
 from types import SimpleNamespace
+from typing import Dict, List, Tuple
+import copy
 import os
 import datetime
 import argparse
 from pytorch_lightning import seed_everything
 
 from dicee.knowledge_graph import KG
+from dicee.read_preprocess_save_load_kg import LoadSaveToDisk
 from dicee.evaluator import Evaluator
 # Avoid
 from dicee.static_preprocess_funcs import preprocesses_input_args
 from dicee.trainer import DICE_Trainer
 import pytorch_lightning as pl
 
-from dicee.static_funcs import timeit, continual_training_setup_executor, read_or_load_kg, load_json, store
+from dicee.static_funcs import timeit, continual_training_setup_executor, read_or_load_kg, load_json, store, \
+    create_experiment_folder, save_numpy_ndarray, StringIndex
 from dicee.sanity_checkers import config_kge_sanity_checking
 
 
@@ -32,7 +36,8 @@ class Execute:
     (3) Storing all necessary info
     """
 
-    def __init__(self, args, continuous_training=False):
+    def __init__(self, args, continuous_training=False, dataset: KG = None, evaluator: Evaluator = None,
+                 share_dataset: bool = False):
         # (1) Process arguments and sanity checking.
         self.args = preprocesses_input_args(args)
         # (2) Ensure reproducibility.
@@ -44,12 +49,14 @@ class Execute:
         # (5) A variable is initialized for pytorch lightning trainer or DICE_Trainer()
         self.trainer = None
         self.trained_model = None
-        # (6) A variable is initialized for storing input data.
-        self.dataset = None
+        # (6) A variable is initialized for storing input data. A previously preprocessed KG can be reused.
+        self.dataset = dataset
+        # A given KG or a KG to be reused by later runs (share_dataset) is not modified, e.g. train_set is kept.
+        self.is_dataset_shared = share_dataset or dataset is not None
         # (7) Store few data in memory for numerical results, e.g. runtime, H@1 etc.
         self.report = dict()
-        # (8) Create an object to carry out link prediction evaluations
-        self.evaluator = None  # e.g. Evaluator(self)
+        # (8) Create an object to carry out link prediction evaluations. A previous evaluator can be reused.
+        self.evaluator = evaluator  # e.g. Evaluator(self)
         # (9) Execution start time
         self.start_time = None
 
@@ -68,7 +75,18 @@ class Execute:
 
         """
         # (1) Read & Preprocess & Index & Serialize Input Data.
-        self.dataset = read_or_load_kg(self.args, cls=KG)
+        if self.dataset is None:
+            self.dataset = read_or_load_kg(self.args, cls=KG)
+        else:
+            # (1.1) Reuse the given KG and only serialize its indexes, filter indexes and constraints
+            # into the new experiment folder.
+            StringIndex.from_mapping(self.dataset.entity_to_idx).save(self.args.full_storage_path + '/entity_to_idx')
+            StringIndex.from_mapping(self.dataset.relation_to_idx).save(self.args.full_storage_path + '/relation_to_idx')
+            for name in ['train_set', 'valid_set', 'test_set']:
+                if getattr(self.dataset, name) is not None:
+                    save_numpy_ndarray(data=getattr(self.dataset, name),
+                                       file_path=self.args.full_storage_path + f'/{name}.npy')
+            LoadSaveToDisk(kg=self.dataset).save_filter_indexes(self.args.full_storage_path)
         # (2) Sanity checking.
         self.args, self.dataset = config_kge_sanity_checking(self.args, self.dataset)
         # (3) Store the stats
@@ -192,18 +210,79 @@ class Execute:
         # (1) Loading the Data
         #  Load the indexed data from disk or read a raw data from disk.
         self.load_indexed_data() if self.is_continual_training else self.read_preprocess_index_serialize_data()
-        # (2) Create an evaluator object.
-        self.evaluator = Evaluator(args=self.args)
+        # (2) Create an evaluator object or reuse the given one, e.g. its filter indexes.
+        if self.evaluator is None:
+            self.evaluator = Evaluator(args=self.args)
+        else:
+            self.evaluator.args = self.args
+            self.evaluator.report = dict()
         # (3) Create a trainer object.
         self.trainer = DICE_Trainer(args=self.args,
                                     is_continual_training=self.is_continual_training,
                                     storage_path=self.storage_path,
-                                    evaluator=self.evaluator)
+                                    evaluator=self.evaluator,
+                                    is_dataset_shared=self.is_dataset_shared)
         # (4) Start the training
         # @TODO: Why do we need to pass self.dataset as an input?
         self.trained_model, form_of_labelling = self.trainer.start(dataset=self.dataset)
         return self.end(form_of_labelling)
 
+    def start_multi_signature(self, signatures: List[Tuple[int, int, int]]) -> Dict[Tuple[int, int, int], dict]:
+        """
+        Train and evaluate a model for each (p,q,r) signature in a single process
+
+        (1) Load the data once.
+        (2) Train all models on the same stream of mini-batches.
+        (3) For each model, store the model, the configuration and the evaluation results
+        into storage_path/p_q_r/<datetime> as if it were trained in a single run.
+
+        Parameter
+        ---------
+        signatures: a list of (p,q,r) tuples
+
+        Returns
+        -------
+        A dict mapping each signature to its report
+        """
+        assert self.is_continual_training is False
+        self.start_time = time.time()
+        print(f"Start time:{datetime.datetime.now()}")
+        # (1) Loading the Data
+        self.read_preprocess_index_serialize_data()
+        # (2) Train
+        self.trainer = DICE_Trainer(args=self.args,
+                                    is_continual_training=self.is_continual_training,
+                                    storage_path=self.storage_path,
+                                    evaluator=None,
+                                    is_dataset_shared=self.is_dataset_shared)
+        trained_models = self.trainer.start_multi_signature(dataset=self.dataset, signatures=signatures)
+        runtime_training = time.time() - self.start_time
+        # (3) Store and evaluate each model.
+        reports = dict()
+        for (p, q, r), (trained_model, form_of_labelling) in zip(signatures, trained_models):
+            args = copy.copy(self.args)
+            args.p, args.q, args.r = p, q, r
+            args.full_storage_path = create_experiment_folder(folder_name=os.path.join(self.args.storage_path,
+                                                                                       f"{p}_{q}_{r}"))
+            with open(args.full_storage_path + '/configuration.json', 'w') as file_descriptor:
+                json.dump(vars(args), file_descriptor, indent=3)
+            trained_model.eval()
+            trained_model.to('cpu')
+            report = {**self.report, **trained_model.mem_of_model(), 'runtime_training': runtime_training,
+                      'path_experiment_folder': args.full_storage_path}
+            # Embeddings are not stored as csv since vocabularies are stored only in self.storage_path.
+            store(trainer=self.trainer, trained_model=trained_model, model_name='model',
+                  full_storage_path=args.full_storage_path, save_embeddings_as_csv=False)
+            if args.eval_model is not None:
+                evaluator = Evaluator(args=args)
+                evaluator.eval(dataset=self.dataset, trained_model=trained_model, form_of_labelling=form_of_labelling)
+                report.update(evaluator.report)
+            report['Runtime'] = time.time() - self.start_time
+            with open(args.full_storage_path + '/report.json', 'w') as file_descriptor:
+                json.dump(report, file_descriptor, indent=4)
+            reports[(p, q, r)] = report
+        return reports
+
 
 class ContinuousExecute(Execute):
     """ A subclass of Execute Class for retraining
@@ -1,6 +1,6 @@
 from typing import List
 import numpy as np
-from .read_preprocess_save_load_kg import ReadFromDisk, PreprocessKG, LoadSaveToDisk
+from .read_preprocess_save_load_kg import ReadFromDisk, PreprocessKG, LoadSaveToDisk, StreamFromDisk
 import sys
 
 
@@ -15,7 +15,8 @@ class KG:
                  add_reciprical: bool = None, eval_model: str = None,
                  read_only_few: int = None, sample_triples_ratio: float = None,
                  path_for_serialization: str = None,
-                 entity_to_idx=None, relation_to_idx=None, backend=None):
+                 entity_to_idx=None, relation_to_idx=None, backend=None, path_of_cache: str = None,
+                 streaming_chunk_size: int = None):
         """
         @TODO: Renzhong, can you please update/modify the docstrings.
         :param data_dir: A path of a folder containing the input knowledge graph
@@ -29,6 +30,10 @@ class KG:
         If no eval, then entity relation mappings will be deleted to free memory.
         :param add_noise_rate: Add say 10% noise in the input data
         sample_triples_ratio
+        :param path_of_cache: A path of a folder containing the preprocessed knowledge graph shared across runs.
+        If it does not exist, it is created after preprocessing.
+        :param streaming_chunk_size: If given, input files are read, indexed and written into disk in chunks of
+        this many triples, and triples are memory-mapped.
         """
         self.sparql_endpoint = sparql_endpoint
         self.add_noise_rate = add_noise_rate
@@ -47,14 +52,25 @@ class KG:
         self.entity_to_idx = entity_to_idx
         self.relation_to_idx = relation_to_idx
         self.backend = 'pandas' if backend is None else backend
+        self.path_of_cache = path_of_cache
+        self.streaming_chunk_size = streaming_chunk_size
         self.train_set, self.valid_set, self.test_set = None, None, None
 
-        if self.path_for_deserialization is None:
+        if self.path_for_deserialization is not None:
+            LoadSaveToDisk(kg=self).load()
+        elif LoadSaveToDisk.is_cached(self.path_of_cache):
+            LoadSaveToDisk(kg=self).load_from_cache()
+        elif self.streaming_chunk_size:
+            StreamFromDisk(kg=self, chunk_size=self.streaming_chunk_size).start()
+            LoadSaveToDisk(kg=self).save()
+            if self.path_of_cache is not None:
+                LoadSaveToDisk(kg=self).save_to_cache()
+        else:
             ReadFromDisk(kg=self).start()
             PreprocessKG(kg=self).start()
             LoadSaveToDisk(kg=self).save()
-        else:
-            LoadSaveToDisk(kg=self).load()
+            if self.path_of_cache is not None:
+                LoadSaveToDisk(kg=self).save_to_cache()
 
         assert len(self.train_set) > 0
         assert len(self.train_set[0]) > 0
@@ -9,6 +9,7 @@ from .static_funcs import random_prediction, deploy_triple_prediction, deploy_ta
     deploy_relation_prediction, deploy_head_entity_prediction, load_pickle
 from .static_funcs_training import evaluate_lp
 from .static_preprocess_funcs import create_constraints
+from .read_preprocess_save_load_kg.util import FilterIndex
 import numpy as np
 import sys
 
@@ -40,8 +41,8 @@ class KGE(BaseInteractiveKGE):
             [(self.entity_to_idx[s], self.relation_to_idx[p], self.entity_to_idx[o]) for s, p, o in dataset])
         if filtered:
             return evaluate_lp(model=self.model, triple_idx=idx_dataset, num_entities=len(self.entity_to_idx),
-                               er_vocab=load_pickle(self.path + '/er_vocab.p'),
-                               re_vocab=load_pickle(self.path + '/re_vocab.p'))
+                               er_vocab=FilterIndex.load(self.path + '/er_vocab'),
+                               re_vocab=FilterIndex.load(self.path + '/re_vocab'))
         else:
             return evaluate_lp(model=self.model, triple_idx=idx_dataset, num_entities=len(self.entity_to_idx),
                                er_vocab=None, re_vocab=None)
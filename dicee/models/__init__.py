@@ -3,6 +3,6 @@ from .real import * # noqa
 from .complex import * # noqa
 from .quaternion import * # noqa
 from .octonion import * # noqa
-from .clifford import Keci, KeciBase, CMult,DeCaL # noqa
+from .clifford import Keci, KeciBase, CMult,DeCaL, DeCaLSupernet # noqa
 from .pykeen_models import * # noqa
 from .function_space import * # noqa
@@ -1,7 +1,9 @@
 from typing import List, Any, Tuple, Union, Dict
+import inspect
 import pytorch_lightning
 import numpy as np
 import torch
+import torch.utils.checkpoint
 
 
 class BaseKGE(pytorch_lightning.LightningModule):
@@ -20,6 +22,8 @@ class BaseKGE(pytorch_lightning.LightningModule):
         self.kernel_size = None
         self.num_of_output_channels = None
         self.weight_decay = None
+        self.label_smoothing_rate = None
+        self.entity_chunk_size = None
         self.loss = torch.nn.BCEWithLogitsLoss()
         self.selected_optimizer = None
         self.normalizer_class = None
@@ -53,6 +57,19 @@ class BaseKGE(pytorch_lightning.LightningModule):
             self.weight_decay = self.args['weight_decay']
         else:
             self.weight_decay = 0.0
+        if self.args.get('label_smoothing_rate'):
+            self.label_smoothing_rate = self.args['label_smoothing_rate']
+        else:
+            self.label_smoothing_rate = 0.0
+        # forward_k_vs_all of some models can score a slice or a subset of entities.
+        scores_subsets_of_entities = 'entities' in inspect.signature(self.forward_k_vs_all).parameters
+        if self.args.get('entity_chunk_size'):
+            if scores_subsets_of_entities:
+                self.entity_chunk_size = self.args['entity_chunk_size']
+            else:
+                print(f'--entity_chunk_size is not supported by {self.__class__.__name__}')
+        if self.args.get('shared_candidates') and not scores_subsets_of_entities:
+            raise NotImplementedError(f'--shared_candidates is not supported by {self.__class__.__name__}')
         if self.args.get('embedding_dim'):
             self.embedding_dim = self.args['embedding_dim']
         else:
@@ -158,8 +175,91 @@ class BaseKGE(pytorch_lightning.LightningModule):
         return self.selected_optimizer
 
     def loss_function(self, yhat_batch, y_batch):
+        if y_batch.dtype == torch.long:
+            return self.sparse_target_loss(yhat_batch, y_batch)
         return self.loss(yhat_batch, y_batch)
 
+    def sparse_target_loss(self, yhat_batch: torch.FloatTensor, y_batch: torch.LongTensor) -> torch.FloatTensor:
+        """
+        Binary cross entropy with logits over multi-label vectors given by unique (row, label) pairs
+        of positive labels, see --sparse_targets.
+
+        (1) BCE(z, y) = softplus(z) - y z
+        (2) Label smoothing y * (1 - label_smoothing_rate) + 1 / |E| is applied analytically.
+
+        Parameter
+        ---------
+        yhat_batch: torch.FloatTensor with (b, |E|) shape
+        y_batch: torch.LongTensor with (2, nnz) shape
+
+        Returns
+        -------
+        mean loss
+        """
+        rows, labels = y_batch
+        return self.sum_of_sparse_target_losses(yhat_batch, rows, labels, yhat_batch.size(1)) / yhat_batch.numel()
+
+    def sum_of_sparse_target_losses(self, yhat_batch: torch.FloatTensor, rows: torch.LongTensor,
+                                    labels: torch.LongTensor, target_dim: int) -> torch.FloatTensor:
+        """ Sum of binary cross entropy with logits, where yhat_batch[rows, labels] are the positive labels """
+        # (1) Sum of losses as if all labels were zero minus the logits of the positive labels.
+        loss = torch.nn.functional.softplus(yhat_batch).sum() - (1 - self.label_smoothing_rate) * yhat_batch[
+            rows, labels].sum()
+        # (2) Each label receives 1/|E| by label smoothing.
+        if self.label_smoothing_rate:
+            loss = loss - yhat_batch.sum() / target_dim
+        return loss
+
+    def k_vs_all_block_loss(self, x_batch: torch.LongTensor, y_batch: torch.Tensor,
+                            start: int, stop: int) -> torch.FloatTensor:
+        """
+        Sum of losses of a block of entities under KvsAll
+
+        Parameter
+        ---------
+        x_batch: torch.LongTensor with (b, 2) shape
+        y_batch: torch.FloatTensor with (b, |E|) shape or torch.LongTensor with (2, nnz) shape (see --sparse_targets)
+        start: index of the first entity in the block
+        stop: index of the last entity in the block + 1
+
+        Returns
+        -------
+        sum of losses
+        """
+        yhat_block = self.forward_k_vs_all(x=x_batch, entities=slice(start, stop))
+        if y_batch.dtype == torch.long:
+            rows, labels = y_batch
+            in_block = (labels >= start) & (labels < stop)
+            return self.sum_of_sparse_target_losses(yhat_block, rows[in_block], labels[in_block] - start,
+                                                    self.num_entities)
+        return torch.nn.functional.binary_cross_entropy_with_logits(yhat_block, y_batch[:, start:stop],
+                                                                    reduction='sum')
+
+    def chunked_k_vs_all_loss(self, x_batch: torch.LongTensor, y_batch: torch.Tensor) -> torch.FloatTensor:
+        """
+        KvsAll loss computed over blocks of --entity_chunk_size entities.
+
+        (1) Logits of a block are freed after its loss is computed and recomputed in the backward pass.
+        (2) Hence, the peak memory of activations is bounded by the block size instead of |E|.
+
+        Dropout masks are sampled per block.
+
+        Parameter
+        ---------
+        x_batch: torch.LongTensor with (b, 2) shape
+        y_batch: torch.FloatTensor with (b, |E|) shape or torch.LongTensor with (2, nnz) shape (see --sparse_targets)
+
+        Returns
+        -------
+        mean loss
+        """
+        loss = 0
+        for start in range(0, self.num_entities, self.entity_chunk_size):
+            stop = min(start + self.entity_chunk_size, self.num_entities)
+            loss = loss + torch.utils.checkpoint.checkpoint(self.k_vs_all_block_loss, x_batch, y_batch, start, stop,
+                                                            use_reentrant=False)
+        return loss / (len(x_batch) * self.num_entities)
+
     def forward_triples(self, *args, **kwargs):
         raise ValueError(f'MODEL:{self.name} does not have forward_triples function')
 
@@ -174,11 +274,14 @@ class BaseKGE(pytorch_lightning.LightningModule):
         """
 
         :param x: a batch of inputs
-        :param y_idx: indices of selected outputs.
+        :param y_idx: indices of selected outputs, either per input (n, k) or shared by all inputs (k,).
         :return:
         """
         if isinstance(x, tuple):
             x, y_idx = x
+            if y_idx.dim() == 1:
+                # Candidates shared across the batch (see --shared_candidates) are scored via a single GEMM.
+                return self.forward_k_vs_all(x=x, entities=y_idx)
             return self.forward_k_vs_sample(x=x, target_entity_idx=y_idx)
         else:
             batch_size, dim = x.shape
@@ -208,6 +311,8 @@ class BaseKGE(pytorch_lightning.LightningModule):
 
     def training_step(self, batch, batch_idx=None):
         x_batch, y_batch = batch
+        if self.entity_chunk_size and isinstance(x_batch, torch.Tensor) and x_batch.shape[1] == 2:
+            return self.chunked_k_vs_all_loss(x_batch, y_batch)
         yhat_batch = self.forward(x_batch)
         loss_batch = self.loss_function(yhat_batch, y_batch)
         return loss_batch
@@ -1,5 +1,9 @@
+from typing import Union
 from .base_model import BaseKGE
+from .static_funcs import sum_upper_antisymmetric, sum_cross_antisymmetric
+from .clifford_codegen import load_decal_query_fn
 import torch
+import random
 
 
 class CMult(BaseKGE):
@@ -269,18 +273,14 @@ class Keci(BaseKGE):
                         sigma_pp = torch.stack(results, dim=2)
                         assert sigma_pp.shape == (b, r, int((p * (p - 1)) / 2))
 
-        Yet, this computation would be quite inefficient. Instead, we compute interactions along all p,
-        e.g., e1e1, e1e2, e1e3,
-              e2e1, e2e2, e2e3,
-              e3e1, e3e2, e3e3
-        Then select the triangular matrix without diagonals: e1e2, e1e3, e2e3.
+        Yet, scores only use the sum of these interactions. Hence, we compute the sum with prefix sums in O(p)
+        without materializing p by p interactions (see sum_upper_antisymmetric).
+
+        Returns
+        -------
+        torch.FloatTensor with (n, r) shape
         """
-        # Compute indexes for the upper triangle of p by p matrix
-        indices = torch.triu_indices(self.p, self.p, offset=1)
-        # Compute p by p operations
-        sigma_pp = torch.einsum('nrp,nrx->nrpx', hp, rp) - torch.einsum('nrx,nrp->nrpx', hp, rp)
-        sigma_pp = sigma_pp[:, :, indices[0], indices[1]]
-        return sigma_pp
+        return sum_upper_antisymmetric(hp, rp)
 
     def compute_sigma_qq(self, hq, rq):
         """
@@ -296,22 +296,14 @@ class Keci(BaseKGE):
                         sigma_qq = torch.stack(results, dim=2)
                         assert sigma_qq.shape == (b, r, int((q * (q - 1)) / 2))
 
-        Yet, this computation would be quite inefficient. Instead, we compute interactions along all p,
-        e.g., e1e1, e1e2, e1e3,
-              e2e1, e2e2, e2e3,
-              e3e1, e3e2, e3e3
-        Then select the triangular matrix without diagonals: e1e2, e1e3, e2e3.
-        """
-        # Compute indexes for the upper triangle of p by p matrix
-        if self.q > 1:
-            indices = torch.triu_indices(self.q, self.q, offset=1)
-            # Compute p by p operations
-            sigma_qq = torch.einsum('nrp,nrx->nrpx', hq, rq) - torch.einsum('nrx,nrp->nrpx', hq, rq)
-            sigma_qq = sigma_qq[:, :, indices[0], indices[1]]
-        else:
-            sigma_qq = torch.zeros((len(hq), self.r, int((self.q * (self.q - 1)) / 2)))
+        Yet, scores only use the sum of these interactions. Hence, we compute the sum with prefix sums in O(q)
+        without materializing q by q interactions (see sum_upper_antisymmetric).
 
-        return sigma_qq
+        Returns
+        -------
+        torch.FloatTensor with (n, r) shape
+        """
+        return sum_upper_antisymmetric(hq, rq)
 
     def compute_sigma_pq(self, *, hp, hq, rp, rq):
         """
@@ -324,10 +316,13 @@ class Keci(BaseKGE):
                 sigma_pq[:, :, i, j] = hp[:, :, i] * rq[:, :, j] - hq[:, :, j] * rp[:, :, i]
         print(sigma_pq.shape)
 
+        The sum of these interactions is (\sum_i h_i)(\sum_j r_j) - (\sum_j h_j)(\sum_i r_i).
+
+        Returns
+        -------
+        torch.FloatTensor with (n, r) shape
         """
-        sigma_pq = torch.einsum('nrp,nrq->nrpq', hp, rq) - torch.einsum('nrq,nrp->nrpq', hq, rp)
-        assert sigma_pq.shape[1:] == (self.r, self.p, self.q)
-        return sigma_pq
+        return sum_cross_antisymmetric(x_a=hp, x_b=hq, y_a=rp, y_b=rq)
 
     def clifford_multiplication(self, h0, hp, hq, r0, rp, rq):
         """ Compute our CL multiplication
@@ -367,9 +362,13 @@ class Keci(BaseKGE):
         # (3)
         sigma_q = torch.einsum('nr,nrq->nrq', h0, rq) + torch.einsum('nr,nrq->nrq', r0, hq)
         # (4)
-        sigma_pp = self.compute_sigma_pp(hp, rp)
+        indices = torch.triu_indices(self.p, self.p, offset=1)
+        sigma_pp = torch.einsum('nrp,nrx->nrpx', hp, rp) - torch.einsum('nrx,nrp->nrpx', hp, rp)
+        sigma_pp = sigma_pp[:, :, indices[0], indices[1]]
         # (5)
-        sigma_qq = self.compute_sigma_qq(hq, rq)
+        indices = torch.triu_indices(self.q, self.q, offset=1)
+        sigma_qq = torch.einsum('nrp,nrx->nrpx', hq, rq) - torch.einsum('nrx,nrp->nrpx', hq, rq)
+        sigma_qq = sigma_qq[:, :, indices[0], indices[1]]
         # (6)
         sigma_pq = torch.einsum('bkp,bkq->bkpq', hp, rq) - torch.einsum('bkp,bkq->bkpq', rp, hq)
         assert sigma_pq.shape == (n, self.r, self.p, self.q)
@@ -406,35 +405,17 @@ class Keci(BaseKGE):
 
         # Compute sigma_pp sigma_qq and sigma_pq
         if self.p > 1:
-            results = []
-            for i in range(self.p - 1):
-                for k in range(i + 1, self.p):
-                    results.append(hp[:, :, i] * rp[:, :, k] - hp[:, :, k] * rp[:, :, i])
-            sigma_pp = torch.stack(results, dim=2)
-            assert sigma_pp.shape == (n, self.r, int((self.p * (self.p - 1)) / 2))
-            sigma_pp = torch.sum(sigma_pp, dim=[1, 2]).view(n, 1)
-            del results
+            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=1).view(n, 1)
         else:
             sigma_pp = 0
 
         if self.q > 1:
-            results = []
-            for j in range(self.q - 1):
-                for k in range(j + 1, self.q):
-                    results.append(hq[:, :, j] * rq[:, :, k] - hq[:, :, k] * rq[:, :, j])
-            sigma_qq = torch.stack(results, dim=2)
-            del results
-            assert sigma_qq.shape == (n, self.r, int((self.q * (self.q - 1)) / 2))
-            sigma_qq = torch.sum(sigma_qq, dim=[1, 2]).view(n, 1)
+            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=1).view(n, 1)
         else:
             sigma_qq = 0
 
         if self.p >= 1 and self.q >= 1:
-            sigma_pq = torch.zeros(n, self.r, self.p, self.q)
-            for i in range(self.p):
-                for j in range(self.q):
-                    sigma_pq[:, :, i, j] = hp[:, :, i] * rq[:, :, j] - hq[:, :, j] * rp[:, :, i]
-            sigma_pq = torch.sum(sigma_pq, dim=[1, 2, 3]).view(n, 1)
+            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=1).view(n, 1)
         else:
             sigma_pq = 0
 
@@ -480,7 +461,7 @@ class Keci(BaseKGE):
             aq = torch.zeros((batch_size, r, q), device=self.device)
         return a0, ap, aq
 
-    def forward_k_vs_all(self, x: torch.Tensor) -> torch.FloatTensor:
+    def forward_k_vs_all(self, x: torch.Tensor, entities: Union[slice, torch.LongTensor] = slice(None)) -> torch.FloatTensor:
         """
         Kvsall training
 
@@ -493,6 +474,7 @@ class Keci(BaseKGE):
         Parameter
         ---------
         x: torch.LongTensor with (n,2) shape
+        entities: a slice or indices of entities to be scored
         Returns
         -------
         torch.FloatTensor with (n, |E|) shape
@@ -505,7 +487,7 @@ class Keci(BaseKGE):
 
         h0, hp, hq, h0, rp, rq = self.apply_coefficients(h0, hp, hq, h0, rp, rq)
         # (3) Extract all entity embeddings
-        E = self.entity_embeddings.weight
+        E = self.entity_embeddings.weight[entities]
         # (3.1) Extract real part
         t0 = E[:, :self.r]
         # (4) Compute a triple score based on interactions described by the basis 1. Eq. 20
@@ -513,7 +495,7 @@ class Keci(BaseKGE):
 
         # (5) Compute a triple score based on interactions described by the bases of p {e_1, ..., e_p}. Eq. 21
         if self.p > 0:
-            tp = E[:, self.r: self.r + (self.r * self.p)].view(self.num_entities, self.r, self.p)
+            tp = E[:, self.r: self.r + (self.r * self.p)].view(len(E), self.r, self.p)
             hp_rp_t0 = torch.einsum('brp, er  -> be', hp * rp, t0)
             h0_rp_tp = torch.einsum('brp, erp -> be', torch.einsum('br,  brp -> brp', h0, rp), tp)
             hp_r0_tp = torch.einsum('brp, erp -> be', torch.einsum('brp, br  -> brp', hp, r0), tp)
@@ -523,7 +505,7 @@ class Keci(BaseKGE):
 
         # (5) Compute a triple score based on interactions described by the bases of q {e_{p+1}, ..., e_{p+q}}. Eq. 22
         if self.q > 0:
-            tq = E[:, -(self.r * self.q):].view(self.num_entities, self.r, self.q)
+            tq = E[:, -(self.r * self.q):].view(len(E), self.r, self.q)
             h0_rq_tq = torch.einsum('brq, erq -> be', torch.einsum('br,  brq -> brq', h0, rq), tq)
             hq_r0_tq = torch.einsum('brq, erq -> be', torch.einsum('brq, br  -> brq', hq, r0), tq)
             hq_rq_t0 = torch.einsum('brq, er  -> be', hq * rq, t0)
@@ -532,17 +514,17 @@ class Keci(BaseKGE):
             score_q = 0
 
         if self.p >= 2:
-            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=[1, 2]).unsqueeze(-1)
+            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=1).unsqueeze(-1)
         else:
             sigma_pp = 0
 
         if self.q >= 2:
-            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=[1, 2]).unsqueeze(-1)
+            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=1).unsqueeze(-1)
         else:
             sigma_qq = 0
 
         if self.p >= 2 and self.q >= 2:
-            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=[1, 2, 3]).unsqueeze(-1)
+            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=1).unsqueeze(-1)
         else:
             sigma_pq = 0
         return h0r0t0 + score_p + score_q + sigma_pp + sigma_qq + sigma_pq
@@ -585,17 +567,17 @@ class Keci(BaseKGE):
             score_q = 0
 
         if self.p >= 2:
-            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=[1, 2]).unsqueeze(-1)
+            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=1).unsqueeze(-1)
         else:
             sigma_pp = 0
 
         if self.q >= 2:
-            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=[1, 2]).unsqueeze(-1)
+            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=1).unsqueeze(-1)
         else:
             sigma_qq = 0
 
         if self.p >= 2 and self.q >= 2:
-            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=[1, 2, 3]).unsqueeze(-1)
+            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=1).unsqueeze(-1)
         else:
             sigma_pq = 0
         return h0r0t0 + score_p + score_q + sigma_pp + sigma_qq + sigma_pq
@@ -646,17 +628,17 @@ class Keci(BaseKGE):
             score_q = 0
 
         if self.p >= 2:
-            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=[1, 2]).unsqueeze(-1)
+            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=1).unsqueeze(-1)
         else:
             sigma_pp = 0
 
         if self.q >= 2:
-            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=[1, 2]).unsqueeze(-1)
+            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=1).unsqueeze(-1)
         else:
             sigma_qq = 0
 
         if self.p >= 2 and self.q >= 2:
-            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=[1, 2, 3]).unsqueeze(-1)
+            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=1).unsqueeze(-1)
         else:
             sigma_pq = 0
         return h0r0t0 + score_p + score_q + sigma_pp + sigma_qq + sigma_pq
@@ -756,93 +738,245 @@ class DeCaL(BaseKGE): # Extending embeddings in cl_pq to cl_pqr
         if self.r > 0:
             self.r_coefficients = torch.nn.Embedding(num_embeddings=1, embedding_dim=self.r)
             torch.nn.init.zeros_(self.r_coefficients.weight)
-
-    def forward_triples(self, x: torch.Tensor) -> torch.FloatTensor:
+        # Structure of Cl_{p,q,r} used by the fused scoring, computed once per model.
+        self.construct_cl_structure()
+        # A TorchScript query constructor specialized to (p,q,r) and cached under the storage path.
+        self.cl_query_fn = None
+        if self.args.get("compile_scorer", False):
+            self.cl_query_fn = load_decal_query_fn(p=self.p, q=self.q, r=self.r, re=self.re,
+                                                   embedding_dim=self.embedding_dim,
+                                                   path=self.args.get("storage_path", None))
+
+    def construct_cl_structure(self) -> None:
         """
+        Precompute the layout and the signs of the blades of Cl_{p,q,r}(\mathbb{R}^d)
+
+        A d-dimensional embedding vector x is split into a0 = x[:, :re] and
+        ap = x[:, re: re + re*p], aq = x[:, re + re*p: re + re*p + re*q], ar = x[:, -re*r:]
+        where the blocks ap, aq and ar are viewed as (re, p), (re, q) and (re, r) tensors.
+        For every column of ap, aq and ar, we store
+            (1) blade_columns: its index in x,
+            (2) blade_to_scalar: the column of a0 that it interacts with,
+            (3) blade_to_coefficient: the index of its scaling coefficient in [p_coef, q_coef, r_coef],
+            (4) blade_signs: e_i^2, i.e., +1 for p, -1 for q, and 0 for r.
+        cl_columns contains all columns of x being used, i.e., the columns of a0 followed by blade_columns.
+        If 1+p+q+r does not divide d, few columns of x are not used.
+        """
+        re = self.re
+        columns, to_scalar, to_coefficient, signs = [], [], [], []
+        offset_coefficient = 0
+        for n, start, sign in [(self.p, re, 1.0),
+                               (self.q, re + re * self.p, -1.0),
+                               (self.r, self.embedding_dim - re * self.r, 0.0)]:
+            if n == 0:
+                continue
+            position = torch.arange(re * n)
+            columns.append(start + position)
+            # A block is viewed as (re, n), i.e., the column j * n + i is the i.th blade of the j.th scalar column.
+            to_scalar.append(torch.div(position, n, rounding_mode='floor'))
+            to_coefficient.append(offset_coefficient + position % n)
+            signs.append(torch.full((re * n,), sign))
+            offset_coefficient += n
+        if len(columns) > 0:
+            blade_columns, blade_to_scalar = torch.cat(columns), torch.cat(to_scalar)
+            blade_to_coefficient, blade_signs = torch.cat(to_coefficient), torch.cat(signs)
+        else:
+            blade_columns, blade_to_scalar = torch.zeros(0, dtype=torch.long), torch.zeros(0, dtype=torch.long)
+            blade_to_coefficient, blade_signs = torch.zeros(0, dtype=torch.long), torch.zeros(0)
+        # Buffers follow the model across devices but are not stored in the state dict.
+        self.register_buffer('blade_columns', blade_columns, persistent=False)
+        self.register_buffer('blade_to_scalar', blade_to_scalar, persistent=False)
+        self.register_buffer('blade_to_coefficient', blade_to_coefficient, persistent=False)
+        self.register_buffer('blade_signs', blade_signs, persistent=False)
+        self.register_buffer('cl_columns', torch.cat((torch.arange(re), blade_columns)), persistent=False)
+        # True if all d columns are used in their original order
+        self.uses_all_columns = len(self.cl_columns) == self.embedding_dim
+
+    @staticmethod
+    def blade_grids(p: int, q: int, r: int, embedding_dim: int) -> list[torch.LongTensor]:
+        """ Columns of a0, ap, aq and ar in an embedding vector of Cl_{p,q,r} as (re,1), (re,p), (re,q) and (re,r)"""
+        re = int(embedding_dim / (1 + p + q + r))
+        return [torch.arange(re).view(re, 1),
+                (re + torch.arange(re * p)).view(re, p),
+                (re + re * p + torch.arange(re * q)).view(re, q),
+                (embedding_dim - re * r + torch.arange(re * r)).view(re, r)]
+
+    @torch.no_grad()
+    def warm_start(self, weights: dict, p: int, q: int, r: int) -> None:
+        """
+        Initialize the model from the state dict of a trained DeCaL model of a neighbouring signature Cl_{p,q,r}
+
+        (1) The scalar part and the first min(p, self.p), min(q, self.q) and min(r, self.r) blades of entity and
+        relation embeddings are copied. Since re depends on the signature, only the first min(re, self.re)
+        components of each blade are copied. Remaining columns keep their initial values.
+        (2) Scaling coefficients of the copied blades are copied.
 
         Parameter
         ---------
-        x: torch.LongTensor with (n,3) shape
+        weights: dict state dict of DeCaL trained with the same embedding_dim
+        p: int
+        q: int
+        r: int
 
         Returns
         -------
-        torch.FloatTensor with (n) shape
+        None
         """
-        # (1) Retrieve real-valued embedding vectors.
-        head_ent_emb, rel_ent_emb, tail_ent_emb = self.get_triple_representation(x)
-        # (2) Construct multi-vector in Cl_{p,q,r} (\mathbb{R}^d) for head entities and relations
-        h0, hp, hq, hk = self.construct_cl_multivector(head_ent_emb, re=self.re, p=self.p, q=self.q, r= self.r)
-        r0, rp, rq, rk = self.construct_cl_multivector(rel_ent_emb, re=self.re, p=self.p, q=self.q, r= self.r)
-        t0, tp, tq, tk = self.construct_cl_multivector(tail_ent_emb, re=self.re, p=self.p, q=self.q, r=self.r)
-
-        #h0, hp, hq, hk, h0, rp, rq, rk = self.apply_coefficients(h0, hp, hq, hk, h0, rp, rq,rk)
-        
-        
-        # (4) Compute a triple score based on interactions described by the basis 1. 
-        h0r0t0 = torch.einsum('br, br -> b', h0 * r0, t0)
+        assert weights['entity_embeddings.weight'].shape == self.entity_embeddings.weight.shape
+        # (1) Copy overlapping blocks.
+        source_columns, target_columns = [], []
+        for source, target in zip(self.blade_grids(p, q, r, self.embedding_dim),
+                                  self.blade_grids(self.p, self.q, self.r, self.embedding_dim)):
+            k, m = min(source.shape[0], target.shape[0]), min(source.shape[1], target.shape[1])
+            source_columns.append(source[:k, :m].flatten())
+            target_columns.append(target[:k, :m].flatten())
+        source_columns, target_columns = torch.cat(source_columns), torch.cat(target_columns)
+        for name in ['entity_embeddings', 'relation_embeddings']:
+            getattr(self, name).weight[:, target_columns] = weights[f'{name}.weight'][:, source_columns].to(
+                getattr(self, name).weight.device)
+        # (2) Copy scaling coefficients.
+        for name, n_source, n_target in [('p', p, self.p), ('q', q, self.q), ('r', r, self.r)]:
+            m = min(n_source, n_target)
+            if m > 0:
+                getattr(self, f'{name}_coefficients').weight[0, :m] = weights[f'{name}_coefficients.weight'][0, :m]
+
+    def get_coefficients(self) -> torch.FloatTensor:
+        """ Concatenation of p, q and r scaling coefficients, i.e. (p+q+r,) """
+        coefficients = [getattr(self, f'{name}_coefficients').weight[0]
+                        for name, n in [('p', self.p), ('q', self.q), ('r', self.r)] if n > 0]
+        if len(coefficients) == 0:
+            return self.blade_signs
+        return torch.cat(coefficients)
+
+    def get_blade_coefficients(self) -> torch.FloatTensor:
+        """ Scaling coefficient of each column in blade_columns """
+        return self.get_coefficients()[self.blade_to_coefficient]
+
+    def split_blades(self, x: torch.FloatTensor) -> tuple[torch.FloatTensor, torch.FloatTensor, torch.FloatTensor]:
+        """ Split (n, re*(p+q+r)) blade columns into (n,re,p), (n,re,q) and (n,re,r) views """
+        n = len(x)
+        xp = x[:, :self.re * self.p].view(n, self.re, self.p)
+        xq = x[:, self.re * self.p:self.re * (self.p + self.q)].view(n, self.re, self.q)
+        xk = x[:, self.re * (self.p + self.q):].view(n, self.re, self.r)
+        return xp, xq, xk
 
-        # (5) Compute a triple score based on interactions described by the bases of p {e_1, ..., e_p}.
-        if self.p > 0:
-            # Second term in Eq.16
-            hp_rp_t0 = torch.einsum('brp, br  -> b', hp * rp, t0)
-            # Eq. 17
-            # b=e
-            h0_rp_tp = torch.einsum('brp, erp -> b', torch.einsum('br,  brp -> brp', h0, rp), tp)
-            hp_r0_tp = torch.einsum('brp, erp -> b', torch.einsum('brp, br  -> brp', hp, r0), tp)
+    def construct_cl_query(self, head_ent_emb: torch.FloatTensor, rel_ent_emb: torch.FloatTensor) -> tuple[
+        torch.FloatTensor, torch.FloatTensor]:
+        """
+        Fold a batch of head entities and relations into a single query vector per row.
 
-            score_p = hp_rp_t0 + h0_rp_tp + hp_r0_tp
-        else:
-            score_p = 0
+        The score of a tail entity t is the inner product of the query with t[cl_columns] plus the
+        sum of the bivector interactions (sigma_pp, sigma_qq, sigma_rr, sigma_pq, sigma_pr, sigma_qr)
+        that do not depend on t.
 
-        # (5) Compute a triple score based on interactions described by the bases of q {e_{p+1}, ..., e_{p+q}}. Eq. 22
-        if self.q > 0:
-            # Third item in Eq 16.
-            hq_rq_t0 = torch.einsum('brq, br  -> b', hq * rq, t0)
-            # Eq. 18.
-            h0_rq_tq = torch.einsum('br, brq  -> b', h0, rq * tq)
-            r0_hq_tq = torch.einsum('br, brq  -> b', r0, hq * tq)
-            score_q = - hq_rq_t0 + (h0_rq_tq + r0_hq_tq)
-        else:
-            score_q = 0
+        (1) query_0 = h_0 r_0 + \sum_{i=1}^{p} h_i r_i - \sum_{j=p+1}^{p+q} h_j r_j
+        (2) query_i = h_0 r_i + h_i r_0 for 1 <= i <= p+q+r
 
-        if self.r > 0:
-            # Eq. 18.
-            h0_rk_tk = torch.einsum('br, brk  -> b', h0, rk * tk)
-            r0_hk_tk = torch.einsum('br, brk  -> b', r0, hk * tk)
-            score_r =  (h0_rk_tk + r0_hk_tk)
-        else:
-            score_r = 0
+        Parameter
+        ---------
+        head_ent_emb: torch.FloatTensor with (n,d) shape
+        rel_ent_emb: torch.FloatTensor with (n,d) shape
 
+        Returns
+        -------
+        query: torch.FloatTensor with (n, len(cl_columns)) shape
+        sigma: torch.FloatTensor with (n, 1) shape
+        """
+        if self.cl_query_fn is not None:
+            return self.cl_query_fn(head_ent_emb, rel_ent_emb, self.get_coefficients())
+        h0, r0 = head_ent_emb[:, :self.re], rel_ent_emb[:, :self.re]
+        # (1) Blades of heads and relations multiplied with their scalar coefficients.
+        coefficients = self.get_blade_coefficients()
+        hb = head_ent_emb[:, self.blade_columns] * coefficients
+        rb = rel_ent_emb[:, self.blade_columns] * coefficients
+        # (2) Interactions with the scalar part of tails.
+        query_0 = torch.index_add(h0 * r0, 1, self.blade_to_scalar, hb * rb * self.blade_signs)
+        # (3) Interactions with the blades of tails.
+        query_b = h0[:, self.blade_to_scalar] * rb + hb * r0[:, self.blade_to_scalar]
+        # (4) Bivector interactions.
+        hp, hq, hk = self.split_blades(hb)
+        rp, rq, rk = self.split_blades(rb)
+        sigma = self.compute_sigma_bivectors(hp, hq, hk, rp, rq, rk)
+        return torch.cat((query_0, query_b), dim=1), sigma
+
+    def compute_sigma_bivectors(self, hp, hq, hk, rp, rq, rk) -> torch.FloatTensor:
+        """ Sum of sigma_pp, sigma_qq, sigma_rr, sigma_pq, sigma_pr and sigma_qr for each row, i.e. (n,1) """
+        sigma = hp.new_zeros(len(hp), 1)
         if self.p >= 2:
-            sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=[1, 2]).unsqueeze(-1)
-        else:
-            sigma_pp = 0
-
+            sigma = sigma + torch.sum(self.compute_sigma_pp(hp, rp), dim=1).unsqueeze(-1)
         if self.q >= 2:
-            sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=[1, 2]).unsqueeze(-1)
-        else:
-            sigma_qq = 0
-
+            sigma = sigma + torch.sum(self.compute_sigma_qq(hq, rq), dim=1).unsqueeze(-1)
         if self.r >= 2:
-            sigma_rr = torch.sum(self.compute_sigma_qq(hk, rk), dim=[1, 2]).unsqueeze(-1)
-        else:
-            sigma_rr = 0
-
+            sigma = sigma + torch.sum(self.compute_sigma_rr(hk, rk), dim=1).unsqueeze(-1)
         if self.p >= 2 and self.q >= 2:
-            sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=[1, 2, 3]).unsqueeze(-1)
-        else:
-            sigma_pq = 0
-
+            sigma = sigma + torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=1).unsqueeze(-1)
         if self.p >= 2 and self.r >= 2:
-            sigma_pr = torch.sum(self.compute_sigma_pq(hp=hp, hk=hk, rp=rp, rk=rk), dim=[1, 2, 3]).unsqueeze(-1)
-        else:
-            sigma_pr = 0
+            sigma = sigma + torch.sum(self.compute_sigma_pr(hp=hp, hk=hk, rp=rp, rk=rk), dim=1).unsqueeze(-1)
         if self.q >= 2 and self.r >= 2:
-            sigma_qr = torch.sum(self.compute_sigma_pq(hq=hq, hk=hk, rq=rq, rk=rk), dim=[1, 2, 3]).unsqueeze(-1)
-        else:
-            sigma_qr = 0
-        return h0r0t0 + score_p + score_q + score_r + sigma_pp + sigma_qq + sigma_rr + sigma_pq + sigma_qr + sigma_pr
+            sigma = sigma + torch.sum(self.compute_sigma_qr(hq=hq, hk=hk, rq=rq, rk=rk), dim=1).unsqueeze(-1)
+        return sigma
+
+    def get_cl_entity_embeddings(self, entities: Union[slice, torch.LongTensor] = slice(None)) -> torch.FloatTensor:
+        """ Columns of all (or a subset of) entity embeddings being used in Cl_{p,q,r}, i.e. (|E|, len(cl_columns)) """
+        if self.uses_all_columns:
+            return self.entity_embeddings.weight[entities]
+        return self.entity_embeddings.weight[entities][:, self.cl_columns]
+
+    def select_cl_entity_embeddings(self, idx: torch.LongTensor) -> torch.FloatTensor:
+        """ Columns of selected entity embeddings being used in Cl_{p,q,r}, i.e. (*idx.shape, len(cl_columns)) """
+        emb = self.entity_embeddings(idx)
+        if self.uses_all_columns:
+            return emb
+        return emb[..., self.cl_columns]
 
+    def forward_triples(self, x: torch.Tensor) -> torch.FloatTensor:
+        """
+        (1) Retrieve real-valued embedding vectors for heads, relations and tails \mathbb{R}^d .
+        (2) Fold head entity and relation multivectors in Cl_{p,q,r}(\mathbb{R}^d) into a query vector (see construct_cl_query).
+        (3) Inner product of (2) and tail entity embeddings.
+
+        Parameter
+        ---------
+        x: torch.LongTensor with (n,3) shape
+
+        Returns
+        -------
+        torch.FloatTensor with (n) shape
+        """
+        # (1) Retrieve real-valued embedding vectors.
+        head_ent_emb, rel_ent_emb, tail_ent_emb = self.get_triple_representation(x)
+        # (2) Construct a query vector and the tail independent bivector interactions.
+        query, sigma = self.construct_cl_query(head_ent_emb, rel_ent_emb)
+        # (3) Inner product of (2) and tail entity embeddings.
+        if not self.uses_all_columns:
+            tail_ent_emb = tail_ent_emb[:, self.cl_columns]
+        return torch.sum(query * tail_ent_emb, dim=1) + sigma.squeeze(-1)
+
+    def forward_k_vs_sample(self, x: torch.LongTensor, target_entity_idx: torch.LongTensor) -> torch.FloatTensor:
+        """
+        KvsSample training
+
+        (1) Retrieve real-valued embedding vectors for heads and relations \mathbb{R}^d .
+        (2) Fold head entity and relation multivectors in Cl_{p,q,r}(\mathbb{R}^d) into a query vector (see construct_cl_query).
+        (3) Batched inner product of (2) and the selected tail entity embeddings.
+
+        Parameter
+        ---------
+        x: torch.LongTensor with (n,2) shape
+        target_entity_idx: torch.LongTensor with (n,k) shape
+
+        Returns
+        -------
+        torch.FloatTensor with (n, k) shape
+        """
+        # (1) Retrieve real-valued embedding vectors.
+        head_ent_emb, rel_ent_emb = self.get_head_relation_representation(x)
+        # (2) Construct a query vector and the tail independent bivector interactions.
+        query, sigma = self.construct_cl_query(head_ent_emb, rel_ent_emb)
+        # (3) Select tail entity embeddings, i.e., (n,k,len(cl_columns)).
+        selected_tail_entity_embeddings = self.select_cl_entity_embeddings(target_entity_idx)
+        # (4) Inner product of (2) and (3).
+        return torch.bmm(selected_tail_entity_embeddings, query.unsqueeze(-1)).squeeze(-1) + sigma
 
     def cl_pqr(self, a):
 
@@ -948,99 +1082,31 @@ class DeCaL(BaseKGE): # Extending embeddings in cl_pq to cl_pqr
         return sigma_pp,sigma_qq,sigma_rr,sigma_pq,sigma_pr,sigma_qr
 
 
-    def forward_k_vs_all(self, x: torch.Tensor) -> torch.FloatTensor:
-
-            """
-            Kvsall training
-
-            (1) Retrieve real-valued embedding vectors for heads and relations \mathbb{R}^d .
-            (2) Construct head entity and relation embeddings according to Cl_{p,q}(\mathbb{R}^d) .
-            (3) Perform Cl multiplication
-            (4) Inner product of (3) and all entity embeddings
-
-            forward_k_vs_with_explicit and this funcitons are identical
-            Parameter
-            ---------
-            x: torch.LongTensor with (n,2) shape
-            Returns
-            -------
-            torch.FloatTensor with (n, |E|) shape
-            """
-            # (1) Retrieve real-valued embedding vectors.
-            head_ent_emb, rel_ent_emb = self.get_head_relation_representation(x)
-            # (2) Construct multi-vector in Cl_{p,q} (\mathbb{R}^d) for head entities and relations
-            h0, hp, hq, hk = self.construct_cl_multivector(head_ent_emb, re=self.re, p=self.p, q=self.q, r= self.r)
-            r0, rp, rq, rk = self.construct_cl_multivector(rel_ent_emb, re=self.re, p=self.p, q=self.q, r= self.r)
-
-            h0, hp, hq, hk, h0, rp, rq, rk = self.apply_coefficients(h0, hp, hq, hk, h0, rp, rq,rk)
-            # (3) Extract all entity embeddings
-            E = self.entity_embeddings.weight
-            # (3.1) Extract real part
-            t0 = E[:, :self.re]
-            # (4) Compute a triple score based on interactions described by the basis 1. 
-            h0r0t0 = torch.einsum('br,er->be', h0 * r0, t0)
-
-            # (5) Compute a triple score based on interactions described by the bases of p {e_1, ..., e_p}. 
-            if self.p > 0:
-                tp = E[:, self.re: self.re + (self.re * self.p)].view(self.num_entities, self.re, self.p)
-                hp_rp_t0 = torch.einsum('brp, er  -> be', hp * rp, t0)
-                h0_rp_tp = torch.einsum('brp, erp -> be', torch.einsum('br,  brp -> brp', h0, rp), tp)
-                hp_r0_tp = torch.einsum('brp, erp -> be', torch.einsum('brp, br  -> brp', hp, r0), tp)
-                score_p = hp_rp_t0 + h0_rp_tp + hp_r0_tp
-            else:
-                score_p = 0
-
-            # (5) Compute a triple score based on interactions described by the bases of q {e_{p+1}, ..., e_{p+q}}. 
-            if self.q > 0:
-                num = self.re + (self.re * self.p)
-                tq = E[:, num:num+(self.re * self.q)].view(self.num_entities, self.re, self.q)
-                h0_rq_tq = torch.einsum('brq, erq -> be', torch.einsum('br,  brq -> brq', h0, rq), tq)
-                hq_r0_tq = torch.einsum('brq, erq -> be', torch.einsum('brq, br  -> brq', hq, r0), tq)
-                hq_rq_t0 = torch.einsum('brq, er  -> be', hq * rq, t0)
-                score_q = h0_rq_tq + hq_r0_tq - hq_rq_t0
-            else:
-                score_q = 0
-
-            # (6) Compute a triple score based on interactions described by the bases of q {e_{p+q+1}, ..., e_{p+q+r}}. 
-            if self.r > 0:
-                tk = E[:, -(self.re * self.r):].view(self.num_entities, self.re, self.r)
-                h0_rk_tk = torch.einsum('brk, erk -> be', torch.einsum('br,  brk -> brk', h0, rk), tk)
-                hk_r0_tk = torch.einsum('brk, erk -> be', torch.einsum('brk, br  -> brk', hk, r0), tk)
-                #hq_rq_t0 = torch.einsum('brq, er  -> be', hq * rq, t0)
-                score_r = h0_rk_tk + hk_r0_tk 
-            else:
-                score_r = 0
-
-            if self.p >= 2:
-                sigma_pp = torch.sum(self.compute_sigma_pp(hp, rp), dim=[1, 2]).unsqueeze(-1)
-            else:
-                sigma_pp = 0
+    def forward_k_vs_all(self, x: torch.Tensor, entities: Union[slice, torch.LongTensor] = slice(None)) -> torch.FloatTensor:
+        """
+        Kvsall training
 
-            if self.q >= 2:
-                sigma_qq = torch.sum(self.compute_sigma_qq(hq, rq), dim=[1, 2]).unsqueeze(-1)
-            else:
-                sigma_qq = 0
+        (1) Retrieve real-valued embedding vectors for heads and relations \mathbb{R}^d .
+        (2) Fold head entity and relation multivectors in Cl_{p,q,r}(\mathbb{R}^d) into a query vector (see construct_cl_query).
+        (3) Score all entities with a single matrix multiplication, i.e., sigma + query E^T.
 
-            if self.r >= 2:
-                sigma_rr = torch.sum(self.compute_sigma_rr(hk, rk), dim=[1, 2]).unsqueeze(-1)
-            else:
-                sigma_rr = 0
+        The score is identical to the sum of the interactions described by the basis 1, the bases of p, q, and r,
+        and the sigma terms, yet no (n, |E|) intermediate result is created for each interaction.
+        Parameter
+        ---------
+        x: torch.LongTensor with (n,2) shape
+        entities: a slice or indices of entities to be scored
+        Returns
+        -------
+        torch.FloatTensor with (n, |E|) shape
+        """
+        # (1) Retrieve real-valued embedding vectors.
+        head_ent_emb, rel_ent_emb = self.get_head_relation_representation(x)
+        # (2) Construct a query vector and the tail independent bivector interactions.
+        query, sigma = self.construct_cl_query(head_ent_emb, rel_ent_emb)
+        # (3) Inner product of (2) and all entity embeddings.
+        return torch.addmm(sigma, query, self.get_cl_entity_embeddings(entities).transpose(1, 0))
 
-            if self.p >= 2 and self.q >= 2:
-                sigma_pq = torch.sum(self.compute_sigma_pq(hp=hp, hq=hq, rp=rp, rq=rq), dim=[1, 2, 3]).unsqueeze(-1)
-            else:
-                sigma_pq = 0
-            if self.p >= 2 and self.r >= 2:
-                sigma_pr = torch.sum(self.compute_sigma_pr(hp=hp, hk=hk, rp=rp, rk=rk), dim=[1, 2, 3]).unsqueeze(-1)
-            else:
-                sigma_pr = 0
-            if self.q >= 2 and self.r >= 2:
-                sigma_qr = torch.sum(self.compute_sigma_qr(hq=hq, hk=hk, rq=rq, rk=rk), dim=[1, 2, 3]).unsqueeze(-1)
-            else:
-                sigma_qr = 0
-    
-            return h0r0t0 + score_p + score_q + score_r + sigma_pp + sigma_qq + sigma_rr + sigma_pq + sigma_pr + sigma_qr
-    
     def apply_coefficients(self, h0, hp, hq,hk, r0, rp, rq,rk):
         """ Multiplying a base vector with its scalar coefficient """
         if self.p > 0:
@@ -1097,130 +1163,186 @@ class DeCaL(BaseKGE): # Extending embeddings in cl_pq to cl_pqr
         \sigma_{p,p}^* = \sum_{i=1}^{p-1}\sum_{i'=i+1}^{p}(x_iy_{i'}-x_{i'}y_i)
 
         sigma_{pp} captures the interactions between along p bases
-        For instance, let p e_1, e_2, e_3, we compute interactions between e_1 e_2, e_1 e_3 , and e_2 e_3
-        This can be implemented with a nested two for loops
+        For instance, let p e_1, e_2, e_3, we compute interactions between e_1 e_2, e_1 e_3 , and e_2 e_3.
+        Scores only use the sum of these interactions, which is computed with prefix sums in O(p)
+        (see sum_upper_antisymmetric).
 
-                        results = []
-                        for i in range(p - 1):
-                            for k in range(i + 1, p):
-                                results.append(hp[:, :, i] * rp[:, :, k] - hp[:, :, k] * rp[:, :, i])
-                        sigma_pp = torch.stack(results, dim=2)
-                        assert sigma_pp.shape == (b, r, int((p * (p - 1)) / 2))
-
-        Yet, this computation would be quite inefficient. Instead, we compute interactions along all p,
-        e.g., e1e1, e1e2, e1e3,
-              e2e1, e2e2, e2e3,
-              e3e1, e3e2, e3e3
-        Then select the triangular matrix without diagonals: e1e2, e1e3, e2e3.
+        Returns
+        -------
+        torch.FloatTensor with (n, re) shape
         """
-        # Compute indexes for the upper triangle of p by p matrix
-        indices = torch.triu_indices(self.p, self.p, offset=1)
-        # Compute p by p operations
-        sigma_pp = torch.einsum('nrp,nrx->nrpx', hp, rp) - torch.einsum('nrx,nrp->nrpx', hp, rp)
-        sigma_pp = sigma_pp[:, :, indices[0], indices[1]]
-        return sigma_pp
+        return sum_upper_antisymmetric(hp, rp)
 
     def compute_sigma_qq(self, hq, rq):
         """
         Compute  \sigma_{q,q}^* = \sum_{j=p+1}^{p+q-1}\sum_{j'=j+1}^{p+q}(x_jy_{j'}-x_{j'}y_j) Eq. 16
         sigma_{q} captures the interactions between along q bases
-        For instance, let q e_1, e_2, e_3, we compute interactions between e_1 e_2, e_1 e_3 , and e_2 e_3
-        This can be implemented with a nested two for loops
+        For instance, let q e_1, e_2, e_3, we compute interactions between e_1 e_2, e_1 e_3 , and e_2 e_3.
+        Scores only use the sum of these interactions, which is computed with prefix sums in O(q)
+        (see sum_upper_antisymmetric).
 
-                        results = []
-                        for j in range(q - 1):
-                            for k in range(j + 1, q):
-                                results.append(hq[:, :, j] * rq[:, :, k] - hq[:, :, k] * rq[:, :, j])
-                        sigma_qq = torch.stack(results, dim=2)
-                        assert sigma_qq.shape == (b, r, int((q * (q - 1)) / 2))
-
-        Yet, this computation would be quite inefficient. Instead, we compute interactions along all p,
-        e.g., e1e1, e1e2, e1e3,
-              e2e1, e2e2, e2e3,
-              e3e1, e3e2, e3e3
-        Then select the triangular matrix without diagonals: e1e2, e1e3, e2e3.
+        Returns
+        -------
+        torch.FloatTensor with (n, re) shape
         """
-        # Compute indexes for the upper triangle of p by p matrix
-        if self.q > 1:
-            indices = torch.triu_indices(self.q, self.q, offset=1)
-            # Compute p by p operations
-            sigma_qq = torch.einsum('nrp,nrx->nrpx', hq, rq) - torch.einsum('nrx,nrp->nrpx', hq, rq)
-            sigma_qq = sigma_qq[:, :, indices[0], indices[1]]
-        
-        else:
-            sigma_qq = torch.zeros((len(hq), self.re, int((self.q * (self.q - 1)) / 2)))
-
-        return sigma_qq
-    
+        return sum_upper_antisymmetric(hq, rq)
 
     def compute_sigma_rr(self, hk, rk):
         """
         \sigma_{r,r}^* = \sum_{k=p+q+1}^{p+q+r-1}\sum_{k'=k+1}^{p}(x_ky_{k'}-x_{k'}y_k)
 
-        """
-        # Compute indexes for the upper triangle of p by p matrix
-        if self.r > 1:
-            indices = torch.triu_indices(self.r, self.r, offset=1)
-            # Compute p by p operations
-            sigma_rr = torch.einsum('nrp,nrx->nrpx', hk, rk) - torch.einsum('nrx,nrp->nrpx', hk, rk)
-            sigma_rr = sigma_rr[:, :, indices[0], indices[1]]
-        else:
-            sigma_rr = torch.zeros((len(hk), self.re, int((self.r * (self.r - 1)) / 2)))
+        Scores only use the sum of these interactions, which is computed with prefix sums in O(r)
+        (see sum_upper_antisymmetric).
 
-        return sigma_rr
+        Returns
+        -------
+        torch.FloatTensor with (n, re) shape
+        """
+        return sum_upper_antisymmetric(hk, rk)
 
     def compute_sigma_pq(self, *, hp, hq, rp, rq):
         """
         \sum_{i=1}^{p} \sum_{j=p+1}^{p+q} (h_i r_j - h_j r_i) e_i e_j
 
-        results = []
-        sigma_pq = torch.zeros(b, r, p, q)
-        for i in range(p):
-            for j in range(q):
-                sigma_pq[:, :, i, j] = hp[:, :, i] * rq[:, :, j] - hq[:, :, j] * rp[:, :, i]
-        print(sigma_pq.shape)
+        The sum of these interactions is (\sum_i h_i)(\sum_j r_j) - (\sum_j h_j)(\sum_i r_i).
 
+        Returns
+        -------
+        torch.FloatTensor with (n, re) shape
         """
-        sigma_pq = torch.einsum('nrp,nrq->nrpq', hp, rq) - torch.einsum('nrq,nrp->nrpq', hq, rp)
-        assert sigma_pq.shape[1:] == (self.re, self.p, self.q)
-        return sigma_pq
+        return sum_cross_antisymmetric(x_a=hp, x_b=hq, y_a=rp, y_b=rq)
 
-    
     def compute_sigma_pr(self, *, hp, hk, rp, rk):
         """
-        \sum_{i=1}^{p} \sum_{j=p+1}^{p+q} (h_i r_j - h_j r_i) e_i e_j
+        \sum_{i=1}^{p} \sum_{k=p+q+1}^{p+q+r} (h_i r_k - h_k r_i) e_i e_k
 
-        results = []
-        sigma_pq = torch.zeros(b, r, p, q)
-        for i in range(p):
-            for j in range(q):
-                sigma_pq[:, :, i, j] = hp[:, :, i] * rq[:, :, j] - hq[:, :, j] * rp[:, :, i]
-        print(sigma_pq.shape)
+        The sum of these interactions is (\sum_i h_i)(\sum_k r_k) - (\sum_k h_k)(\sum_i r_i).
 
+        Returns
+        -------
+        torch.FloatTensor with (n, re) shape
         """
-        sigma_pr = torch.einsum('nrp,nrk->nrpk', hp, rk) - torch.einsum('nrk,nrp->nrpk', hk, rp)
-        assert sigma_pr.shape[1:] == (self.re, self.p, self.r)
-        return sigma_pr
-
+        return sum_cross_antisymmetric(x_a=hp, x_b=hk, y_a=rp, y_b=rk)
 
-      
     def compute_sigma_qr(self, *, hq, hk, rq, rk):
         """
-        \sum_{i=1}^{p} \sum_{j=p+1}^{p+q} (h_i r_j - h_j r_i) e_i e_j
+        \sum_{j=p+1}^{p+q} \sum_{k=p+q+1}^{p+q+r} (h_j r_k - h_k r_j) e_j e_k
 
-        results = []
-        sigma_pq = torch.zeros(b, r, p, q)
-        for i in range(p):
-            for j in range(q):
-                sigma_pq[:, :, i, j] = hp[:, :, i] * rq[:, :, j] - hq[:, :, j] * rp[:, :, i]
-        print(sigma_pq.shape)
+        The sum of these interactions is (\sum_j h_j)(\sum_k r_k) - (\sum_k h_k)(\sum_j r_j).
 
+        Returns
+        -------
+        torch.FloatTensor with (n, re) shape
         """
-        sigma_qr = torch.einsum('nrq,nrk->nrqk', hq, rk) - torch.einsum('nrk,nrq->nrqk', hk, rq)
-        assert sigma_qr.shape[1:] == (self.re, self.q, self.r)
-        return sigma_qr
+        return sum_cross_antisymmetric(x_a=hq, x_b=hk, y_a=rq, y_b=rk)
 
 
+class DeCaLSupernet(BaseKGE):
+    """
+    Weight-sharing supernet over DeCaL signatures
 
-        
+    Every DeCaL signature (p,q,r) with the same embedding_dim partitions the same d-dimensional embedding vector
+    into 1+p+q+r blocks. Hence, a single entity and relation embedding table is shared by all signatures.
+    For each signature, only the scaling coefficients and the Cl_{p,q,r} structure are kept in a DeCaL instance
+    without embeddings.
+
+    (1) During training, a signature is sampled uniformly at random for each mini-batch.
+    (2) After training, every signature can be evaluated by setting it via set_signature.
+
+    The active signature is stored in the state dict and restored when the model is loaded.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.name = 'DeCaLSupernet'
+        self.entity_embeddings = torch.nn.Embedding(self.num_entities, self.embedding_dim)
+        self.relation_embeddings = torch.nn.Embedding(self.num_relations, self.embedding_dim)
+        signatures = self.args.get("signatures", None)
+        if signatures:
+            self.signatures = [tuple(signature) for signature in signatures]
+        else:
+            # All signatures satisfying the divisibility criterion, i.e., (1 + p + q + r) divides d.
+            self.signatures = [(p, q, r) for p in range(self.embedding_dim) for q in range(self.embedding_dim)
+                               for r in range(self.embedding_dim) if self.embedding_dim % (1 + p + q + r) == 0]
+        # DeCaL instances without embeddings, e.g. {'1_1_1': DeCaL}
+        self.signature_models = torch.nn.ModuleDict()
+        for p, q, r in self.signatures:
+            model = DeCaL({**self.args, 'p': p, 'q': q, 'r': r, 'num_entities': 1, 'num_relations': 1})
+            del model.entity_embeddings, model.relation_embeddings
+            self.signature_models[f'{p}_{q}_{r}'] = model
+        self.register_buffer('active_signature', torch.tensor(self.signatures[0], dtype=torch.long))
+        self.signature = self.signatures[0]
+
+    def set_signature(self, signature: tuple) -> None:
+        """ Select the signature (p,q,r) used in the forward pass """
+        assert f'{signature[0]}_{signature[1]}_{signature[2]}' in self.signature_models
+        self.signature = tuple(signature)
+        self.active_signature.copy_(torch.tensor(self.signature, dtype=torch.long))
+
+    def load_state_dict(self, state_dict, strict: bool = True):
+        result = super().load_state_dict(state_dict, strict=strict)
+        self.signature = tuple(self.active_signature.tolist())
+        return result
+
+    def get_signature_model(self) -> DeCaL:
+        return self.signature_models[f'{self.signature[0]}_{self.signature[1]}_{self.signature[2]}']
+
+    def training_step(self, batch, batch_idx=None):
+        # (1) Sample a signature per mini-batch.
+        self.set_signature(random.choice(self.signatures))
+        return super().training_step(batch, batch_idx)
+
+    def forward_triples(self, x: torch.Tensor) -> torch.FloatTensor:
+        """
+        Parameter
+        ---------
+        x: torch.LongTensor with (n,3) shape
+
+        Returns
+        -------
+        torch.FloatTensor with (n) shape
+        """
+        model = self.get_signature_model()
+        head_ent_emb, rel_ent_emb, tail_ent_emb = self.get_triple_representation(x)
+        query, sigma = model.construct_cl_query(head_ent_emb, rel_ent_emb)
+        if not model.uses_all_columns:
+            tail_ent_emb = tail_ent_emb[:, model.cl_columns]
+        return torch.sum(query * tail_ent_emb, dim=1) + sigma.squeeze(-1)
+
+    def forward_k_vs_all(self, x: torch.Tensor, entities: Union[slice, torch.LongTensor] = slice(None)) -> torch.FloatTensor:
+        """
+        Parameter
+        ---------
+        x: torch.LongTensor with (n,2) shape
+        entities: a slice or indices of entities to be scored
+
+        Returns
+        -------
+        torch.FloatTensor with (n, |E|) shape
+        """
+        model = self.get_signature_model()
+        head_ent_emb, rel_ent_emb = self.get_head_relation_representation(x)
+        query, sigma = model.construct_cl_query(head_ent_emb, rel_ent_emb)
+        E = self.entity_embeddings.weight[entities]
+        if not model.uses_all_columns:
+            E = E[:, model.cl_columns]
+        return torch.addmm(sigma, query, E.transpose(1, 0))
 
+    def forward_k_vs_sample(self, x: torch.LongTensor, target_entity_idx: torch.LongTensor) -> torch.FloatTensor:
+        """
+        Parameter
+        ---------
+        x: torch.LongTensor with (n,2) shape
+        target_entity_idx: torch.LongTensor with (n,k) shape
+
+        Returns
+        -------
+        torch.FloatTensor with (n, k) shape
+        """
+        model = self.get_signature_model()
+        head_ent_emb, rel_ent_emb = self.get_head_relation_representation(x)
+        query, sigma = model.construct_cl_query(head_ent_emb, rel_ent_emb)
+        selected_tail_entity_embeddings = self.entity_embeddings(target_entity_idx)
+        if not model.uses_all_columns:
+            selected_tail_entity_embeddings = selected_tail_entity_embeddings[..., model.cl_columns]
+        return torch.bmm(selected_tail_entity_embeddings, query.unsqueeze(-1)).squeeze(-1) + sigma
@@ -0,0 +1,123 @@
+import os
+from typing import Callable, Dict, Tuple
+import torch
+
+# Compiled query constructors shared by all DeCaL instances of a process, e.g. {(p,q,r,re,d): fn}
+_COMPILED_CL_QUERIES: Dict[Tuple[int, int, int, int, int], Callable] = dict()
+
+
+def generate_decal_query_source(p: int, q: int, r: int, re: int, embedding_dim: int) -> str:
+    """
+    Emit a TorchScript function constructing the query vector and the sigma terms of DeCaL for Cl_{p,q,r}
+
+    All slices, shapes and the blades being used are resolved at generation time.
+    Hence, the generated function contains neither branches on p, q, and r nor zero tensors for empty blades.
+    The function has the same semantics as DeCaL.construct_cl_query, yet the scaling coefficients are given as
+    the concatenation of p, q and r coefficients.
+
+    Parameter
+    ---------
+    p: int
+    q: int
+    r: int
+    re: int size of each blade
+    embedding_dim: int
+
+    Returns
+    -------
+    str: the source of cl_query(head_ent_emb, rel_ent_emb, coefficients) -> (query, sigma)
+    """
+    # (1) Starting columns of the p, q and r blocks in an embedding vector and in the coefficients.
+    blocks = [(name, n, start, offset) for name, n, start, offset in
+              [('p', p, re, 0),
+               ('q', q, re + re * p, p),
+               ('k', r, embedding_dim - re * r, p + q)] if n > 0]
+    lines = ['def cl_query(head_ent_emb: Tensor, rel_ent_emb: Tensor, coefficients: Tensor) -> Tuple[Tensor, Tensor]:',
+             f'    h0 = head_ent_emb[:, :{re}]',
+             f'    r0 = rel_ent_emb[:, :{re}]']
+    # (2) Blades multiplied with their scalar coefficients.
+    for name, n, start, offset in blocks:
+        lines.append(f'    c{name} = coefficients[{offset}:{offset + n}]')
+        for x, emb in [('h', 'head_ent_emb'), ('r', 'rel_ent_emb')]:
+            lines.append(f'    {x}{name} = {emb}[:, {start}:{start + re * n}].reshape(-1, {re}, {n}) * c{name}')
+    # (3) Interactions with the scalar part of tails: e_i^2 = +1 for p and e_j^2 = -1 for q.
+    query_0 = 'h0 * r0'
+    if p > 0:
+        query_0 += ' + torch.sum(hp * rp, dim=2)'
+    if q > 0:
+        query_0 += ' - torch.sum(hq * rq, dim=2)'
+    lines.append(f'    query_0 = {query_0}')
+    # (4) Interactions with the blades of tails.
+    queries = ['query_0']
+    for name, n, _, _ in blocks:
+        lines.append(f'    query_{name} = (h0.unsqueeze(2) * r{name} + h{name} * r0.unsqueeze(2))'
+                     f'.reshape(-1, {re * n})')
+        queries.append(f'query_{name}')
+    # (5) Bivector interactions in closed form.
+    sigmas = []
+    for name, n in [('p', p), ('q', q), ('k', r)]:
+        if n >= 2:
+            lines.append(f'    sigma_{name}{name} = torch.sum((torch.cumsum(h{name}, dim=2) - h{name}) * r{name} '
+                         f'- h{name} * (torch.cumsum(r{name}, dim=2) - r{name}), dim=[1, 2])')
+            sigmas.append(f'sigma_{name}{name}')
+    for (a, n_a), (b, n_b) in [(('p', p), ('q', q)), (('p', p), ('k', r)), (('q', q), ('k', r))]:
+        if n_a >= 2 and n_b >= 2:
+            lines.append(f'    sigma_{a}{b} = torch.sum(h{a}.sum(dim=2) * r{b}.sum(dim=2) '
+                         f'- h{b}.sum(dim=2) * r{a}.sum(dim=2), dim=1)')
+            sigmas.append(f'sigma_{a}{b}')
+    if len(sigmas) > 0:
+        lines.append(f'    sigma = ({" + ".join(sigmas)}).unsqueeze(-1)')
+    else:
+        lines.append('    sigma = torch.zeros_like(h0[:, :1])')
+    if len(queries) > 1:
+        lines.append(f'    return torch.cat([{", ".join(queries)}], dim=1), sigma')
+    else:
+        lines.append('    return query_0, sigma')
+    return '\n'.join(lines) + '\n'
+
+
+def load_decal_query_fn(p: int, q: int, r: int, re: int, embedding_dim: int, path: str = None) -> Callable:
+    """
+    Return a compiled DeCaL query constructor for a signature
+
+    (1) Return the compiled function if it has already been compiled in this process.
+    (2) Read the generated source from path/compiled_scorers if it exists, otherwise generate and store it.
+    (3) Compile the source with TorchScript.
+
+    Parameter
+    ---------
+    p: int
+    q: int
+    r: int
+    re: int size of each blade
+    embedding_dim: int
+    path: str A directory in which the generated sources are cached. If None, nothing is stored.
+
+    Returns
+    -------
+    cl_query(head_ent_emb, rel_ent_emb, coefficients) -> (query, sigma)
+    """
+    signature = (p, q, r, re, embedding_dim)
+    # (1) Compiled in this process.
+    if signature in _COMPILED_CL_QUERIES:
+        return _COMPILED_CL_QUERIES[signature]
+    # (2) Generated source cached on disk.
+    source = None
+    path_of_source = None
+    if path is not None:
+        path_of_source = os.path.join(path, 'compiled_scorers', f'decal_p{p}_q{q}_r{r}_re{re}_d{embedding_dim}.ts')
+        if os.path.isfile(path_of_source):
+            with open(path_of_source, 'r') as file_descriptor:
+                source = file_descriptor.read()
+    if source is None:
+        source = generate_decal_query_source(p=p, q=q, r=r, re=re, embedding_dim=embedding_dim)
+        if path_of_source is not None:
+            os.makedirs(os.path.dirname(path_of_source), exist_ok=True)
+            # Write and rename so that concurrent runs never read a partially written source.
+            with open(path_of_source + f'.{os.getpid()}', 'w') as file_descriptor:
+                file_descriptor.write(source)
+            os.replace(path_of_source + f'.{os.getpid()}', path_of_source)
+    # (3) Compile.
+    cl_query = torch.jit.CompilationUnit(source).cl_query
+    _COMPILED_CL_QUERIES[signature] = cl_query
+    return cl_query
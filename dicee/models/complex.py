@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Tuple, Union
 import torch
 from .base_model import BaseKGE
 
@@ -247,14 +247,14 @@ class ComplEx(BaseKGE):
         imag_imag_real = (emb_head_imag * emb_rel_imag * emb_tail_real).sum(dim=1)
         return real_real_real + real_imag_imag + imag_real_imag - imag_imag_real
 
-    def forward_k_vs_all(self, x: torch.LongTensor) -> torch.FloatTensor:
+    def forward_k_vs_all(self, x: torch.LongTensor, entities: Union[slice, torch.LongTensor] = slice(None)) -> torch.FloatTensor:
         # (1) Retrieve embeddings & Apply Dropout & Normalization.
         head_ent_emb, rel_ent_emb = self.get_head_relation_representation(x)
         # (2) Split (1) into real and imaginary parts.
         emb_head_real, emb_head_imag = torch.hsplit(head_ent_emb, 2)
         emb_rel_real, emb_rel_imag = torch.hsplit(rel_ent_emb, 2)
         # (3) Transpose Entity embedding matrix to perform matrix multiplications in Hermitian Product.
-        emb_tail_real, emb_tail_imag = torch.hsplit(self.entity_embeddings.weight, 2)
+        emb_tail_real, emb_tail_imag = torch.hsplit(self.entity_embeddings.weight[entities], 2)
         emb_tail_real, emb_tail_imag = emb_tail_real.transpose(1, 0), emb_tail_imag.transpose(1, 0)
         # (4) Compute hermitian inner product on embedding vectors.
         real_real_real = torch.mm(emb_head_real * emb_rel_real, emb_tail_real)
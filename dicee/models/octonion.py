@@ -1,3 +1,4 @@
+from typing import Union
 import torch
 from .base_model import BaseKGE
 
@@ -81,11 +82,12 @@ class OMult(BaseKGE):
 
         return e0_score + e1_score + e2_score + e3_score + e4_score + e5_score + e6_score + e7_score
 
-    def forward_k_vs_all(self, x: torch.Tensor):
+    def forward_k_vs_all(self, x: torch.Tensor, entities: Union[slice, torch.LongTensor] = slice(None)):
         """
         Given a head entity and a relation (h,r), we compute scores for all entities.
         [score(h,r,x)|x \in Entities] => [0.0,0.1,...,0.8], shape=> (1, |Entities|)
         Given a batch of head entities and relations => shape (size of batch,| Entities|)
+        If entities (a slice or indices) is given, only these entities are scored.
         """
 
         # (1) Retrieve embeddings & Apply Dropout & Normalization.
@@ -107,7 +109,7 @@ class OMult(BaseKGE):
 
         # Prepare all entities.
         emb_tail_e0, emb_tail_e1, emb_tail_e2, emb_tail_e3, emb_tail_e4, emb_tail_e5, emb_tail_e6, emb_tail_e7 = torch.hsplit(
-            self.entity_embeddings.weight, 8)
+            self.entity_embeddings.weight[entities], 8)
         emb_tail_e0, emb_tail_e1, emb_tail_e2, emb_tail_e3, emb_tail_e4, emb_tail_e5, emb_tail_e6, emb_tail_e7 \
             = emb_tail_e0.transpose(1, 0), emb_tail_e1.transpose(1, 0), \
               emb_tail_e2.transpose(1, 0), emb_tail_e3.transpose(1,0), \
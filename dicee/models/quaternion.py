@@ -1,3 +1,4 @@
+from typing import Union
 import torch
 from .static_funcs import quaternion_mul
 from .base_model import BaseKGE
@@ -49,12 +50,13 @@ class QMult(BaseKGE):
         k_score = torch.sum(k_val * emb_tail_k, dim=1)
         return real_score + i_score + j_score + k_score
 
-    def forward_k_vs_all(self, x):
+    def forward_k_vs_all(self, x, entities: Union[slice, torch.LongTensor] = slice(None)):
         """
         Completed.
         Given a head entity and a relation (h,r), we compute scores for all possible triples,i.e.,
         [score(h,r,x)|x \in Entities] => [0.0,0.1,...,0.8], shape=> (1, |Entities|)
         Given a batch of head entities and relations => shape (size of batch,| Entities|)
+        If entities (a slice or indices) is given, only these entities are scored.
         """
 
         # (1) Retrieve embeddings & Apply Dropout & Normalization.
@@ -65,7 +67,7 @@ class QMult(BaseKGE):
         r_val, i_val, j_val, k_val = quaternion_mul(Q_1=(emb_head_real, emb_head_i, emb_head_j, emb_head_k),
                                                     Q_2=(emb_rel_real, emb_rel_i, emb_rel_j, emb_rel_k))
 
-        emb_tail_real, emb_tail_i, emb_tail_j, emb_tail_k = torch.hsplit(self.entity_embeddings.weight, 4)
+        emb_tail_real, emb_tail_i, emb_tail_j, emb_tail_k = torch.hsplit(self.entity_embeddings.weight[entities], 4)
         emb_tail_real, emb_tail_i, emb_tail_j, emb_tail_k = emb_tail_real.transpose(1, 0), emb_tail_i.transpose(1,0), \
                                                             emb_tail_j.transpose(1, 0), emb_tail_k.transpose(1, 0)
 
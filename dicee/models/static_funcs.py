@@ -16,3 +16,35 @@ def quaternion_mul(*, Q_1, Q_2) -> Tuple[torch.Tensor,torch.Tensor,torch.Tensor,
     j_val = a_h * c_r - b_h * d_r + c_h * a_r + d_h * b_r
     k_val = a_h * d_r + b_h * c_r - c_h * b_r + d_h * a_r
     return r_val, i_val, j_val, k_val
+
+
+def sum_upper_antisymmetric(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """
+    Compute \sum_{i=1}^{p-1} \sum_{k=i+1}^{p} (x_i y_k - x_k y_i) along the last dimension
+
+    \sum_{i<k} x_i y_k - x_k y_i = \sum_{k} y_k X_k - x_k Y_k, where X_k = \sum_{i<k} x_i and Y_k = \sum_{i<k} y_i.
+    Hence, the p(p-1)/2 pairwise interactions are never materialized.
+    :param x: a tensor with (..., p) shape
+    :param y: a tensor with (..., p) shape
+    :return: a tensor with (...) shape
+    """
+    # (1) Exclusive prefix sums along the last dimension.
+    x_prefix = torch.cumsum(x, dim=-1) - x
+    y_prefix = torch.cumsum(y, dim=-1) - y
+    return torch.sum(x_prefix * y - x * y_prefix, dim=-1)
+
+
+def sum_cross_antisymmetric(*, x_a: torch.Tensor, x_b: torch.Tensor, y_a: torch.Tensor,
+                            y_b: torch.Tensor) -> torch.Tensor:
+    """
+    Compute \sum_{i=1}^{p} \sum_{j=1}^{q} (x_i y_j - x_j y_i) along the last dimension,
+    where x_i, y_i are taken from x_a, y_a and x_j, y_j are taken from x_b, y_b
+
+    The double sum factorizes into (\sum_i x_i)(\sum_j y_j) - (\sum_j x_j)(\sum_i y_i).
+    :param x_a: a tensor with (..., p) shape
+    :param x_b: a tensor with (..., q) shape
+    :param y_a: a tensor with (..., p) shape
+    :param y_b: a tensor with (..., q) shape
+    :return: a tensor with (...) shape
+    """
+    return x_a.sum(dim=-1) * y_b.sum(dim=-1) - x_b.sum(dim=-1) * y_a.sum(dim=-1)
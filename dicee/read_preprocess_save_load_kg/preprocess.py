@@ -1,6 +1,7 @@
 import pandas as pd
+import numpy as np
 import polars as pl
-from .util import create_recipriocal_triples, timeit, index_triples_with_pandas, dataset_sanity_checking
+from .util import create_recipriocal_triples, timeit, dataset_sanity_checking
 from dicee.static_funcs import numpy_data_type_changer
 
 
@@ -42,9 +43,9 @@ class PreprocessKG:
         """
         Preprocess train, valid and test datasets stored in knowledge graph instance with pandas
 
-        (1) Add recipriocal or noisy triples
-        (2) Construct vocabulary
-        (3) Index datasets
+        (1) Construct vocabulary
+        (2) Index datasets via pd.factorize
+        (3) Add recipriocal or noisy triples into indexed datasets
 
         Parameter
         ---------
@@ -53,156 +54,108 @@ class PreprocessKG:
         -------
         None
         """
-        # (1)  Add recipriocal or noisy triples.
+        # (1) Construct integer indexing for entities and relations and (2) index datasets.
+        self.factorize_triples()
+
+        # (3) Add recipriocal or noisy triples.
         self.apply_reciprical_or_noise()
-        # (2) Construct integer indexing for entities and relations.
-        self.sequential_vocabulary_construction()
-        self.kg.num_entities, self.kg.num_relations = len(self.kg.entity_to_idx), len(self.kg.relation_to_idx)
-
-        # (3) Index datasets
-        self.kg.train_set = index_triples_with_pandas(self.kg.train_set,
-                                                      self.kg.entity_to_idx,
-                                                      self.kg.relation_to_idx)
-        assert isinstance(self.kg.train_set, pd.core.frame.DataFrame)
-        self.kg.train_set = self.kg.train_set.values
-        self.kg.train_set = numpy_data_type_changer(self.kg.train_set,
-                                                    num=max(self.kg.num_entities, self.kg.num_relations))
         dataset_sanity_checking(self.kg.train_set, self.kg.num_entities, self.kg.num_relations)
         if self.kg.valid_set is not None:
-            self.kg.valid_set = index_triples_with_pandas(self.kg.valid_set, self.kg.entity_to_idx,
-                                                          self.kg.relation_to_idx)
-            self.kg.valid_set = self.kg.valid_set.values
             dataset_sanity_checking(self.kg.valid_set, self.kg.num_entities, self.kg.num_relations)
-            self.kg.valid_set = numpy_data_type_changer(self.kg.valid_set,
-                                                        num=max(self.kg.num_entities, self.kg.num_relations))
-
         if self.kg.test_set is not None:
-            self.kg.test_set = index_triples_with_pandas(self.kg.test_set, self.kg.entity_to_idx,
-                                                         self.kg.relation_to_idx)
-            # To numpy
-            self.kg.test_set = self.kg.test_set.values
             dataset_sanity_checking(self.kg.test_set, self.kg.num_entities, self.kg.num_relations)
-            self.kg.test_set = numpy_data_type_changer(self.kg.test_set,
-                                                       num=max(self.kg.num_entities, self.kg.num_relations))
+
     @timeit
     def preprocess_with_polars(self) -> None:
+        """
+        Preprocess train, valid and test datasets stored in knowledge graph instance with lazy polars queries
+
+        (1) Construct vocabularies in the order of first occurrence
+        (2) Index datasets via joins with vocabularies and cast indexes into the most efficient integer type
+        (3) Add recipriocal or noisy triples into indexed datasets
+
+        Parameter
+        ---------
+
+        Returns
+        -------
+        None
+        """
         print(f'*** Preprocessing Train Data:{self.kg.train_set.shape} with Polars ***')
-        # (1) Add reciprocal triples, e.g. KG:= {(s,p,o)} union {(o,p_inverse,s)}
-        if self.kg.add_reciprical and self.kg.eval_model:
-            def adding_reciprocal_triples():
-                """ Add reciprocal triples """
-                # (1.1) Add reciprocal triples into training set
-                self.kg.train_set.extend(self.kg.train_set.select([
-                    pl.col("object").alias('subject'),
-                    pl.col("relation").apply(lambda x: x + '_inverse'),
-                    pl.col("subject").alias('object')
-                ]))
-                if self.kg.valid_set is not None:
-                    # (1.2) Add reciprocal triples into valid_set set.
-                    self.kg.valid_set.extend(self.kg.valid_set.select([
-                        pl.col("object").alias('subject'),
-                        pl.col("relation").apply(lambda x: x + '_inverse'),
-                        pl.col("subject").alias('object')
-                    ]))
-                if self.kg.test_set is not None:
-                    # (1.2) Add reciprocal triples into test set.
-                    self.kg.test_set.extend(self.kg.test_set.select([
-                        pl.col("object").alias('subject'),
-                        pl.col("relation").apply(lambda x: x + '_inverse'),
-                        pl.col("subject").alias('object')
-                    ]))
-
-            print('Adding Reciprocal Triples...')
-            adding_reciprocal_triples()
-
-        # (2) Type checking
-        try:
-            assert isinstance(self.kg.train_set, pl.DataFrame)
-        except TypeError:
-            raise TypeError(f"{type(self.kg.train_set)}")
+        assert isinstance(self.kg.train_set, pl.DataFrame), f"{type(self.kg.train_set)}"
         assert isinstance(self.kg.valid_set, pl.DataFrame) or self.kg.valid_set is None
         assert isinstance(self.kg.test_set, pl.DataFrame) or self.kg.test_set is None
-
-        def concat_splits(train, val, test):
-            x = [train]
-            if val is not None:
-                x.append(val)
-            if test is not None:
-                x.append(test)
-            return pl.concat(x)
-
-        print('Concat Splits...')
-        df_str_kg = concat_splits(self.kg.train_set, self.kg.valid_set, self.kg.test_set)
-
-        print('Entity Indexing...')
-        self.kg.entity_to_idx = pl.concat((df_str_kg['subject'],
-                                           df_str_kg['object'])).unique(maintain_order=True).rename('entity')
-        print('Relation Indexing...')
-        self.kg.relation_to_idx =df_str_kg['relation'].unique(maintain_order=True)
-        print('Creating index for entities...')
-        self.kg.entity_to_idx = {ent: idx for idx, ent in enumerate(self.kg.entity_to_idx.to_list())}
-        print('Creating index for relations...')
-        self.kg.relation_to_idx = {rel: idx for idx, rel in enumerate(self.kg.relation_to_idx.to_list())}
-        self.kg.num_entities, self.kg.num_relations = len(self.kg.entity_to_idx), len(self.kg.relation_to_idx)
-
-        print(f'Indexing Training Data {self.kg.train_set.shape}...')
-        self.kg.train_set = self.kg.train_set.with_columns(
-            pl.col("subject").map_dict(self.kg.entity_to_idx).alias("subject"),
-            pl.col("relation").map_dict(self.kg.relation_to_idx).alias("relation"),
-            pl.col("object").map_dict(self.kg.entity_to_idx).alias("object")).to_numpy()
-        if self.kg.valid_set is not None:
-            print(f'Indexing Val Data {self.kg.valid_set.shape}...')
-            self.kg.valid_set = self.kg.valid_set.with_columns(
-                pl.col("subject").map_dict(self.kg.entity_to_idx).alias("subject"),
-                pl.col("relation").map_dict(self.kg.relation_to_idx).alias("relation"),
-                pl.col("object").map_dict(self.kg.entity_to_idx).alias("object")).to_numpy()
-        if self.kg.test_set is not None:
-            print(f'Indexing Test Data {self.kg.test_set.shape}...')
-            self.kg.test_set = self.kg.test_set.with_columns(
-                pl.col("subject").map_dict(self.kg.entity_to_idx).alias("subject"),
-                pl.col("relation").map_dict(self.kg.relation_to_idx).alias("relation"),
-                pl.col("object").map_dict(self.kg.entity_to_idx).alias("object")).to_numpy()
+        splits = {name: getattr(self.kg, name).lazy() for name in ['train_set', 'valid_set', 'test_set']
+                  if getattr(self.kg, name) is not None}
+        # (1) Entities of subjects and then of objects, and relations of concatenated splits.
+        print('Entity and Relation Indexing...')
+        df_str_kg = pl.concat(list(splits.values()))
+        entities, relations = pl.collect_all([
+            pl.concat([df_str_kg.select(pl.col('subject').alias('entity')),
+                       df_str_kg.select(pl.col('object').alias('entity'))]).unique(maintain_order=True)
+            .with_row_count('idx'),
+            df_str_kg.select('relation').unique(maintain_order=True).with_row_count('idx')])
+        self.kg.num_entities, self.kg.num_relations = len(entities), len(relations)
+        # (2) Index datasets.
+        # The integer type must also hold indexes of inverse relations, i.e., p+num_relations.
+        num_relations = 2 * self.kg.num_relations if self.kg.add_reciprical and self.kg.eval_model \
+            else self.kg.num_relations
+        dtype = {np.int8: pl.Int8, np.int16: pl.Int16, np.int32: pl.Int32}[
+            numpy_data_type_changer(np.empty((0, 3), dtype=np.int64),
+                                    num=max(self.kg.num_entities, num_relations)).dtype.type]
+
+        def index(df: pl.LazyFrame) -> pl.LazyFrame:
+            """ Replace strings with indexes, left joins maintain the order of triples """
+            return (df.join(entities.lazy().rename({'entity': 'subject', 'idx': 'subject_idx'}), on='subject', how='left')
+                    .join(relations.lazy().rename({'idx': 'relation_idx'}), on='relation', how='left')
+                    .join(entities.lazy().rename({'entity': 'object', 'idx': 'object_idx'}), on='object', how='left')
+                    .select([pl.col('subject_idx').cast(dtype), pl.col('relation_idx').cast(dtype),
+                             pl.col('object_idx').cast(dtype)]))
+
+        print('Indexing Data...')
+        for name, df in zip(splits, pl.collect_all([index(df) for df in splits.values()])):
+            setattr(self.kg, name, df.to_numpy())
+        self.kg.entity_to_idx = dict(zip(entities['entity'].to_list(), range(self.kg.num_entities)))
+        self.kg.relation_to_idx = dict(zip(relations['relation'].to_list(), range(self.kg.num_relations)))
+        # (3) Add recipriocal or noisy triples.
+        self.apply_reciprical_or_noise()
         print(f'*** Preprocessing Train Data:{self.kg.train_set.shape} with Polars DONE ***')
 
-    def sequential_vocabulary_construction(self) -> None:
+    def factorize_triples(self) -> None:
         """
-        (1) Read input data into memory
-        (2) Remove triples with a condition
-        (3) Serialize vocabularies in a pandas dataframe where
-                    => the index is integer and
-                    => a single column is string (e.g. URI)
+        (1) Remove triples with a condition
+        (2) Factorize entities and relations of concatenated datasets, i.e., index them in the order of
+         their first occurrence, subjects before objects
+        (3) Split codes into indexed datasets
+
+        Parameter
+        ---------
+
+        Returns
+        -------
+        None
         """
-        try:
-            assert isinstance(self.kg.train_set, pd.DataFrame)
-        except AssertionError:
-            print(type(self.kg.train_set))
-            print('HEREE')
-            exit(1)
+        assert isinstance(self.kg.train_set, pd.DataFrame), f"{type(self.kg.train_set)}"
         assert isinstance(self.kg.valid_set, pd.DataFrame) or self.kg.valid_set is None
         assert isinstance(self.kg.test_set, pd.DataFrame) or self.kg.test_set is None
-
-        # (4) Remove triples from (1).
+        # (1) Remove triples.
         self.remove_triples_from_train_with_condition()
-        # Concatenate dataframes.
-        print('Concatenating data to obtain index...')
-        x = [self.kg.train_set]
-        if self.kg.valid_set is not None:
-            x.append(self.kg.valid_set)
-        if self.kg.test_set is not None:
-            x.append(self.kg.test_set)
-        df_str_kg = pd.concat(x, ignore_index=True)
-        del x
-        print('Creating a mapping from entities to integer indexes...')
-        # (5) Create a bijection mapping from entities of (2) to integer indexes.
-        # ravel('K') => Return a contiguous flattened array.
-        # ‘K’ means to read the elements in the order they occur in memory,
-        # except for reversing the data when strides are negative.
-        ordered_list = pd.unique(df_str_kg[['subject', 'object']].values.ravel('K')).tolist()
-        self.kg.entity_to_idx = {k: i for i, k in enumerate(ordered_list)}
-        # 5. Create a bijection mapping  from relations to integer indexes.
-        ordered_list = pd.unique(df_str_kg['relation'].values.ravel('K')).tolist()
-        self.kg.relation_to_idx = {k: i for i, k in enumerate(ordered_list)}
-        del ordered_list
+        names = [name for name in ['train_set', 'valid_set', 'test_set'] if getattr(self.kg, name) is not None]
+        splits = [getattr(self.kg, name) for name in names]
+        # (2) Factorize.
+        print('Factorizing entities and relations...')
+        entity_codes, entities = pd.factorize(np.concatenate([x['subject'].values for x in splits]
+                                                             + [x['object'].values for x in splits]))
+        relation_codes, relations = pd.factorize(np.concatenate([x['relation'].values for x in splits]))
+        self.kg.entity_to_idx = dict(zip(entities, range(len(entities))))
+        self.kg.relation_to_idx = dict(zip(relations, range(len(relations))))
+        self.kg.num_entities, self.kg.num_relations = len(entities), len(relations)
+        # (3) Split codes.
+        subject_codes, object_codes = np.split(entity_codes, 2)
+        sections = np.cumsum([len(x) for x in splits])[:-1]
+        for name, s, p, o in zip(names, np.split(subject_codes, sections), np.split(relation_codes, sections),
+                                 np.split(object_codes, sections)):
+            setattr(self.kg, name, np.stack([s, p, o], axis=1))
 
     def remove_triples_from_train_with_condition(self):
         if None:
@@ -233,13 +186,32 @@ class PreprocessKG:
             print('\t after dropping:', self.kg.train_set.size)  # .compute(scheduler=scheduler_flag))
             del low_frequency_entities
     def apply_reciprical_or_noise(self) -> None:
-        """ (1) Add reciprocal triples (2) Add noisy triples """
-        # (1) Add reciprocal triples, e.g. KG:= {(s,p,o)} union {(o,p_inverse,s)}
+        """ (1) Add noisy triples (2) Add reciprocal triples into indexed datasets """
+        # (1) Add noisy triples into training dataset.
+        if self.kg.add_noise_rate:
+            self.add_noisy_triples()
+        # (2) Add reciprocal triples, e.g. KG:= {(s,p,o)} union {(o,p+num_relations,s)}
         if self.kg.add_reciprical and self.kg.eval_model:
             print('Adding reciprocal triples '
                   'to train, validation, and test sets, e.g. KG:= {(s,p,o)} union {(o,p_inverse,s)}')
-            self.kg.train_set = create_recipriocal_triples(self.kg.train_set)
+            self.kg.train_set = create_recipriocal_triples(self.kg.train_set, self.kg.num_relations)
             if self.kg.valid_set is not None:
-                self.kg.valid_set = create_recipriocal_triples(self.kg.valid_set)
+                self.kg.valid_set = create_recipriocal_triples(self.kg.valid_set, self.kg.num_relations)
             if self.kg.test_set is not None:
-                self.kg.test_set = create_recipriocal_triples(self.kg.test_set)
+                self.kg.test_set = create_recipriocal_triples(self.kg.test_set, self.kg.num_relations)
+            # p_inverse is indexed as p+num_relations.
+            self.kg.relation_to_idx.update({rel + '_inverse': idx + self.kg.num_relations
+                                            for rel, idx in list(self.kg.relation_to_idx.items())})
+            self.kg.num_relations = len(self.kg.relation_to_idx)
+
+    def add_noisy_triples(self) -> None:
+        """ Add triples with uniformly sampled entities and relations of the indexed training dataset """
+        num_noisy_triples = int(len(self.kg.train_set) * self.kg.add_noise_rate)
+        s = len(self.kg.train_set)
+        entities = np.unique(self.kg.train_set[:, [0, 2]])
+        relations = np.unique(self.kg.train_set[:, 1])
+        noisy_triples = np.stack([entities[np.random.randint(0, len(entities), num_noisy_triples)],
+                                  relations[np.random.randint(0, len(relations), num_noisy_triples)],
+                                  entities[np.random.randint(0, len(entities), num_noisy_triples)]], axis=1)
+        self.kg.train_set = np.concatenate([self.kg.train_set, noisy_triples.astype(self.kg.train_set.dtype)])
+        assert s + num_noisy_triples == len(self.kg.train_set)
@@ -1,14 +1,100 @@
 import numpy as np
 import concurrent
-from .util import load_pickle, get_er_vocab, get_re_vocab, get_ee_vocab, create_constraints, load_numpy_ndarray
+import shutil
+import threading
+from collections.abc import Mapping
+from .util import load_pickle, get_er_vocab, get_re_vocab, get_ee_vocab, create_constraints, load_numpy_ndarray, \
+    FilterIndex
 import os
-from dicee.static_funcs import save_pickle, save_numpy_ndarray
+from dicee.static_funcs import save_numpy_ndarray, save_pickle, StringIndex
+
+
+# Files of a preprocessed knowledge graph
+SERIALIZED_KG_FILES = ['train_set.npy', 'valid_set.npy', 'test_set.npy', 'constraints.p'] \
+                      + [f'{vocab}_{array}.npy' for vocab in ['er_vocab', 're_vocab', 'ee_vocab']
+                         for array in ['keys', 'offsets', 'values']] \
+                      + [f'{vocab}_{array}.npy' for vocab in ['entity_to_idx', 'relation_to_idx']
+                         for array in ['buffer', 'offsets', 'order']]
+# Files every cached knowledge graph consists of, whether or not it is evaluated
+REQUIRED_KG_FILES = ['train_set.npy'] + [f'{vocab}_{array}.npy' for vocab in ['entity_to_idx', 'relation_to_idx']
+                                         for array in ['buffer', 'offsets', 'order']]
+
+
+def link_or_copy_files(source: str, target: str) -> None:
+    """ Hard link the serialized files of a knowledge graph in source into target, or copy them if links fail """
+    for name in SERIALIZED_KG_FILES:
+        if os.path.isfile(os.path.join(source, name)) and not os.path.isfile(os.path.join(target, name)):
+            try:
+                os.link(os.path.join(source, name), os.path.join(target, name))
+            except OSError:
+                shutil.copyfile(os.path.join(source, name), os.path.join(target, name))
+
+
+def is_memory_mapped_from(data: np.ndarray, file_path: str) -> bool:
+    """ Whether data is a memory-mapped view of file_path """
+    return isinstance(data, np.memmap) and data.filename is not None and os.path.exists(file_path) \
+        and os.path.samefile(data.filename, file_path)
 
 
 class LoadSaveToDisk:
     def __init__(self, kg):
         self.kg = kg
 
+    @staticmethod
+    def is_cached(path: str) -> bool:
+        return path is not None and all(os.path.isfile(os.path.join(path, name)) for name in REQUIRED_KG_FILES)
+
+    def load_from_cache(self):
+        """
+        Load a preprocessed knowledge graph from the cache and link its files into the experiment folder
+
+        Parameter
+        ---------
+
+        Returns
+        -------
+        None
+        """
+        self.load(path=self.kg.path_of_cache)
+        if self.kg.path_for_serialization is not None:
+            link_or_copy_files(self.kg.path_of_cache, self.kg.path_for_serialization)
+
+    def save_to_cache(self):
+        """
+        Publish the serialized knowledge graph into the cache
+
+        Files are linked into a temporary folder that is renamed to the cache folder once all files are written,
+        so that concurrent runs never load a partially written cache.
+        If er, re and ee vocabs are computed by subprocesses, this is done in a thread after they are written.
+
+        Parameter
+        ---------
+
+        Returns
+        -------
+        None
+        """
+        if self.kg.path_for_serialization is None or self.is_cached(self.kg.path_of_cache):
+            return None
+        futures = [self.kg.er_vocab, self.kg.re_vocab, self.kg.ee_vocab, self.kg.constraints] if self.kg.eval_model else []
+        path_of_serialization, path_of_cache = self.kg.path_for_serialization, self.kg.path_of_cache
+
+        def publish():
+            try:
+                concurrent.futures.wait(futures)
+                temporary_path = path_of_cache + f'.{os.getpid()}'
+                os.makedirs(temporary_path, exist_ok=True)
+                link_or_copy_files(path_of_serialization, temporary_path)
+                os.rename(temporary_path, path_of_cache)
+            except OSError:
+                # e.g. another run has already published the same knowledge graph
+                shutil.rmtree(path_of_cache + f'.{os.getpid()}', ignore_errors=True)
+
+        if len(futures) > 0:
+            threading.Thread(target=publish).start()
+        else:
+            publish()
+
     def save(self):
         assert self.kg.path_for_deserialization is None
 
@@ -16,57 +102,91 @@ class LoadSaveToDisk:
             # No serialization
             return None
 
-        assert isinstance(self.kg.entity_to_idx, dict)
-        assert isinstance(self.kg.relation_to_idx, dict)
+        assert isinstance(self.kg.entity_to_idx, Mapping)
+        assert isinstance(self.kg.relation_to_idx, Mapping)
         assert isinstance(self.kg.train_set, np.ndarray)
 
-        # (1) Save dictionary mappings into disk
-        save_pickle(data=self.kg.entity_to_idx, file_path=self.kg.path_for_serialization + '/entity_to_idx.p')
-        save_pickle(data=self.kg.relation_to_idx, file_path=self.kg.path_for_serialization + '/relation_to_idx.p')
+        # (1) Save mappings into disk
+        StringIndex.from_mapping(self.kg.entity_to_idx).save(self.kg.path_for_serialization + '/entity_to_idx')
+        StringIndex.from_mapping(self.kg.relation_to_idx).save(self.kg.path_for_serialization + '/relation_to_idx')
 
-        save_numpy_ndarray(data=self.kg.train_set, file_path=self.kg.path_for_serialization + '/train_set.npy')
-        if self.kg.valid_set is not None:
-            save_numpy_ndarray(data=self.kg.valid_set, file_path=self.kg.path_for_serialization + '/valid_set.npy')
-        if self.kg.test_set is not None:
-            save_numpy_ndarray(data=self.kg.test_set, file_path=self.kg.path_for_serialization + '/test_set.npy')
+        for name in ['train_set', 'valid_set', 'test_set']:
+            data, file_path = getattr(self.kg, name), self.kg.path_for_serialization + f'/{name}.npy'
+            # Streamed triples are already memory-mapped from file_path.
+            if data is not None and not is_memory_mapped_from(data, file_path):
+                save_numpy_ndarray(data=data, file_path=file_path)
 
         if self.kg.eval_model:
-            if self.kg.valid_set is not None and self.kg.test_set is not None:
-                assert isinstance(self.kg.valid_set, np.ndarray) and isinstance(self.kg.test_set, np.ndarray)
-                data = np.concatenate([self.kg.train_set, self.kg.valid_set, self.kg.test_set])
+            names = ['train_set', 'valid_set', 'test_set'] \
+                if self.kg.valid_set is not None and self.kg.test_set is not None else ['train_set']
+            paths = [self.kg.path_for_serialization + f'/{name}.npy' for name in names]
+            if all(is_memory_mapped_from(getattr(self.kg, name), path) for name, path in zip(names, paths)):
+                # Streamed triples are memory-mapped by the subprocesses instead of being loaded and pickled into them.
+                data, train_set = paths, paths[0]
             else:
-                data = self.kg.train_set
+                assert all(isinstance(getattr(self.kg, name), np.ndarray) for name in names)
+                data = np.concatenate([getattr(self.kg, name) for name in names]) if len(names) > 1 else self.kg.train_set
+                train_set = self.kg.train_set
             # We need to parallelise the next four steps.
             print('Submit er-vocab, re-vocab, and ee-vocab via  ProcessPoolExecutor...')
             executor = concurrent.futures.ProcessPoolExecutor()
-            self.kg.er_vocab = executor.submit(get_er_vocab, data, self.kg.path_for_serialization + '/er_vocab.p')
-            self.kg.re_vocab = executor.submit(get_re_vocab, data, self.kg.path_for_serialization + '/re_vocab.p')
-            self.kg.ee_vocab = executor.submit(get_ee_vocab, data, self.kg.path_for_serialization + '/ee_vocab.p')
-            self.kg.constraints = executor.submit(create_constraints, self.kg.train_set,
+            self.kg.er_vocab = executor.submit(get_er_vocab, data, self.kg.path_for_serialization + '/er_vocab')
+            self.kg.re_vocab = executor.submit(get_re_vocab, data, self.kg.path_for_serialization + '/re_vocab')
+            self.kg.ee_vocab = executor.submit(get_ee_vocab, data, self.kg.path_for_serialization + '/ee_vocab')
+            self.kg.constraints = executor.submit(create_constraints, train_set,
                                                   self.kg.path_for_serialization + '/constraints.p')
             self.kg.domain_constraints_per_rel, self.kg.range_constraints_per_rel = None, None
 
-    def load(self):
-        assert self.kg.path_for_deserialization is not None
-        assert self.kg.path_for_serialization == self.kg.path_for_deserialization
+    def save_filter_indexes(self, path: str) -> None:
+        """
+        Store er, re and ee vocabs and constraints of the knowledge graph into path,
+        e.g. into the experiment folder of a run reusing an already preprocessed knowledge graph
+
+        Parameter
+        ---------
+        path: str
+            A folder
+
+        Returns
+        -------
+        None
+        """
+        for name in ['er_vocab', 're_vocab', 'ee_vocab']:
+            vocab = getattr(self.kg, name, None)
+            if isinstance(vocab, concurrent.futures.Future):
+                vocab = vocab.result()
+            if isinstance(vocab, FilterIndex):
+                vocab.save(os.path.join(path, name))
+        constraints = getattr(self.kg, 'constraints', None)
+        if isinstance(constraints, concurrent.futures.Future):
+            constraints = constraints.result()
+        if isinstance(constraints, tuple):
+            save_pickle(data=constraints, file_path=os.path.join(path, 'constraints.p'))
+
+    def load(self, path: str = None):
+        if path is None:
+            assert self.kg.path_for_deserialization is not None
+            assert self.kg.path_for_serialization == self.kg.path_for_deserialization
+            path = self.kg.path_for_deserialization
 
-        self.kg.entity_to_idx = load_pickle(file_path=self.kg.path_for_deserialization + '/entity_to_idx.p')
-        self.kg.relation_to_idx = load_pickle(file_path=self.kg.path_for_deserialization + '/relation_to_idx.p')
-        assert isinstance(self.kg.entity_to_idx, dict)
-        assert isinstance(self.kg.relation_to_idx, dict)
+        self.kg.entity_to_idx = StringIndex.load(path + '/entity_to_idx')
+        self.kg.relation_to_idx = StringIndex.load(path + '/relation_to_idx')
+        assert isinstance(self.kg.entity_to_idx, Mapping)
+        assert isinstance(self.kg.relation_to_idx, Mapping)
         self.kg.num_entities = len(self.kg.entity_to_idx)
         self.kg.num_relations = len(self.kg.relation_to_idx)
 
-        self.kg.train_set = load_numpy_ndarray(file_path=self.kg.path_for_deserialization + '/train_set.npy')
+        # Memory-mapped read-only arrays are loaded instantly and shared via the page cache across processes.
+        self.kg.train_set = load_numpy_ndarray(file_path=path + '/train_set.npy', mmap_mode='r')
 
-        if os.path.isfile(self.kg.path_for_deserialization + '/valid_set.npy'):
-            self.kg.valid_set = load_numpy_ndarray(file_path=self.kg.path_for_deserialization + '/valid_set.npy')
-        if os.path.isfile(self.kg.path_for_deserialization + '/test_set.npy'):
-            self.kg.test_set = load_numpy_ndarray(file_path=self.kg.path_for_deserialization + '/test_set.npy')
+        if os.path.isfile(path + '/valid_set.npy'):
+            self.kg.valid_set = load_numpy_ndarray(file_path=path + '/valid_set.npy', mmap_mode='r')
+        if os.path.isfile(path + '/test_set.npy'):
+            self.kg.test_set = load_numpy_ndarray(file_path=path + '/test_set.npy', mmap_mode='r')
 
         if self.kg.eval_model:
-            self.kg.er_vocab = load_pickle(file_path=self.kg.path_for_deserialization + '/er_vocab.p')
-            self.kg.re_vocab = load_pickle(file_path=self.kg.path_for_deserialization + '/re_vocab.p')
-            self.kg.ee_vocab = load_pickle(file_path=self.kg.path_for_deserialization + '/ee_vocab.p')
-            self.kg.domain_constraints_per_rel, self.kg.range_constraints_per_rel = load_pickle(
-                file_path=self.kg.path_for_deserialization + '/constraints.p')
+            self.kg.er_vocab = FilterIndex.load(path + '/er_vocab')
+            self.kg.re_vocab = FilterIndex.load(path + '/re_vocab')
+            self.kg.ee_vocab = FilterIndex.load(path + '/ee_vocab')
+            self.kg.constraints = load_pickle(file_path=path + '/constraints.p')
+            self.kg.domain_constraints_per_rel, self.kg.range_constraints_per_rel = self.kg.constraints
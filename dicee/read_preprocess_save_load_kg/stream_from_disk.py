@@ -0,0 +1,207 @@
+import glob
+import os
+import shutil
+import tempfile
+import weakref
+from typing import Iterator, List
+import numpy as np
+import polars
+from .util import timeit
+from dicee.static_funcs import numpy_data_type_changer
+
+
+class StreamFromDisk:
+    """ Read, index and serialize a knowledge graph chunk by chunk
+
+    Peak memory usage is bounded by the size of a chunk and of the vocabularies instead of the size of the input.
+    Strings of a chunk are mapped to codes of the polars global string cache, new codes are assigned the next
+    integer indexes in the order of their first occurrence and the indexed triples are appended to disk.
+    Therefore, indexes differ from the ones assigned by ReadFromDisk and PreprocessKG.
+    """
+
+    def __init__(self, kg, chunk_size: int):
+        self.kg = kg
+        self.chunk_size = chunk_size
+        self.entities, self.relations = [], []
+        # Code of the global string cache to entity and relation index, -1 if the code is not an entity/relation.
+        self.code_to_entity = np.full(0, -1, dtype=np.int64)
+        self.code_to_relation = np.full(0, -1, dtype=np.int64)
+        self.remove_literals = None
+
+    @timeit
+    def start(self) -> None:
+        """
+        Stream train, valid and test datasets into memory-mapped integer arrays
+
+        (1) Find input files
+        (2) Index each file chunk by chunk and append indexed triples into a raw int64 file
+        (3) Construct vocabularies
+        (4) Convert raw files into .npy files with the most efficient integer type and add reciprocal triples
+
+        Parameter
+        ---------
+
+        Returns
+        -------
+        None
+        """
+        assert self.kg.sparql_endpoint is None, 'Streaming from a triple store is not supported'
+        if self.kg.add_noise_rate:
+            print(f'Adding noisy triples is not supported while streaming. add_noise_rate={self.kg.add_noise_rate} is ignored')
+        if self.kg.path_for_serialization is not None:
+            folder = self.kg.path_for_serialization
+        else:
+            # Memory-mapped triples are stored in a temporary folder that is removed with the knowledge graph.
+            folder = tempfile.mkdtemp()
+            weakref.finalize(self.kg, shutil.rmtree, folder, ignore_errors=True)
+        # (1) Find input files.
+        if self.kg.path_single_kg is not None:
+            splits = {'train_set': self.kg.path_single_kg}
+        else:
+            splits = dict()
+            for i in glob.glob(self.kg.data_dir + '/*'):
+                if 'train' in i:
+                    splits['train_set'] = i
+                elif 'test' in i and self.kg.eval_model is not None:
+                    splits['test_set'] = i
+                elif 'valid' in i and self.kg.eval_model is not None:
+                    splits['valid_set'] = i
+                else:
+                    print(f'Unrecognized data {i}')
+        # Training triples are indexed first.
+        splits = {name: splits[name] for name in ['train_set', 'valid_set', 'test_set'] if name in splits}
+        # (2) Index chunks.
+        with polars.StringCache():
+            for name, path in splits.items():
+                print(f'*** Streaming {path} in chunks of {self.chunk_size} triples ***')
+                with open(os.path.join(folder, name + '.raw'), 'wb') as file:
+                    for chunk in self.read_chunks(path, read_only_few=self.kg.read_only_few if name == 'train_set' else None):
+                        self.index_chunk(self.filter_chunk(chunk, is_train=name == 'train_set')).tofile(file)
+        # (3) Construct vocabularies.
+        self.kg.entity_to_idx = {ent: idx for idx, ent in enumerate(self.entities)}
+        self.kg.relation_to_idx = {rel: idx for idx, rel in enumerate(self.relations)}
+        self.kg.num_entities, self.kg.num_relations = len(self.kg.entity_to_idx), len(self.kg.relation_to_idx)
+        # (4) Convert raw files.
+        add_reciprical = bool(self.kg.add_reciprical and self.kg.eval_model)
+        # Select the integer type of in-memory preprocessing, p_inverse is indexed as p+num_relations.
+        dtype = numpy_data_type_changer(np.empty((0, 3), dtype=np.int64),
+                                        num=max(self.kg.num_entities,
+                                                (1 + add_reciprical) * self.kg.num_relations)).dtype
+        for name in splits:
+            setattr(self.kg, name, self.convert_raw_file(os.path.join(folder, name), dtype,
+                                                         add_reciprical=add_reciprical))
+        if add_reciprical:
+            self.kg.relation_to_idx.update({rel + '_inverse': idx + self.kg.num_relations
+                                            for rel, idx in list(self.kg.relation_to_idx.items())})
+            self.kg.num_relations = len(self.kg.relation_to_idx)
+
+    def read_chunks(self, path: str, read_only_few: int = None) -> Iterator[polars.DataFrame]:
+        """ Yield chunks of string triples from a tab separated file or a parquet file """
+        if path[-3:] in ['txt', 'csv']:
+            reader = polars.read_csv_batched(path,
+                                             has_header=False,
+                                             columns=[0, 1, 2],
+                                             dtypes=[polars.Utf8] * 3,
+                                             new_columns=['subject', 'relation', 'object'],
+                                             separator="\t",
+                                             batch_size=self.chunk_size)
+            chunks = iter(lambda: reader.next_batches(1), None)
+        else:
+            lazy_df = polars.scan_parquet(path)
+            columns = lazy_df.columns[:3]
+            lazy_df = lazy_df.select([polars.col(c).cast(polars.Utf8).alias(n)
+                                      for c, n in zip(columns, ['subject', 'relation', 'object'])])
+            chunks = ([lazy_df.slice(offset, self.chunk_size).collect()] for offset in range(0, 2 ** 63, self.chunk_size))
+        num_triples = 0
+        for batches in chunks:
+            if not batches or len(batches[0]) == 0:
+                break
+            chunk = batches[0]
+            if read_only_few:
+                chunk = chunk.head(read_only_few - num_triples)
+            num_triples += len(chunk)
+            yield chunk
+            if read_only_few and num_triples >= read_only_few:
+                break
+
+    def filter_chunk(self, chunk: polars.DataFrame, is_train: bool) -> polars.DataFrame:
+        """ Sample and remove literals as read_with_polars does """
+        # (1) Sample training triples.
+        if is_train and self.kg.sample_triples_ratio:
+            chunk = chunk.sample(fraction=self.kg.sample_triples_ratio)
+        # (2) Type heuristic prediction on the first chunk: If KG is an RDF KG, remove all triples where object is not <?>.
+        if self.remove_literals is None:
+            h = chunk.head()
+            self.remove_literals = h["subject"].str.starts_with('<').sum() + h["relation"].str.starts_with('<').sum() > 2
+            if self.remove_literals:
+                print('Removing triples with literal values...')
+        if self.remove_literals:
+            chunk = chunk.filter(polars.col("object").str.starts_with('<'))
+        return chunk
+
+    def index_chunk(self, chunk: polars.DataFrame) -> np.ndarray:
+        """ Map string triples of a chunk into int64 indexes, extending vocabularies with unseen strings """
+        codes = chunk.select(polars.all().cast(polars.Categorical).to_physical()).to_numpy().astype(np.int64)
+        entities = self.assign_indices(np.concatenate([codes[:, 0], codes[:, 2]]),
+                                       polars.concat([chunk['subject'], chunk['object']]),
+                                       vocabulary=self.entities, name='code_to_entity')
+        relations = self.assign_indices(codes[:, 1], chunk['relation'], vocabulary=self.relations,
+                                        name='code_to_relation')
+        return np.stack([entities[:len(chunk)], relations, entities[len(chunk):]], axis=1)
+
+    def assign_indices(self, codes: np.ndarray, strings: polars.Series, vocabulary: List[str], name: str) -> np.ndarray:
+        """
+        Index codes of strings, unseen strings are appended to the vocabulary in the order of their first occurrence
+
+        Parameter
+        ---------
+        codes: np.ndarray
+            Codes of the global string cache
+        strings: polars.Series
+            Strings of codes
+        vocabulary: List[str]
+            Strings of indexes
+        name: str
+            Attribute storing the mapping from codes to indexes
+
+        Returns
+        -------
+        np.ndarray
+            Indexes of codes
+        """
+        code_to_idx = getattr(self, name)
+        if len(codes) > 0 and codes.max() >= len(code_to_idx):
+            code_to_idx = np.concatenate([code_to_idx, np.full(codes.max() + 1 - len(code_to_idx), -1, dtype=np.int64)])
+            setattr(self, name, code_to_idx)
+        unique_codes, first_occurrences = np.unique(codes, return_index=True)
+        is_new = code_to_idx[unique_codes] == -1
+        first_occurrences = first_occurrences[is_new]
+        order = np.argsort(first_occurrences)
+        code_to_idx[unique_codes[is_new][order]] = np.arange(len(vocabulary), len(vocabulary) + len(order))
+        vocabulary.extend(strings[first_occurrences[order]].to_list())
+        return code_to_idx[codes]
+
+    def convert_raw_file(self, path: str, dtype, add_reciprical: bool = False) -> np.memmap:
+        """
+        Copy int64 triples of path.raw into path.npy chunk by chunk and memory-map the result
+
+        If add_reciprical, triples are followed by their inverses as in create_recipriocal_triples, i.e.,
+        KG:= {(s,p,o)} union {(o,p+num_relations,s)}
+        """
+        if os.path.getsize(path + '.raw') == 0:
+            # np.memmap cannot map an empty file.
+            raw = np.empty((0, 3), dtype=np.int64)
+        else:
+            raw = np.memmap(path + '.raw', dtype=np.int64, mode='r').reshape(-1, 3)
+        npy = np.lib.format.open_memmap(path + '.npy', mode='w+', dtype=dtype,
+                                        shape=(len(raw) * (1 + add_reciprical), 3))
+        for i in range(0, len(raw), self.chunk_size):
+            chunk = raw[i:i + self.chunk_size]
+            npy[i:i + len(chunk)] = chunk
+            if add_reciprical:
+                # (o,p+num_relations,s)
+                npy[len(raw) + i:len(raw) + i + len(chunk)] = chunk[:, [2, 1, 0]] + [0, self.kg.num_relations, 0]
+        npy.flush()
+        del raw, npy
+        os.remove(path + '.raw')
+        return np.load(path + '.npy', mmap_mode='r')
@@ -10,6 +10,7 @@ import os
 import psutil
 import requests
 from rdflib import Graph
+from typing import Tuple
 
 
 def timeit(func):
@@ -139,33 +140,125 @@ def read_from_triple_store(endpoint: str = None):
     return pd.DataFrame(data=triples, index=None, columns=["subject", "relation", "object"], dtype=str)
 
 
+class FilterIndex:
+    """
+    A mapping from pairs of integers to arrays of integers in compressed sparse row format,
+    e.g. from (head entity, relation) pairs to all tail entities occurring with them.
+
+    (1) keys: sorted unique codes of pairs, i.e., (a << 32) | b
+    (2) offsets: values of the i.th key are values[offsets[i]:offsets[i+1]]
+    (3) values
+
+    index[(a, b)] returns the values of (a, b) and an empty array if (a, b) does not exist as in defaultdict(list).
+    """
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, values: np.ndarray):
+        assert len(offsets) == len(keys) + 1
+        self.keys = keys
+        self.offsets = offsets
+        self.values = values
+
+    @staticmethod
+    def encode(a, b) -> np.ndarray:
+        return (np.asarray(a, dtype=np.int64) << 32) | np.asarray(b, dtype=np.int64)
+
+    @classmethod
+    def from_pairs(cls, a: np.ndarray, b: np.ndarray, values: np.ndarray):
+        """ Group values by (a, b) via sorting """
+        codes = cls.encode(a, b)
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        keys, starts = np.unique(codes, return_index=True)
+        return cls(keys=keys, offsets=np.append(starts, len(codes)).astype(np.int64), values=values[order])
+
+    @classmethod
+    def from_dict(cls, vocab: dict):
+        """ Convert a mapping from pairs to lists of values, e.g. a pickled er_vocab of earlier versions """
+        lengths = np.fromiter((len(v) for v in vocab.values()), dtype=np.int64, count=len(vocab))
+        pairs = np.array(list(vocab.keys()), dtype=np.int64).reshape(-1, 2)
+        values = np.fromiter((x for v in vocab.values() for x in v), dtype=np.int64, count=int(lengths.sum()))
+        return cls.from_pairs(np.repeat(pairs[:, 0], lengths), np.repeat(pairs[:, 1], lengths), values)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, pair) -> np.ndarray:
+        code = self.encode(pair[0], pair[1])
+        i = np.searchsorted(self.keys, code)
+        if i < len(self.keys) and self.keys[i] == code:
+            return self.values[self.offsets[i]:self.offsets[i + 1]].astype(np.int64)
+        return np.zeros(0, dtype=np.int64)
+
+    def lookup(self, a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Values of many pairs at once
+
+        Parameter
+        ---------
+        a: np.ndarray with (n,) shape
+        b: np.ndarray with (n,) shape
+
+        Returns
+        -------
+        rows: np.ndarray with (m,) shape containing the index of the pair of each value
+        values: np.ndarray with (m,) shape
+        """
+        codes = self.encode(a, b)
+        if len(self.keys) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        i = np.minimum(np.searchsorted(self.keys, codes), len(self.keys) - 1)
+        found = self.keys[i] == codes
+        starts = np.where(found, self.offsets[i], 0)
+        lengths = np.where(found, self.offsets[i + 1] - self.offsets[i], 0)
+        rows = np.repeat(np.arange(len(codes)), lengths)
+        # Position of each value: the start of its pair plus its rank within the pair.
+        positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return rows, self.values[positions].astype(np.int64)
+
+    def save(self, path: str) -> None:
+        """ Save into path_keys.npy, path_offsets.npy and path_values.npy """
+        np.save(path + '_keys.npy', self.keys)
+        np.save(path + '_offsets.npy', self.offsets)
+        np.save(path + '_values.npy', self.values)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r'):
+        """ Load (memory-map) path_keys.npy, path_offsets.npy and path_values.npy or convert a pickled vocab in path.p """
+        if not os.path.isfile(path + '_keys.npy') and os.path.isfile(path + '.p'):
+            return cls.from_dict(load_pickle(file_path=path + '.p'))
+        return cls(keys=np.load(path + '_keys.npy', mmap_mode=mmap_mode),
+                   offsets=np.load(path + '_offsets.npy', mmap_mode=mmap_mode),
+                   values=np.load(path + '_values.npy', mmap_mode=mmap_mode))
+
+
+def triples_column(data, column: int) -> np.ndarray:
+    """ A column of triples given as an array or as paths of .npy files that are memory-mapped """
+    if isinstance(data, np.ndarray):
+        return data[:, column]
+    return np.concatenate([np.load(path, mmap_mode='r')[:, column] for path in data])
+
+
 def get_er_vocab(data, file_path: str = None):
-    # head entity and relation
-    er_vocab = defaultdict(list)
-    for triple in data:
-        er_vocab[(triple[0], triple[1])].append(triple[2])
+    # head entity and relation to tail entities
+    er_vocab = FilterIndex.from_pairs(triples_column(data, 0), triples_column(data, 1), triples_column(data, 2))
     if file_path:
-        save_pickle(data=er_vocab, file_path=file_path)
+        er_vocab.save(file_path)
     return er_vocab
 
 
 def get_re_vocab(data, file_path: str = None):
-    # head entity and relation
-    re_vocab = defaultdict(list)
-    for triple in data:
-        re_vocab[(triple[1], triple[2])].append(triple[0])
+    # relation and tail entity to head entities
+    re_vocab = FilterIndex.from_pairs(triples_column(data, 1), triples_column(data, 2), triples_column(data, 0))
     if file_path:
-        save_pickle(data=re_vocab, file_path=file_path)
+        re_vocab.save(file_path)
     return re_vocab
 
 
 def get_ee_vocab(data, file_path: str = None):
-    # head entity and relation
-    ee_vocab = defaultdict(list)
-    for triple in data:
-        ee_vocab[(triple[0], triple[2])].append(triple[1])
+    # head entity and tail entity to relations
+    ee_vocab = FilterIndex.from_pairs(triples_column(data, 0), triples_column(data, 2), triples_column(data, 1))
     if file_path:
-        save_pickle(data=ee_vocab, file_path=file_path)
+        ee_vocab.save(file_path)
     return ee_vocab
 
 
@@ -178,6 +271,9 @@ def create_constraints(triples, file_path: str = None):
     :return:
     Tuple[dict, dict]
     """
+    if isinstance(triples, str):
+        # Path of a .npy file
+        triples = np.load(triples, mmap_mode='r')
     assert isinstance(triples, np.ndarray)
     assert triples.shape[1] == 3
 
@@ -272,7 +368,10 @@ def save_numpy_ndarray(*, data: np.ndarray, file_path: str):
         np.save(f, data)
 
 
-def load_numpy_ndarray(*, file_path: str):
+def load_numpy_ndarray(*, file_path: str, mmap_mode: str = None):
+    """ Load an array. If mmap_mode is given, e.g. 'r', the array is memory-mapped instead of being read into memory """
+    if mmap_mode is not None:
+        return np.load(file_path, mmap_mode=mmap_mode)
     with open(file_path, 'rb') as f:
         return np.load(f)
 
@@ -286,15 +385,21 @@ def load_pickle(*, file_path=str):
         return pickle.load(f)
 
 
-def create_recipriocal_triples(x):
+def create_recipriocal_triples(x: np.ndarray, num_relations: int) -> np.ndarray:
     """
-    Add inverse triples into dask dataframe
-    :param x:
-    :return:
+    Add inverse triples into indexed triples, where the inverse of a relation p is indexed as p+num_relations
+    :param x: indexed triples
+    :param num_relations: number of relations
+    :return: indexed triples followed by their inverses
     """
-    return pd.concat([x, x['object'].to_frame(name='subject').join(
-        x['relation'].map(lambda x: x + '_inverse').to_frame(name='relation')).join(
-        x['subject'].to_frame(name='object'))], ignore_index=True)
+    return np.concatenate([x, np.stack([x[:, 2], x[:, 1] + num_relations, x[:, 0]], axis=1)])
+
+
+def lookup_indexes(column: pd.Series, str_to_idx: dict) -> np.ndarray:
+    """ Map a column of strings into indexes via a hash index over the keys of str_to_idx, -1 for unknown strings """
+    positions = pd.Index(list(str_to_idx.keys())).get_indexer(column)
+    indexes = np.fromiter(str_to_idx.values(), dtype=np.int64, count=len(str_to_idx))
+    return np.where(positions >= 0, indexes[positions], -1)
 
 
 def index_triples_with_pandas(train_set, entity_to_idx: dict, relation_to_idx: dict) -> pd.core.frame.DataFrame:
@@ -306,9 +411,9 @@ def index_triples_with_pandas(train_set, entity_to_idx: dict, relation_to_idx: d
     :return: indexed triples, i.e., pandas dataframe
     """
     n, d = train_set.shape
-    train_set['subject'] = train_set['subject'].apply(lambda x: entity_to_idx.get(x))
-    train_set['relation'] = train_set['relation'].apply(lambda x: relation_to_idx.get(x))
-    train_set['object'] = train_set['object'].apply(lambda x: entity_to_idx.get(x))
+    train_set['subject'] = lookup_indexes(train_set['subject'], entity_to_idx)
+    train_set['relation'] = lookup_indexes(train_set['relation'], relation_to_idx)
+    train_set['object'] = lookup_indexes(train_set['object'], entity_to_idx)
     # train_set = train_set.dropna(inplace=True)
     if isinstance(train_set, pd.core.frame.DataFrame):
         assert (n, d) == train_set.shape
@@ -3,7 +3,7 @@ import torch
 import datetime
 from typing import Tuple, List
 from .models import CMult, Pyke, DistMult, KeciBase, Keci, TransE, \
-    ComplEx, AConEx, AConvO, AConvQ, ConvQ, ConvO, ConEx, QMult, OMult, Shallom,DeCaL
+    ComplEx, AConEx, AConvO, AConvQ, ConvQ, ConvO, ConEx, QMult, OMult, Shallom,DeCaL, DeCaLSupernet
 from .models.pykeen_models import PykeenKGE
 import time
 import pandas as pd
@@ -14,6 +14,8 @@ import os
 import psutil
 from .models.base_model import BaseKGE
 import pickle
+import hashlib
+from collections.abc import Mapping, Sequence
 
 
 def timeit(func):
@@ -40,6 +42,103 @@ def load_pickle(file_path=str):
         return pickle.load(f)
 
 
+class StringSequence(Sequence):
+    """ Strings of utf-8 bytes concatenated in buffer, the i.th string is buffer[offsets[i]:offsets[i+1]] """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def encoded(self, i: int) -> bytes:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return self.encoded(i % len(self)).decode('utf-8')
+
+
+class StringIndex(Mapping):
+    """
+    A read-only mapping from strings to their indexes 0, 1, ..., n-1 stored in three arrays
+
+    (1) buffer: utf-8 bytes of strings concatenated in the order of their indexes
+    (2) offsets: the string of the i.th index is buffer[offsets[i]:offsets[i+1]]
+    (3) order: indexes sorted by the bytes of their strings
+
+    index[string] is found via a binary search over order, and index.strings[i] slices the buffer.
+    Since arrays are memory-mapped, loading does not depend on the number of strings.
+    Keys, values and items are iterated in the order of indexes as in a dict created by enumerate.
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, order: np.ndarray):
+        assert len(offsets) == len(order) + 1
+        self.strings = StringSequence(buffer, offsets)
+        self.order = order
+
+    @classmethod
+    def from_mapping(cls, str_to_idx: Mapping):
+        """ Construct from a mapping whose values are 0, 1, ..., n-1 """
+        if isinstance(str_to_idx, StringIndex):
+            return str_to_idx
+        strings = [None] * len(str_to_idx)
+        for string, idx in str_to_idx.items():
+            strings[idx] = string.encode('utf-8')
+        assert None not in strings, 'Indexes must be 0, 1, ..., n-1'
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i in strings], out=offsets[1:])
+        return cls(buffer=np.frombuffer(b''.join(strings), dtype=np.uint8),
+                   offsets=offsets,
+                   order=np.array(sorted(range(len(strings)), key=strings.__getitem__), dtype=np.int64))
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __getitem__(self, string: str) -> int:
+        if not isinstance(string, str):
+            raise KeyError(string)
+        target = string.encode('utf-8')
+        low, high = 0, len(self.order)
+        while low < high:
+            mid = (low + high) // 2
+            if self.strings.encoded(self.order[mid]) < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self.order) and self.strings.encoded(self.order[low]) == target:
+            return int(self.order[low])
+        raise KeyError(string)
+
+    def values(self):
+        return range(len(self))
+
+    def items(self):
+        return zip(self, range(len(self)))
+
+    def save(self, path: str) -> None:
+        """ Save into path_buffer.npy, path_offsets.npy and path_order.npy """
+        np.save(path + '_buffer.npy', self.strings.buffer)
+        np.save(path + '_offsets.npy', self.strings.offsets)
+        np.save(path + '_order.npy', self.order)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r'):
+        """ Load (memory-map) path_buffer.npy, path_offsets.npy and path_order.npy or a pickled dict in path.p """
+        if not os.path.isfile(path + '_buffer.npy') and os.path.isfile(path + '.p'):
+            return load_pickle(file_path=path + '.p')
+        return cls(buffer=np.load(path + '_buffer.npy', mmap_mode=mmap_mode),
+                   offsets=np.load(path + '_offsets.npy', mmap_mode=mmap_mode),
+                   order=np.load(path + '_order.npy', mmap_mode=mmap_mode))
+
+
 # @TODO: Could these funcs can be merged?
 def select_model(args: dict, is_continual_training: bool = None, storage_path: str = None):
     isinstance(args, dict)
@@ -62,7 +161,7 @@ def select_model(args: dict, is_continual_training: bool = None, storage_path: s
         return intialize_model(args)
 
 
-def load_model(path_of_experiment_folder: str, model_name='model.pt') -> Tuple[object, dict, dict]:
+def load_model(path_of_experiment_folder: str, model_name='model.pt') -> Tuple[object, Mapping, Mapping]:
     """ Load weights and initialize pytorch module from namespace arguments"""
     print(f'Loading model {model_name}...', end=' ')
     start_time = time.time()
@@ -89,17 +188,14 @@ def load_model(path_of_experiment_folder: str, model_name='model.pt') -> Tuple[o
     start_time = time.time()
     print('Loading entity and relation indexes...', end=' ')
     try:
-        # Maybe ? https://docs.python.org/3/library/mmap.html
-        with open(path_of_experiment_folder + '/entity_to_idx.p', 'rb') as f:
-            entity_to_idx = pickle.load(f)
+        entity_to_idx = StringIndex.load(path_of_experiment_folder + '/entity_to_idx')
     except FileNotFoundError:
-        print("entity_to_idx.p not found")
+        print("entity_to_idx not found")
         entity_to_idx=dict()
     try:    
-        with open(path_of_experiment_folder + '/relation_to_idx.p', 'rb') as f:
-            relation_to_idx = pickle.load(f)
+        relation_to_idx = StringIndex.load(path_of_experiment_folder + '/relation_to_idx')
     except FileNotFoundError:
-        print("relation_to_idx.p not found")
+        print("relation_to_idx not found")
         relation_to_idx=dict()
     print(f'Done! It took {time.time() - start_time:.4f}')
     return model, entity_to_idx, relation_to_idx
@@ -155,12 +251,10 @@ def load_model_ensemble(path_of_experiment_folder: str) -> Tuple[BaseKGE, pd.Dat
     model.eval()
     start_time = time.time()
     print('Loading entity and relation indexes...', end=' ')
-    with open(path_of_experiment_folder + '/entity_to_idx.p', 'rb') as f:
-        entity_to_idx = pickle.load(f)
-    with open(path_of_experiment_folder + '/relation_to_idx.p', 'rb') as f:
-        relation_to_idx = pickle.load(f)
-    assert isinstance(entity_to_idx, dict)
-    assert isinstance(relation_to_idx, dict)
+    entity_to_idx = StringIndex.load(path_of_experiment_folder + '/entity_to_idx')
+    relation_to_idx = StringIndex.load(path_of_experiment_folder + '/relation_to_idx')
+    assert isinstance(entity_to_idx, Mapping)
+    assert isinstance(relation_to_idx, Mapping)
     print(f'Done! It took {time.time() - start_time:.4f}')
     return model, entity_to_idx, relation_to_idx
 
@@ -228,7 +322,7 @@ def store(trainer,
     save_checkpoint_model(model=trained_model, path=full_storage_path + f'/{model_name}.pt')
     if save_embeddings_as_csv:
         entity_emb, relation_ebm = trained_model.get_embeddings()
-        entity_to_idx = pickle.load(open(full_storage_path + '/entity_to_idx.p', 'rb'))
+        entity_to_idx = StringIndex.load(full_storage_path + '/entity_to_idx')
         entity_str = entity_to_idx.keys()
         # Ensure that the ordering is correct.
         assert list(range(0, len(entity_str))) == list(entity_to_idx.values())
@@ -236,7 +330,7 @@ def store(trainer,
                         path=full_storage_path + '/' + trained_model.name + '_entity_embeddings.csv')
         del entity_to_idx, entity_str, entity_emb
         if relation_ebm is not None:
-            relation_to_idx = pickle.load(open(full_storage_path + '/relation_to_idx.p', 'rb'))
+            relation_to_idx = StringIndex.load(full_storage_path + '/relation_to_idx')
             relations_str = relation_to_idx.keys()
 
             save_embeddings(relation_ebm.numpy(), indexes=relations_str,
@@ -246,34 +340,42 @@ def store(trainer,
             pass
 
 
-def add_noisy_triples(train_set: pd.DataFrame, add_noise_rate: float) -> pd.DataFrame:
-    """
-    Add randomly constructed triples
-    :param train_set:
-    :param add_noise_rate:
-    :return:
-    """
-    num_triples = len(train_set)
-    num_noisy_triples = int(num_triples * add_noise_rate)
-    print(f'[4 / 14] Generating {num_noisy_triples} noisy triples for training data...')
-
-    list_of_entities = pd.unique(train_set[['subject', 'object']].values.ravel())
-
-    train_set = pd.concat([train_set,
-                           # Noisy triples
-                           pd.DataFrame(
-                               {'subject': np.random.choice(list_of_entities, num_noisy_triples),
-                                'relation': np.random.choice(
-                                    pd.unique(train_set[['relation']].values.ravel()),
-                                    num_noisy_triples),
-                                'object': np.random.choice(list_of_entities, num_noisy_triples)}
-                           )
-                           ], ignore_index=True)
-
-    del list_of_entities
-
-    assert num_triples + num_noisy_triples == len(train_set)
-    return train_set
+# Version of the serialized layout of preprocessed knowledge graphs, to be increased whenever the layout or
+# the indexing changes so that cache entries written by earlier versions are not reused.
+KG_CACHE_FORMAT_VERSION = 1
+
+
+def fingerprint_kg(paths: list, **preprocessing_options) -> str:
+    """ sha256 of the content of input files, the options of reading and preprocessing them and the format version """
+    fingerprint = hashlib.sha256(json.dumps(dict(preprocessing_options, format_version=KG_CACHE_FORMAT_VERSION),
+                                            sort_keys=True).encode())
+    for path in sorted(paths):
+        fingerprint.update(os.path.basename(path).encode())
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                fingerprint.update(chunk)
+    return fingerprint.hexdigest()
+
+
+def get_path_of_kg_cache(args):
+    """ A folder under args.preprocessed_kg_cache named with the fingerprint of the input data and the preprocessing
+    or None if the knowledge graph is not cached """
+    if getattr(args, 'preprocessed_kg_cache', None) is None or args.sparql_endpoint is not None \
+            or hasattr(args, 'path_experiment_folder'):
+        return None
+    if args.path_single_kg is not None:
+        paths = [args.path_single_kg]
+    else:
+        paths = [i for i in glob.glob(args.path_dataset_folder + '/*') if os.path.isfile(i)]
+    fingerprint = fingerprint_kg(paths, add_noise_rate=args.add_noise_rate,
+                                 add_reciprical=args.apply_reciprical_or_noise,
+                                 read_only_few=args.read_only_few, sample_triples_ratio=args.sample_triples_ratio,
+                                 backend=args.backend, evaluation=args.eval_model is not None,
+                                 # Indexes of streamed knowledge graphs depend on the chunk size.
+                                 streaming_chunk_size=getattr(args, 'streaming_chunk_size', None),
+                                 # Noise and sampling depend on the seed.
+                                 random_seed=args.random_seed if args.add_noise_rate or args.sample_triples_ratio else None)
+    return os.path.join(args.preprocessed_kg_cache, fingerprint)
 
 
 def read_or_load_kg(args, cls):
@@ -289,7 +391,9 @@ def read_or_load_kg(args, cls):
              sample_triples_ratio=args.sample_triples_ratio,
              path_for_serialization=args.full_storage_path,
              path_for_deserialization=args.path_experiment_folder if hasattr(args, 'path_experiment_folder') else None,
-             backend=args.backend)
+             backend=args.backend,
+             path_of_cache=get_path_of_kg_cache(args),
+             streaming_chunk_size=getattr(args, 'streaming_chunk_size', None))
     print(f'Preprocessing took: {time.time() - start_time:.3f} seconds')
     # (2) Share some info about data for easy access.
     print(kg.description_of_input)
@@ -355,6 +459,9 @@ def intialize_model(args: dict) -> Tuple[object, str]:
     elif model_name == 'DeCaL':
         model = DeCaL(args=args)
         form_of_labelling = 'EntityPrediction'
+    elif model_name == 'DeCaLSupernet':
+        model = DeCaLSupernet(args=args)
+        form_of_labelling = 'EntityPrediction'
     else:
         raise ValueError(f"--model_name: {model_name} is not found.")
     return model, form_of_labelling
@@ -2,8 +2,8 @@ import functools
 import numpy as np
 from typing import Tuple
 import time
-from collections import defaultdict
 from .sanity_checkers import sanity_checking_with_arguments
+from .read_preprocess_save_load_kg.util import FilterIndex
 
 enable_log = False
 def timeit(func):
@@ -71,6 +71,8 @@ def preprocesses_input_args(args):
         args.scoring_technique = 'KvsAll'
     if args.normalization == 'None':
         args.normalization = None
+    if getattr(args, 'preprocessed_kg_cache', None) == 'None':
+        args.preprocessed_kg_cache = None
     assert args.normalization in [None, 'LayerNorm', 'BatchNorm1d']
     return args
 
@@ -112,27 +114,18 @@ def create_constraints(triples: np.ndarray) -> Tuple[dict, dict, dict, dict]:
 
 
 def get_er_vocab(data):
-    # head entity and relation
-    er_vocab = defaultdict(list)
-    for triple in data:
-        er_vocab[(triple[0], triple[1])].append(triple[2])
-    return er_vocab
+    # head entity and relation to tail entities
+    return FilterIndex.from_pairs(data[:, 0], data[:, 1], data[:, 2])
 
 
 def get_re_vocab(data):
-    # head entity and relation
-    re_vocab = defaultdict(list)
-    for triple in data:
-        re_vocab[(triple[1], triple[2])].append(triple[0])
-    return re_vocab
+    # relation and tail entity to head entities
+    return FilterIndex.from_pairs(data[:, 1], data[:, 2], data[:, 0])
 
 
 def get_ee_vocab(data):
-    # head entity and relation
-    ee_vocab = defaultdict(list)
-    for triple in data:
-        ee_vocab[(triple[0], triple[2])].append(triple[1])
-    return ee_vocab
+    # head entity and tail entity to relations
+    return FilterIndex.from_pairs(data[:, 0], data[:, 2], data[:, 1])
 
 
 @timeit
@@ -141,3 +134,38 @@ def mapping_from_first_two_cols_to_third(train_set_idx):
     for s_idx, p_idx, o_idx in train_set_idx:
         store.setdefault((s_idx, p_idx), list()).append(o_idx)
     return store
+
+
+def group_third_by_first_two_cols(triples: np.ndarray, cols: Tuple[int, int, int] = (0, 1, 2)) -> Tuple[
+    np.ndarray, np.ndarray, np.ndarray]:
+    """
+    A vectorized mapping_from_first_two_cols_to_third in compressed sparse row format
+
+    (1) Sort triples by the pairs of their first two columns.
+    (2) Order pairs by their first occurrence in triples as in mapping_from_first_two_cols_to_third.
+
+    Parameter
+    ---------
+    triples: np.ndarray with (m,3) shape
+    cols: columns of the first, the second, and the third, e.g. (0, 2, 1) to map pairs of entities to relations.
+
+    Returns
+    -------
+    pairs: np.ndarray with (n,2) shape
+    offsets: np.ndarray with (n+1,) shape
+    values: np.ndarray with (m,) shape, where values[offsets[i]:offsets[i+1]] are mapped from pairs[i]
+    """
+    a, b, c = triples[:, cols[0]], triples[:, cols[1]], triples[:, cols[2]]
+    # (1) Sort triples by pairs. A stable sort keeps the order of the values of a pair.
+    codes = (a.astype(np.int64) << 32) | b.astype(np.int64)
+    order = np.argsort(codes, kind='stable')
+    _, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+    # (2) Order pairs by their first occurrence.
+    first_occurrence = order[starts]
+    group_order = np.argsort(first_occurrence, kind='stable')
+    first_occurrence, starts, counts = first_occurrence[group_order], starts[group_order], counts[group_order]
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    positions = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], counts)
+    pairs = np.stack((a[first_occurrence], b[first_occurrence]), axis=1)
+    return pairs, offsets, c[order[positions]]
@@ -1 +1,2 @@
 from .dice_trainer import DICE_Trainer # noqa
+from .multi_signature_trainer import MultiSignatureTrainer # noqa
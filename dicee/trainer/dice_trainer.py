@@ -2,12 +2,13 @@ import pytorch_lightning as pl
 import gc
 from typing import Union
 from dicee.models.base_model import BaseKGE
-from dicee.static_funcs import select_model
+from dicee.static_funcs import select_model, load_json
 from dicee.callbacks import (PPE, FPPE, Eval, KronE, PrintCallback, KGESaveCallback, AccumulateEpochLossCallback,
-                             Perturb)
+                             Perturb, SignatureRanking)
 from dicee.dataset_classes import construct_dataset, reload_dataset
 from .torch_trainer import TorchTrainer
 from .torch_trainer_ddp import TorchDDPTrainer
+from .multi_signature_trainer import MultiSignatureTrainer
 from ..static_funcs import timeit
 import os
 import torch
@@ -34,7 +35,9 @@ def initialize_trainer(args, callbacks):
         print('Initializing Pytorch-lightning Trainer', end='\t')
         return pl.Trainer.from_argparse_args(args,
                                              callbacks=callbacks,
-                                             strategy=DDPStrategy(find_unused_parameters=False))
+                                             # DeCaLSupernet uses the parameters of a single signature per step.
+                                             strategy=DDPStrategy(
+                                                 find_unused_parameters=args.model == 'DeCaLSupernet'))
     else:
         print('Initialize TorchTrainer CPU Trainer', end='\t')
         return TorchTrainer(args, callbacks=callbacks)
@@ -47,6 +50,8 @@ def get_callbacks(args):
                                  path=args.full_storage_path),
                  AccumulateEpochLossCallback(path=args.full_storage_path)
                  ]
+    if args.model == 'DeCaLSupernet':
+        callbacks.append(SignatureRanking(path=args.full_storage_path, args=args))
     if isinstance(args.callbacks, list):
         return callbacks
     for k, v in args.callbacks.items():
@@ -90,11 +95,13 @@ class DICE_Trainer:
     report:dict
     """
 
-    def __init__(self, args, is_continual_training, storage_path, evaluator=None):
+    def __init__(self, args, is_continual_training, storage_path, evaluator=None, is_dataset_shared: bool = False):
         self.report = dict()
         self.args = args
         self.trainer = None
         self.is_continual_training = is_continual_training
+        # If True, the KG is reused by other runs and its attributes are not deleted.
+        self.is_dataset_shared = is_dataset_shared
         self.storage_path = storage_path
         # Required for CV.
         self.evaluator = evaluator
@@ -129,7 +136,10 @@ class DICE_Trainer:
             reload_dataset(path=self.storage_path, form_of_labelling=form_of_labelling,
                            scoring_technique=self.args.scoring_technique,
                            neg_ratio=self.args.neg_ratio,
-                           label_smoothing_rate=self.args.label_smoothing_rate))
+                           label_smoothing_rate=self.args.label_smoothing_rate,
+                           sparse_targets=self.args.sparse_targets,
+                           filtered_negatives=self.args.filtered_negatives,
+                           shared_candidates=self.args.shared_candidates))
         self.trainer.fit(model, train_dataloaders=train_loader)
         return model, form_of_labelling
 
@@ -141,11 +151,27 @@ class DICE_Trainer:
     @timeit
     def initialize_or_load_model(self):
         print('Initializing Model...', end='\t')
-        model, form_of_labelling = select_model(vars(self.args), self.is_continual_training, self.storage_path)
+        path = getattr(self.args, 'continue_from_experiment', None)
+        if path is not None and self.args.model == 'DeCaL' and \
+                self.signature_of_experiment(path) != (self.args.p, self.args.q, self.args.r):
+            # Warm start from a DeCaL model of another signature.
+            model, form_of_labelling = select_model(vars(self.args), self.is_continual_training, self.storage_path)
+            model.warm_start(torch.load(path + '/model.pt', torch.device('cpu')), *self.signature_of_experiment(path))
+        elif path is not None:
+            # Weights of a previous run are loaded as in continual training.
+            model, form_of_labelling = select_model(vars(self.args), True, path)
+        else:
+            model, form_of_labelling = select_model(vars(self.args), self.is_continual_training, self.storage_path)
         self.report['form_of_labelling'] = form_of_labelling
         assert form_of_labelling in ['EntityPrediction', 'RelationPrediction']
         return model, form_of_labelling
 
+    @staticmethod
+    def signature_of_experiment(path: str) -> Tuple[int, int, int]:
+        """ (p,q,r) stored in the configuration of an experiment folder """
+        configuration = load_json(path + '/configuration.json')
+        return configuration.get('p', 0), configuration.get('q', 0), configuration.get('r', 0)
+
     @timeit
     def initialize_dataloader(self, dataset: torch.utils.data.Dataset) -> torch.utils.data.DataLoader:
         print('Initializing Dataloader...', end='\t')
@@ -166,8 +192,11 @@ class DICE_Trainer:
                                           form_of_labelling=form_of_labelling,
                                           scoring_technique=self.args.scoring_technique,
                                           neg_ratio=self.args.neg_ratio,
-                                          label_smoothing_rate=self.args.label_smoothing_rate)
-        if self.args.eval_model is None:
+                                          label_smoothing_rate=self.args.label_smoothing_rate,
+                                          sparse_targets=self.args.sparse_targets,
+                                          filtered_negatives=self.args.filtered_negatives,
+                                          shared_candidates=self.args.shared_candidates)
+        if self.args.eval_model is None and not self.is_dataset_shared:
             del dataset.train_set
             gc.collect()
         return train_dataset
@@ -190,6 +219,44 @@ class DICE_Trainer:
                 self.initialize_dataset(dataset, form_of_labelling)))
             return model, form_of_labelling
 
+    def start_multi_signature(self, dataset: KG, signatures: List[Tuple[int, int, int]]) -> List[Tuple[BaseKGE, str]]:
+        """
+        Train a model for each (p,q,r) signature on a single stream of mini-batches
+
+        (1) Initialize a model for each signature.
+        (2) Initialize the dataset and the dataloader once.
+        (3) Train all models together via MultiSignatureTrainer.
+
+        Parameter
+        ---------
+        dataset: KG
+        signatures: a list of (p,q,r) tuples
+
+        Returns
+        -------
+        A list of trained models and their forms of labelling
+        """
+        print('------------------- Train Multi Signature -------------------')
+        assert self.args.scoring_technique in ['KvsSample', '1vsAll', 'KvsAll', 'NegSample']
+        # (1) Initialize models.
+        models = []
+        for p, q, r in signatures:
+            args = copy.copy(self.args)
+            args.p, args.q, args.r = p, q, r
+            model, form_of_labelling = select_model(vars(args), self.is_continual_training, self.storage_path)
+            models.append((model, form_of_labelling))
+        self.form_of_labelling = models[0][1]
+        assert all(form_of_labelling == self.form_of_labelling for _, form_of_labelling in models)
+        # (2) Per-model callbacks would write into the same experiment folder.
+        self.trainer = MultiSignatureTrainer(self.args, callbacks=[])
+        self.trainer.evaluator = self.evaluator
+        self.trainer.dataset = dataset
+        self.trainer.form_of_labelling = self.form_of_labelling
+        # (3) Train.
+        self.trainer.fit(*[model for model, _ in models], train_dataloaders=self.initialize_dataloader(
+            self.initialize_dataset(dataset, self.form_of_labelling)))
+        return models
+
     def k_fold_cross_validation(self, dataset) -> Tuple[BaseKGE, str]:
         """
         Perform K-fold Cross-Validation
@@ -229,7 +296,10 @@ class DICE_Trainer:
                                   form_of_labelling=form_of_labelling,
                                   scoring_technique=self.args.scoring_technique,
                                   neg_ratio=self.args.neg_ratio,
-                                  label_smoothing_rate=self.args.label_smoothing_rate)))
+                                  label_smoothing_rate=self.args.label_smoothing_rate,
+                                  sparse_targets=self.args.sparse_targets,
+                                  filtered_negatives=self.args.filtered_negatives,
+                                  shared_candidates=self.args.shared_candidates)))
 
             res = self.evaluator.eval_with_data(dataset=dataset, trained_model=model, triple_idx=test_set_for_i_th_fold,
                                                 form_of_labelling=form_of_labelling)
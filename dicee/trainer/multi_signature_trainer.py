@@ -0,0 +1,136 @@
+import torch
+import time
+from typing import List
+from .torch_trainer import TorchTrainer
+
+
+class MultiSignatureTrainer(TorchTrainer):
+    """
+        MultiSignatureTrainer trains many models on a single stream of mini-batches,
+        e.g. DeCaL models with different (p,q,r) signatures.
+
+        Every mini-batch is constructed and moved to the device once.
+        Losses of all models are summed so that a single backward pass computes the gradients of all models.
+        Since models do not share parameters, the gradients of a model are identical to the ones obtained by
+        training it alone. Each model is updated by its own optimizer.
+
+        Arguments
+       ----------
+       args: ?
+
+       callbacks: list of Abstract callback instances
+
+   """
+
+    def __init__(self, args, callbacks):
+        super().__init__(args, callbacks)
+        self.models = None
+        self.optimizers = None
+
+    def _run_batch(self, i: int, x_batch, y_batch) -> List[float]:
+        """
+            Forward anc Backward of all models according to a mini-batch
+
+            Arguments
+           ----------
+           i : index of a batch
+           x_batch: torch.Tensor on selected device
+           y_batch: torch.Tensor on selected device
+           Returns
+           -------
+           batch loss of each model (float)
+       """
+        # (1) As in TorchTrainer, gradients are zeroed every gradient_accumulation_steps mini-batch, otherwise per batch.
+        if self.attributes.gradient_accumulation_steps <= 1 or i % self.attributes.gradient_accumulation_steps == 0:
+            for optimizer in self.optimizers:
+                optimizer.zero_grad(set_to_none=True)
+        # (2) Loss Forward and Backward w.r.t the batch.
+        return self.forward_backward_update(x_batch, y_batch)
+
+    def _run_epoch(self, epoch: int) -> List[float]:
+        """
+            Iterate over the training dataset
+
+            Arguments
+           ----------
+           epoch:int
+           -------
+           average loss of each model over the dataset
+       """
+        epoch_losses = [0.0 for _ in self.models]
+        i = 0
+        for i, batch in enumerate(self.train_dataloaders):
+            # (1) Extract Input and Outputs and set them on the device.
+            x_batch, y_batch = self.extract_input_outputs_set_device(batch)
+            start_time = time.time()
+            # (2) Forward-Backward-Update.
+            batch_losses = self._run_batch(i, x_batch, y_batch)
+            for j, batch_loss in enumerate(batch_losses):
+                epoch_losses[j] += batch_loss
+            print(f"Epoch:{epoch + 1} "
+                  f"| Batch:{i + 1} "
+                  f"| Avg. Loss:{sum(batch_losses) / len(batch_losses):.10f} "
+                  f"| ForwardBackwardUpdate:{(time.time() - start_time):.2f}sec "
+                  f"| Mem. Usage {self.process.memory_info().rss / 1_000_000: .5}MB ")
+        return [epoch_loss / (i + 1) for epoch_loss in epoch_losses]
+
+    def fit(self, *args, train_dataloaders, **kwargs) -> None:
+        """
+            Training starts
+
+            Arguments
+           ----------
+           args:tuple
+           (BASEKGE, ..., BASEKGE)
+           kwargs:Tuple
+               empty dictionary
+           Returns
+           -------
+           None
+       """
+        assert len(args) >= 1
+        self.models = list(args)
+        for model in self.models:
+            model.to(self.device)
+        self.train_dataloaders = train_dataloaders
+        self.optimizers = [model.configure_optimizers() for model in self.models]
+        # (1) Start running callbacks
+        for model in self.models:
+            self.on_fit_start(self, model)
+
+        print(f'NumOfModels:{len(self.models)} '
+              f'| NumOfDataPoints:{len(self.train_dataloaders.dataset)} '
+              f'| NumOfEpochs:{self.attributes.max_epochs} '
+              f'| BatchSize:{self.train_dataloaders.batch_size} '
+              f'| EpochBatchsize:{len(train_dataloaders)}')
+        for epoch in range(self.attributes.max_epochs):
+            start_time = time.time()
+            avg_epoch_losses = self._run_epoch(epoch)
+            print(f"Epoch:{epoch + 1} "
+                  f"| Avg. Loss:{sum(avg_epoch_losses) / len(avg_epoch_losses):.8f} "
+                  f"| Runtime:{(time.time() - start_time) / 60:.3f} mins")
+            for model, avg_epoch_loss in zip(self.models, avg_epoch_losses):
+                model.loss_history.append(avg_epoch_loss)
+                self.on_train_epoch_end(self, model)
+        for model in self.models:
+            self.on_fit_end(self, model)
+
+    def forward_backward_update(self, x_batch: torch.Tensor, y_batch: torch.Tensor) -> List[float]:
+        """
+            Compute forward, loss, backward, and parameter update for all models
+
+            Arguments
+           ----------
+           x_batch:(torch.Tensor) mini-batch inputs
+           y_batch:(torch.Tensor) mini-batch outputs
+
+           Returns
+           -------
+           batch loss of each model (float)
+       """
+        batch_losses = [model.training_step(batch=(x_batch, y_batch)) for model in self.models]
+        # A single backward pass over the sum of independent losses.
+        torch.stack(batch_losses).sum().backward()
+        for optimizer in self.optimizers:
+            optimizer.step()
+        return [batch_loss.item() for batch_loss in batch_losses]
@@ -61,6 +61,10 @@ class TorchDDPTrainer(AbstractTrainer):
 
         # (2) Initialize OPTIMIZER.
         optimizer = model.configure_optimizers()
+        # NodeTrainer computes the full KvsAll logits via the DDP wrapper instead of model.training_step.
+        if getattr(model, 'entity_chunk_size', None):
+            print(f'--entity_chunk_size is not supported by {self.__class__.__name__} and ignored')
+            model.entity_chunk_size = None
         # (3) Start NodeTrainer.
         NodeTrainer(model, train_dataset_loader, optimizer, self.callbacks, self.attributes.num_epochs).train()
         torch.distributed.destroy_process_group()
@@ -80,7 +84,8 @@ class NodeTrainer:
         # (2) Send model to local trainer. (Check whether it is uncesseary as we wrap it with DDP
         self.model = model.to(self.local_rank)
         self.train_dataset_loader = train_dataset_loader
-        self.loss_func = self.model.loss
+        # loss_function supports dense and sparse targets (see --sparse_targets).
+        self.loss_func = self.model.loss_function
         self.optimizer = optimizer
         self.callbacks = callbacks
         # (3) Wrap the model with DDP() along with GPU ID that model lives on.
@@ -179,7 +184,8 @@ class DDPTrainer:
         self.gpu_id = gpu_id
         self.model = model.to(gpu_id)
         self.train_dataset_loader = train_dataset_loader
-        self.loss_func = self.model.loss
+        # loss_function supports dense and sparse targets (see --sparse_targets).
+        self.loss_func = self.model.loss_function
         self.optimizer = optimizer
         self.callbacks = callbacks
         # (1) Wrap the model with DDP() along with GPU ID that model lives on.
@@ -8,7 +8,7 @@ import random
 import os
 import shutil
 import pandas as pd
-import pickle
+from dicee.static_funcs import StringIndex
 
 #######################################################################################################################
 
@@ -86,8 +86,8 @@ def tensor_data(file_path,N):
     for folder in os.listdir(file_path):
         folder_path  = os.path.join(file_path, folder)
         train_path   = os.path.join(folder_path, 'train_set.npy')
-        path_ent_idx = os.path.join(folder_path, 'entity_to_idx.p')
-        path_rel_idx = os.path.join(folder_path, 'relation_to_idx.p')
+        path_ent_idx = os.path.join(folder_path, 'entity_to_idx')
+        path_rel_idx = os.path.join(folder_path, 'relation_to_idx')
         path_ent_emb = os.path.join(folder_path, 'DeCaL_entity_embeddings.csv')
         path_rel_emb = os.path.join(folder_path, 'DeCaL_relation_embeddings.csv')
 
@@ -101,15 +101,21 @@ def tensor_data(file_path,N):
     return D_i
 
 
+def idx_to_str(str_to_idx, indx):
+    # Memory-mapped string tables are indexed directly, pickled dicts of older experiments are searched.
+    if isinstance(str_to_idx, StringIndex):
+        return str_to_idx.strings[indx]
+    return next((key for key, value in str_to_idx.items() if value == indx), None)
+
+
 def ent_rel_emb(indx_triple,path_ent_idx,path_rel_idx,path_ent_emb,path_rel_emb):
 
     # Here we retrieve final entities' embeddings, we need the index (value == indx) of an entity from the file above:
     
-    with open(path_ent_idx, 'rb') as file:
-        ent_to_idx = pickle.load(file)
+    ent_to_idx = StringIndex.load(path_ent_idx)
 
-    head = next((key for key, value in ent_to_idx.items() if value == indx_triple[0]), None)
-    tail = next((key for key, value in ent_to_idx.items() if value == indx_triple[2]), None)
+    head = idx_to_str(ent_to_idx, indx_triple[0])
+    tail = idx_to_str(ent_to_idx, indx_triple[2])
     
     head_emb = pd.read_csv(path_ent_emb, index_col=0)
     
@@ -131,10 +137,9 @@ def ent_rel_emb(indx_triple,path_ent_idx,path_rel_idx,path_ent_emb,path_rel_emb)
 
     # Here we retrieve final entities' embeddings, we need the index of a relation:
     
-    with open(path_rel_idx, 'rb') as file:
-        rel_to_idx = pickle.load(file)
+    rel_to_idx = StringIndex.load(path_rel_idx)
 
-    rel = next((key for key, value in rel_to_idx.items() if value == indx_triple[1]), None)
+    rel = idx_to_str(rel_to_idx, indx_triple[1])
     rel_emb = pd.read_csv(path_rel_emb, index_col=0)
 
 
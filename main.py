@@ -31,7 +31,7 @@ def get_default_arguments(description=None):
                                  "Pykeen_MuRE", "Pykeen_QuatE", "Pykeen_DistMult", "Pykeen_BoxE", "Pykeen_CP",
                                  "Pykeen_HolE", "Pykeen_ProjE", "Pykeen_RotatE",
                                  "Pykeen_TransE", "Pykeen_TransF", "Pykeen_TransH",
-                                 "Pykeen_TransR", "Pykeen_TuckER", "Pykeen_ComplEx", "DeCaL"],
+                                 "Pykeen_TransR", "Pykeen_TuckER", "Pykeen_ComplEx", "DeCaL", "DeCaLSupernet"],
                         help="Available knowledge graph embedding models. "
                              "To use other knowledge graph embedding models available in Python, e.g.,"
                              "**Pykeen_BoxE** and add this into choices")
@@ -51,6 +51,9 @@ def get_default_arguments(description=None):
     parser.add_argument("--backend", type=str, default="pandas",
                         choices=["pandas", "polars", "rdflib"],
                         help='Backend for loading, preprocessing, indexing input knowledge graph.')
+    parser.add_argument("--streaming_chunk_size", type=int, default=None,
+                        help="If given, the input knowledge graph is read, indexed and written into disk in chunks of "
+                             "this many triples with polars, so that it does not need to fit into memory.")
     parser.add_argument("--trainer", type=str, default='PL',
                         choices=['torchCPUTrainer', 'PL', 'torchDDP'],
                         help='PL (PyTorch Lightning trainer), torchDDP (custom ddp), torchCPUTrainer (custom cpu only)')
@@ -59,6 +62,12 @@ def get_default_arguments(description=None):
                         choices=["AllvsAll", "KvsAll", "1vsAll", "NegSample", "KvsSample"])
     parser.add_argument('--neg_ratio', type=int, default=50,
                         help='The number of negative triples generated per positive triple.')
+    parser.add_argument("--filtered_negatives", action="store_true",
+                        help="NegSample: resample negative triples that are training triples.")
+    parser.add_argument("--shared_candidates", action="store_true",
+                        help="KvsSample: a mini-batch shares the union of its positives and neg_ratio sampled entities "
+                             "as candidates, which are scored via a single matrix multiplication. "
+                             "Supported by DeCaL, Keci, QMult, OMult and ComplEx.")
     parser.add_argument('--weight_decay', type=float, default=0.0, help='L2 penalty e.g.(0.00001)')
     parser.add_argument('--input_dropout_rate', type=float, default=0.0)
     parser.add_argument('--hidden_dropout_rate', type=float, default=0.0)
@@ -75,11 +84,17 @@ def get_default_arguments(description=None):
                         help='Number of folds in k-fold cross validation.'
                              'If >2, no evaluation scenario is applied implies no evaluation.')
     parser.add_argument("--eval_model", type=str, default="train_val_test",
-                        choices=["None", "train", "train_val", "train_val_test", "test"],
+                        choices=["None", "train", "train_val", "train_val_test", "val", "test"],
                         help='Evaluating link prediction performance on data splits. ')
     parser.add_argument("--save_model_at_every_epoch", type=int, default=None,
                         help='At every X number of epochs model will be saved. If None, we save 4 times.')
     parser.add_argument("--label_smoothing_rate", type=float, default=0.0, help='None for not using it.')
+    parser.add_argument("--sparse_targets", action="store_true",
+                        help="KvsAll and AllvsAll: mini-batches contain only positive labels and the loss is computed "
+                             "without constructing dense multi-label vectors.")
+    parser.add_argument("--entity_chunk_size", type=int, default=None,
+                        help="KvsAll: compute logits and loss over blocks of entities of this size. Logits of a block "
+                             "are recomputed in the backward pass. Supported by DeCaL, Keci, QMult, OMult and ComplEx.")
     parser.add_argument("--kernel_size", type=int, default=3,
                         help="Square kernel size for convolution based models.")
     parser.add_argument("--num_of_output_channels", type=int, default=2,
@@ -100,10 +115,30 @@ def get_default_arguments(description=None):
     parser.add_argument('--r', type=int, default=1,
                         help='Q for Clifford Algebra')
     parser.add_argument('--pykeen_model_kwargs', type=json.loads, default={})
+    parser.add_argument('--signatures', type=json.loads, default=None,
+                        help='A list of (p,q,r) signatures, e.g. [[1,1,1],[2,0,1]]. '
+                             'DeCaL: models are trained together on the same mini-batches and '
+                             'each model is stored into storage_path/p_q_r . '
+                             'DeCaLSupernet: signatures sampled during training and ranked afterwards. '
+                             'If None, all signatures with (1+p+q+r) dividing embedding_dim are used.')
+    parser.add_argument("--compile_scorer", action="store_true",
+                        help="Use a TorchScript scoring function specialized to (p,q,r) of DeCaL. "
+                             "Generated functions are cached under --storage_path.")
+    parser.add_argument("--continue_from_experiment", type=str, default=None,
+                        help="An experiment folder whose model.pt initializes the model, e.g. to continue training "
+                             "a signature with a larger epoch budget.")
+    parser.add_argument("--preprocessed_kg_cache", type=str, default="Experiments/preprocessed_kgs",
+                        help="A folder in which preprocessed knowledge graphs are cached and reused across runs. "
+                             "Entries are keyed by the content of the input files and preprocessing options. "
+                             "Use 'None' to disable it.")
     if description is None:
         return parser.parse_args()
     return parser.parse_args(description)
 
 
 if __name__ == '__main__':
-    Execute(get_default_arguments()).start()
+    args = get_default_arguments()
+    if args.signatures and args.model == 'DeCaL':
+        Execute(args).start_multi_signature([tuple(signature) for signature in args.signatures])
+    else:
+        Execute(args).start()